@@ -62,6 +62,13 @@ function connectWS(router){
           return
         }
         
+        if (msg.type === 'unread_count') {
+          // 未读数变化（服务端已计算好最新值）
+          const { useNotificationStore } = await import('../stores/notification')
+          useNotificationStore().setUnreadCount(msg.unread_count)
+          return
+        }
+
         if (msg.type === 'notification') {
           // 处理实时通知
           const { useNotificationStore } = await import('../stores/notification')
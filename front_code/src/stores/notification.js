@@ -33,6 +33,23 @@ export const useNotificationStore = defineStore('notification', () => {
     }
   }
 
+  // 只获取未读数量（轻量接口，列表在打开下拉框时再加载）
+  async function fetchUnreadCount() {
+    try {
+      const response = await api.get('/notifications/unread-count')
+      unreadCount.value = response.data.unread_count
+      return response.data.unread_count
+    } catch (error) {
+      console.error('获取未读数量失败:', error)
+      throw error
+    }
+  }
+
+  // 应用服务端推送的未读数变化（其他标签页/设备上的已读、删除操作）
+  function setUnreadCount(count) {
+    unreadCount.value = Math.max(0, count)
+  }
+
   async function markAsRead(notificationId) {
     try {
       await api.put(`/notifications/${notificationId}/read`)
@@ -96,6 +113,8 @@ export const useNotificationStore = defineStore('notification', () => {
 
     // 方法
     fetchNotifications,
+    fetchUnreadCount,
+    setUnreadCount,
     markAsRead,
     markAllAsRead,
     deleteNotification,
@@ -9,6 +9,8 @@ from db.models.role import Role
 from db.models.permission import Permission, RolePermission
 from db.models.user_role import UserRole
 from core.security import decode_token
+from core.permission_cache import permission_cache
+from core import user_cache
 
 
 async def get_current_user(
@@ -23,17 +25,37 @@ async def get_current_user(
     if not payload:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="凭证无效或已过期")
     user_id = int(payload.get("sub", 0))
-    q = await session.execute(select(User).where(User.id == user_id))
-    user = q.scalar_one_or_none()
-    if not user:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="用户不存在")
+    user = await user_cache.restore(session, user_id)
+    if user is None:
+        q = await session.execute(select(User).where(User.id == user_id))
+        user = q.scalar_one_or_none()
+        if not user:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="用户不存在")
+        user_cache.remember(user)
     if not user.is_active:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="账号已被禁用")
     return user
 
 
-async def get_user_permissions(user: User, session: AsyncSession) -> set[str]:
-    """获取用户的权限码集合。"""
+async def get_user_permissions(user: User, session: AsyncSession) -> frozenset[str]:
+    """获取用户的权限码集合。
+
+    同一请求（同一会话）内只解析一次；跨请求命中进程级权限缓存。
+    """
+    memo = session.info.setdefault("user_permissions", {})
+    if user.id in memo:
+        return memo[user.id]
+    perms = permission_cache.get(user.id, user.role_id)
+    if perms is None:
+        version = permission_cache.version
+        perms = frozenset(await _load_user_permissions(user, session))
+        permission_cache.set(user.id, user.role_id, perms, version)
+    memo[user.id] = perms
+    return perms
+
+
+async def _load_user_permissions(user: User, session: AsyncSession) -> set[str]:
+    """从数据库解析用户的权限码集合。"""
     # 汇总用户的所有角色（包含主角色与多角色）
     role_ids: list[int] = []
     if user.role_id:
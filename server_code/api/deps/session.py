@@ -0,0 +1,13 @@
+from fastapi import Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db.session import get_session
+
+
+async def release_session(session: AsyncSession = Depends(get_session)) -> None:
+    """归还本请求会话占用的连接（放在认证、权限依赖之后）。
+
+    并发查询的接口在各自的连接上执行，不再使用请求会话；
+    提前归还可避免等待并发连接时仍占着一个连接。
+    """
+    await session.close()
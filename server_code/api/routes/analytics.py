@@ -1,98 +1,77 @@
 """图表分析路由：提供各种统计图表数据。"""
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func, extract
 from sqlalchemy.orm import selectinload
 from datetime import datetime, timedelta
 from typing import List
 
-from db.session import get_session
+from db.session import get_session, AsyncSessionLocal
 from db.models.project import Project
 from db.models.task import Task
 from db.models.user import User
 from db.models.team import Team
 from db.models.role import Role
 from api.deps.auth import get_current_user, require_permissions
+from core.analytics_rollup import read_metric, COMPLETED_STATUS
+from api.deps.session import release_session
+from core.query_fanout import fanout, scalar, rows
+from core.response_cache import response_cache
+from core.export import FORMATS, render, iter_rows, export_filename
+from api.routes.exports import streaming_file
 
 router = APIRouter(prefix="/analytics", tags=["analytics"])
 
 
+async def load_names(session: AsyncSession, id_column, name_column, ids: List[str]) -> dict[int, str]:
+    """按 ID 批量查询名称（汇总表中维度值以字符串保存）。"""
+    if not ids:
+        return {}
+    rows = await session.execute(select(id_column, name_column).where(id_column.in_([int(i) for i in ids])))
+    return {row[0]: row[1] for row in rows.all()}
+
+
 @router.get("/projects", dependencies=[Depends(require_permissions("analytics.view"))])
 async def get_projects_analytics(
-    session: AsyncSession = Depends(get_session),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    _: None = Depends(release_session),
 ):
-    """获取项目分析数据"""
-
-    # 项目状态分布
-    status_query = await session.execute(
-        select(Project.status, func.count(Project.id)).group_by(Project.status)
-    )
-    status_data = [{"status": row[0], "count": row[1]} for row in status_query.all()]
-
-    # 项目创建时间趋势（按月统计）
-    current_year = datetime.now().year
-    monthly_query = await session.execute(
-        select(
-            extract('month', Project.created_at).label('month'),
-            func.count(Project.id)
-        ).where(
-            extract('year', Project.created_at) == current_year
-        ).group_by(extract('month', Project.created_at)).order_by(extract('month', Project.created_at))
-    )
-    monthly_data = [{"month": int(row[0]), "count": row[1]} for row in monthly_query.all()]
-
-    # 项目负责人分布
-    owner_query = await session.execute(
-        select(
-            User.username,
-            func.count(Project.id)
-        ).join(Project.owner).group_by(User.id, User.username).order_by(func.count(Project.id).desc())
-    )
-    owner_data = [{"owner": row[0], "count": row[1]} for row in owner_query.all()]
-
-    # 项目团队分布
-    team_query = await session.execute(
-        select(
-            Team.name,
-            func.count(Project.id)
-        ).join(Project.team).group_by(Team.id, Team.name).order_by(func.count(Project.id).desc())
-    )
-    team_data = [{"team": row[0], "count": row[1]} for row in team_query.all()]
+    """获取项目分析数据（全局数据，走响应缓存）"""
+    return await response_cache.get_or_compute("analytics.projects", "projects", compute_projects_analytics)
 
-    # 项目完成率统计
-    total_projects_query = await session.execute(select(func.count(Project.id)))
-    total_projects = total_projects_query.scalar()
 
-    completed_projects_query = await session.execute(
-        select(func.count(Project.id)).where(Project.status == "已完成")
-    )
-    completed_projects = completed_projects_query.scalar()
+async def compute_projects_analytics() -> dict:
+    """计算项目分析数据"""
 
-    completion_rate = round((completed_projects / total_projects * 100), 2) if total_projects > 0 else 0
+    current_year = datetime.now().year
+    thirty_days_ago = datetime.now() - timedelta(days=30)
 
-    # 逾期项目统计
-    overdue_projects_query = await session.execute(
-        select(func.count(Project.id)).where(
+    # 分布类数据读取预聚合汇总，与日期相关的统计实时查询；互不依赖，并发执行
+    (
+        status_rows,
+        monthly_rows,
+        owner_rows,
+        team_rows,
+        overdue_projects,
+        active_projects,
+        avg_duration,
+    ) = await fanout(
+        lambda s: read_metric(s, "project.status"),
+        lambda s: read_metric(s, "project.created_month", bucket_from=f"{current_year}-01"),
+        lambda s: read_metric(s, "project.owner"),
+        lambda s: read_metric(s, "project.team"),
+        # 逾期项目统计
+        scalar(select(func.count(Project.id)).where(
             Project.end_date < datetime.now().date(),
             Project.status != "已完成"
-        )
-    )
-    overdue_projects = overdue_projects_query.scalar()
-
-    # 最近30天活跃项目（有任务更新的项目）
-    thirty_days_ago = datetime.now() - timedelta(days=30)
-    active_projects_query = await session.execute(
-        select(func.count(func.distinct(Task.project_id))).join(Task.project).where(
+        )),
+        # 最近30天活跃项目（有任务更新的项目）
+        scalar(select(func.count(func.distinct(Task.project_id))).join(Task.project).where(
             Task.updated_at >= thirty_days_ago
-        )
-    )
-    active_projects = active_projects_query.scalar() or 0
-
-    # 项目平均工期（已完成项目的平均天数）
-    avg_duration_query = await session.execute(
-        select(
+        )),
+        # 项目平均工期（已完成项目的平均天数）
+        scalar(select(
             func.avg(
                 func.datediff(Project.end_date, Project.start_date)
             )
@@ -100,9 +79,43 @@ async def get_projects_analytics(
             Project.status == "已完成",
             Project.start_date.isnot(None),
             Project.end_date.isnot(None)
-        )
+        )),
+    )
+
+    # 项目状态分布
+    status_data = [{"status": dim, "count": value} for _, dim, value in status_rows]
+
+    # 项目创建时间趋势（按月统计）
+    monthly_data = [
+        {"month": int(bucket[5:7]), "count": value}
+        for bucket, _, value in monthly_rows
+        if bucket.startswith(f"{current_year}-")
+    ]
+
+    # 负责人、团队名称（缓存刷新可能发生在请求结束后，使用独立会话）
+    async with AsyncSessionLocal() as session:
+        owner_names = await load_names(session, User.id, User.username, [dim for _, dim, _ in owner_rows])
+        team_names = await load_names(session, Team.id, Team.name, [dim for _, dim, _ in team_rows])
+
+    # 项目负责人分布
+    owner_data = sorted(
+        [{"owner": owner_names[int(dim)], "count": value} for _, dim, value in owner_rows if int(dim) in owner_names],
+        key=lambda item: item["count"], reverse=True,
+    )
+
+    # 项目团队分布
+    team_data = sorted(
+        [{"team": team_names[int(dim)], "count": value} for _, dim, value in team_rows if int(dim) in team_names],
+        key=lambda item: item["count"], reverse=True,
     )
-    avg_duration = round(avg_duration_query.scalar() or 0, 1)
+
+    # 项目完成率统计
+    total_projects = sum(value for _, _, value in status_rows)
+    completed_projects = sum(value for _, dim, value in status_rows if dim == "已完成")
+
+    completion_rate = round((completed_projects / total_projects * 100), 2) if total_projects > 0 else 0
+    active_projects = active_projects or 0
+    avg_duration = round(avg_duration or 0, 1)
 
     return {
         "status_distribution": status_data,
@@ -122,55 +135,44 @@ async def get_projects_analytics(
 
 @router.get("/tasks", dependencies=[Depends(require_permissions("analytics.view"))])
 async def get_tasks_analytics(
-    session: AsyncSession = Depends(get_session),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    _: None = Depends(release_session),
 ):
-    """获取任务分析数据"""
+    """获取任务分析数据（全局数据，走响应缓存）"""
+    return await response_cache.get_or_compute("analytics.tasks", "tasks", compute_tasks_analytics)
 
-    # 任务状态分布
-    status_query = await session.execute(
-        select(Task.status, func.count(Task.id)).group_by(Task.status)
-    )
-    status_data = [{"status": row[0], "count": row[1]} for row in status_query.all()]
 
-    # 任务优先级分布
-    priority_query = await session.execute(
-        select(Task.priority, func.count(Task.id)).where(Task.priority.isnot(None)).group_by(Task.priority)
-    )
-    priority_data = [{"priority": row[0], "count": row[1]} for row in priority_query.all()]
+async def compute_tasks_analytics() -> dict:
+    """计算任务分析数据"""
 
-    # 任务完成时间趋势（按周统计最近12周）
     twelve_weeks_ago = datetime.now() - timedelta(weeks=12)
-    weekly_completion_query = await session.execute(
-        select(
-            func.date_format(Task.updated_at, '%Y-%m-%d').label('week'),
-            func.count(Task.id)
-        ).where(
-            Task.status == "已完成",
-            Task.updated_at >= twelve_weeks_ago
-        ).group_by(func.date_format(Task.updated_at, '%Y-%m-%d')).order_by(func.date_format(Task.updated_at, '%Y-%m-%d'))
+
+    # 分布与完成趋势读取预聚合汇总，逾期统计实时查询；并发执行
+    status_rows, priority_rows, completed_rows, overdue_tasks = await fanout(
+        lambda s: read_metric(s, "task.status"),
+        lambda s: read_metric(s, "task.priority"),
+        # 任务完成时间趋势（按天统计最近12周）
+        lambda s: read_metric(s, "task.completed_day", bucket_from=twelve_weeks_ago.strftime("%Y-%m-%d")),
+        # 逾期任务统计
+        scalar(select(func.count(Task.id)).where(
+            Task.due_date < datetime.now().date(),
+            Task.status != "已完成"
+        )),
     )
-    weekly_data = [{"week": row[0], "count": row[1]} for row in weekly_completion_query.all()]
 
-    # 任务统计汇总
-    total_tasks_query = await session.execute(select(func.count(Task.id)))
-    total_tasks = total_tasks_query.scalar()
+    # 任务状态分布
+    status_data = [{"status": dim, "count": value} for _, dim, value in status_rows]
 
-    completed_tasks_query = await session.execute(
-        select(func.count(Task.id)).where(Task.status == "已完成")
-    )
-    completed_tasks = completed_tasks_query.scalar()
+    # 任务优先级分布
+    priority_data = [{"priority": dim, "count": value} for _, dim, value in priority_rows]
 
-    completion_rate = round((completed_tasks / total_tasks * 100), 2) if total_tasks > 0 else 0
+    weekly_data = [{"week": bucket, "count": value} for bucket, _, value in completed_rows]
 
-    # 逾期任务统计
-    overdue_tasks_query = await session.execute(
-        select(func.count(Task.id)).where(
-            Task.due_date < datetime.now().date(),
-            Task.status != "已完成"
-        )
-    )
-    overdue_tasks = overdue_tasks_query.scalar()
+    # 任务统计汇总
+    total_tasks = sum(value for _, _, value in status_rows)
+    completed_tasks = sum(value for _, dim, value in status_rows if dim == COMPLETED_STATUS)
+
+    completion_rate = round((completed_tasks / total_tasks * 100), 2) if total_tasks > 0 else 0
 
     return {
         "status_distribution": status_data,
@@ -187,38 +189,35 @@ async def get_tasks_analytics(
 
 @router.get("/users", dependencies=[Depends(require_permissions("analytics.view"))])
 async def get_users_analytics(
-    session: AsyncSession = Depends(get_session),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    _: None = Depends(release_session),
 ):
-    """获取用户分析数据"""
+    """获取用户分析数据（全局数据，走响应缓存）"""
+    return await response_cache.get_or_compute("analytics.people", "users", compute_users_analytics)
 
-    # 用户角色分布
-    role_query = await session.execute(
-        select(Role.name, func.count(User.id)).join(User, Role.id == User.role_id).group_by(Role.id, Role.name)
-    )
-    role_data = [{"role": row[0], "count": row[1]} for row in role_query.all()]
 
-    # 用户注册时间趋势（按月统计）
+async def compute_users_analytics() -> dict:
+    """计算用户分析数据"""
+
     current_year = datetime.now().year
-    monthly_query = await session.execute(
-        select(
+    thirty_days_ago = datetime.now() - timedelta(days=30)
+
+    role_rows, monthly_rows, active_users, total_users = await fanout(
+        # 用户角色分布
+        rows(select(Role.name, func.count(User.id)).join(User, Role.id == User.role_id).group_by(Role.id, Role.name)),
+        # 用户注册时间趋势（按月统计）
+        rows(select(
             extract('month', User.created_at).label('month'),
             func.count(User.id)
         ).where(
             extract('year', User.created_at) == current_year
-        ).group_by(extract('month', User.created_at)).order_by(extract('month', User.created_at))
-    )
-    monthly_data = [{"month": int(row[0]), "count": row[1]} for row in monthly_query.all()]
-
-    # 用户活跃度（最近30天登录的用户）
-    thirty_days_ago = datetime.now() - timedelta(days=30)
-    active_users_query = await session.execute(
-        select(func.count(User.id)).where(User.last_login >= thirty_days_ago)
+        ).group_by(extract('month', User.created_at)).order_by(extract('month', User.created_at))),
+        # 用户活跃度（最近30天登录的用户）
+        scalar(select(func.count(User.id)).where(User.last_login >= thirty_days_ago)),
+        scalar(select(func.count(User.id))),
     )
-    active_users = active_users_query.scalar()
-
-    total_users_query = await session.execute(select(func.count(User.id)))
-    total_users = total_users_query.scalar()
+    role_data = [{"role": row[0], "count": row[1]} for row in role_rows]
+    monthly_data = [{"month": int(row[0]), "count": row[1]} for row in monthly_rows]
 
     return {
         "role_distribution": role_data,
@@ -231,29 +230,31 @@ async def get_users_analytics(
 
 @router.get("/teams", dependencies=[Depends(require_permissions("analytics.view"))])
 async def get_teams_analytics(
-    session: AsyncSession = Depends(get_session),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    _: None = Depends(release_session),
 ):
-    """获取团队分析数据"""
+    """获取团队分析数据（全局数据，走响应缓存）"""
+    return await response_cache.get_or_compute("analytics.people", "teams", compute_teams_analytics)
+
+
+async def compute_teams_analytics() -> dict:
+    """计算团队分析数据"""
 
-    # 团队成员数量分布
     from db.models.team import TeamMember
-    team_members_query = await session.execute(
-        select(
+    team_members_rows, team_projects_rows = await fanout(
+        # 团队成员数量分布
+        rows(select(
             Team.name,
             func.count(TeamMember.id)
-        ).join(TeamMember, Team.id == TeamMember.team_id).group_by(Team.id, Team.name).order_by(func.count(TeamMember.id).desc())
-    )
-    team_members_data = [{"team": row[0], "member_count": row[1]} for row in team_members_query.all()]
-
-    # 团队项目数量分布
-    team_projects_query = await session.execute(
-        select(
+        ).join(TeamMember, Team.id == TeamMember.team_id).group_by(Team.id, Team.name).order_by(func.count(TeamMember.id).desc())),
+        # 团队项目数量分布
+        rows(select(
             Team.name,
             func.count(Project.id)
-        ).join(Project, Team.id == Project.team_id).group_by(Team.id, Team.name).order_by(func.count(Project.id).desc())
+        ).join(Project, Team.id == Project.team_id).group_by(Team.id, Team.name).order_by(func.count(Project.id).desc())),
     )
-    team_projects_data = [{"team": row[0], "project_count": row[1]} for row in team_projects_query.all()]
+    team_members_data = [{"team": row[0], "member_count": row[1]} for row in team_members_rows]
+    team_projects_data = [{"team": row[0], "project_count": row[1]} for row in team_projects_rows]
 
     return {
         "team_members_distribution": team_members_data,
@@ -263,29 +264,31 @@ async def get_teams_analytics(
 
 @router.get("/roles", dependencies=[Depends(require_permissions("analytics.view"))])
 async def get_roles_analytics(
-    session: AsyncSession = Depends(get_session),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    _: None = Depends(release_session),
 ):
-    """获取角色分析数据"""
+    """获取角色分析数据（全局数据，走响应缓存）"""
+    return await response_cache.get_or_compute("analytics.people", "roles", compute_roles_analytics)
+
+
+async def compute_roles_analytics() -> dict:
+    """计算角色分析数据"""
 
-    # 角色权限数量分布
     from db.models.permission import RolePermission
-    role_permissions_query = await session.execute(
-        select(
+    role_permissions_rows, role_users_rows = await fanout(
+        # 角色权限数量分布
+        rows(select(
             Role.name,
             func.count(RolePermission.id).label('permission_count')
-        ).join(RolePermission, Role.id == RolePermission.role_id).group_by(Role.id, Role.name).order_by(func.count(RolePermission.id).desc())
-    )
-    role_permissions_data = [{"role": row[0], "permission_count": row[1]} for row in role_permissions_query.all()]
-
-    # 角色用户数量分布
-    role_users_query = await session.execute(
-        select(
+        ).join(RolePermission, Role.id == RolePermission.role_id).group_by(Role.id, Role.name).order_by(func.count(RolePermission.id).desc())),
+        # 角色用户数量分布
+        rows(select(
             Role.name,
             func.count(User.id)
-        ).join(User, Role.id == User.role_id).group_by(Role.id, Role.name).order_by(func.count(User.id).desc())
+        ).join(User, Role.id == User.role_id).group_by(Role.id, Role.name).order_by(func.count(User.id).desc())),
     )
-    role_users_data = [{"role": row[0], "user_count": row[1]} for row in role_users_query.all()]
+    role_permissions_data = [{"role": row[0], "permission_count": row[1]} for row in role_permissions_rows]
+    role_users_data = [{"role": row[0], "user_count": row[1]} for row in role_users_rows]
 
     return {
         "role_permissions_distribution": role_permissions_data,
@@ -293,6 +296,12 @@ async def get_roles_analytics(
     }
 
 
+@router.get("/cache-stats", dependencies=[Depends(require_permissions("analytics.view"))])
+async def response_cache_stats():
+    """查看仪表盘/分析接口响应缓存的命中统计"""
+    return await response_cache.stats()
+
+
 @router.delete("/data/{data_type}", dependencies=[Depends(require_permissions("analytics.delete"))])
 async def delete_analytics_data(
     data_type: str,
@@ -315,36 +324,57 @@ async def delete_analytics_data(
     return {"message": f"已清理 {data_type} 数据"}
 
 
+def flatten_report(data: dict) -> list[tuple]:
+    """把分析数据展开为 (分类, 项目, 指标, 数值) 行，用于 CSV/XLSX 导出。"""
+    rows = []
+    for section, value in data.items():
+        if isinstance(value, list):
+            for item in value:
+                values = list(item.values())
+                keys = list(item.keys())
+                for field, field_value in zip(keys[1:], values[1:]):
+                    rows.append((section, values[0], field, field_value))
+        elif isinstance(value, dict):
+            for field, field_value in value.items():
+                rows.append((section, "", field, field_value))
+        else:
+            rows.append((section, "", "", value))
+    return rows
+
+
 @router.get("/export/{report_type}", dependencies=[Depends(require_permissions("analytics.export"))])
 async def export_analytics_report(
     report_type: str,
-    session: AsyncSession = Depends(get_session),
+    format: str = Query("json"),
     current_user: User = Depends(get_current_user)
 ):
-    """导出分析报告"""
+    """导出分析报告（json 或 csv/xlsx 文件）"""
 
     supported_types = ["projects", "tasks", "users", "teams", "roles"]
 
     if report_type not in supported_types:
         raise HTTPException(status_code=400, detail=f"不支持的报告类型: {report_type}")
+    if format != "json" and format not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"不支持的导出格式，可选值: json, {', '.join(FORMATS)}")
 
     # 根据报告类型获取数据
     if report_type == "projects":
-        data = await get_projects_analytics(session, current_user)
+        data = await get_projects_analytics(current_user)
     elif report_type == "tasks":
-        data = await get_tasks_analytics(session, current_user)
+        data = await get_tasks_analytics(current_user)
     elif report_type == "users":
-        data = await get_users_analytics(session, current_user)
+        data = await get_users_analytics(current_user)
     elif report_type == "teams":
-        data = await get_teams_analytics(session, current_user)
+        data = await get_teams_analytics(current_user)
     elif report_type == "roles":
-        data = await get_roles_analytics(session, current_user)
+        data = await get_roles_analytics(current_user)
 
-    # 这里可以实现实际的导出逻辑（如生成CSV、PDF等）
-    # 暂时返回JSON数据
+    if format != "json":
+        stream, extension = render(["分类", "项目", "指标", "数值"], iter_rows(flatten_report(data)), format, title=report_type)
+        return streaming_file(stream, export_filename(f"analytics_{report_type}", extension), extension)
 
     return {
         "report_type": report_type,
         "exported_at": datetime.now().isoformat(),
         "data": data
-    }
\ No newline at end of file
+    }
@@ -4,14 +4,15 @@
 - POST /auth/login：校验凭证并返回 JWT 访问令牌
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status, Header, Request
+from fastapi import APIRouter, Depends, HTTPException, status, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
 from db.session import get_session
 from db.models.user import User, LoginLog
 from db.models.role import Role
-from core.security import verify_password, create_access_token, decode_token, get_password_hash
+from core.security import verify_password_async, create_access_token, get_password_hash_async
+from core import user_cache
 from schemas.auth import LoginRequest, Token, Me
 from schemas.user import UserProfileUpdate, UserPasswordChange, LoginLogOut
 from api.deps.auth import get_current_user, get_user_permissions
@@ -29,8 +30,10 @@ async def login(
     # 根据用户名查询用户
     q = await session.execute(select(User).where(User.username == payload.username))
     user = q.scalar_one_or_none()
+    # 结束只读事务，哈希计算期间不占用连接池中的数据库连接
+    await session.commit()
     # 校验密码
-    if not user or not verify_password(payload.password, user.password_hash):
+    if not user or not await verify_password_async(payload.password, user.password_hash):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="用户名或密码错误")
     if not user.is_active:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="账号已被禁用")
@@ -51,6 +54,7 @@ async def login(
     session.add(user)
     
     await session.commit()
+    user_cache.evict(user.id)
 
     # 生成访问令牌
     token = create_access_token(subject=str(user.id))
@@ -59,30 +63,13 @@ async def login(
 
 @router.get("/me", response_model=Me)
 async def me(
-    authorization: str | None = Header(default=None),
+    user: User = Depends(get_current_user),
     session: AsyncSession = Depends(get_session),
 ):
     """获取当前登录用户的简要信息。
 
-    从 Authorization: Bearer <token> 解析并校验 JWT，返回用户 id 与用户名。
+    凭证解析与用户校验复用 get_current_user（含令牌与用户快照缓存）。
     """
-    if not authorization or not authorization.startswith("Bearer "):
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="未提供凭证")
-    token = authorization.removeprefix("Bearer ").strip()
-    payload = decode_token(token)
-    if not payload:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="凭证无效或已过期")
-    user_id = payload.get("sub")
-    if not user_id:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="凭证无效")
-
-    q = await session.execute(select(User).where(User.id == int(user_id)))
-    user = q.scalar_one_or_none()
-    if not user:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="用户不存在")
-    if not user.is_active:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="账号已被禁用")
-    
     # 获取角色信息
     role_name = None
     if user.role_id:
@@ -136,6 +123,7 @@ async def update_me(
     
     session.add(current_user)
     await session.commit()
+    user_cache.evict(current_user.id)
     await session.refresh(current_user)
     
     # 获取角色信息
@@ -169,14 +157,17 @@ async def change_password(
     session: AsyncSession = Depends(get_session)
 ):
     """修改当前用户的密码"""
+    # 用户快照不含密码哈希，需单独加载
+    await session.refresh(current_user, ["password_hash"])
     # 验证当前密码
-    if not verify_password(payload.old_password, current_user.password_hash):
+    if not await verify_password_async(payload.old_password, current_user.password_hash):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="当前密码错误")
     
     # 更新密码
-    current_user.password_hash = get_password_hash(payload.new_password)
+    current_user.password_hash = await get_password_hash_async(payload.new_password)
     session.add(current_user)
     await session.commit()
+    user_cache.evict(current_user.id)
     
     return {"message": "密码修改成功"}
 
@@ -1,84 +1,87 @@
 """仪表盘路由：统计数据和概览信息。"""
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import joinedload, selectinload
 from datetime import datetime, timedelta
+from typing import Optional
 
-from db.session import get_session
+from db.session import get_session, AsyncSessionLocal
 from db.models.project import Project
 from db.models.task import Task, TaskAssignee
 from db.models.user import User
-from db.models.team import Team
+from db.models.team import Team, TeamMember
+from db.models.role import Role
+from db.models.permission import RolePermission
+from db.models.activity import ActivityEvent
 from api.deps.auth import get_current_user
+from core.pagination import paginate
+from api.deps.session import release_session
+from core.query_fanout import fanout, scalar, rows
+from core.response_cache import response_cache, register_invalidation
 
 router = APIRouter(prefix="/dashboard", tags=["dashboard"])
 
+# 数据提交后清除相关的仪表盘/分析缓存
+register_invalidation(Project, "dashboard", "analytics.projects")
+register_invalidation(Task, "dashboard", "analytics.projects", "analytics.tasks")
+register_invalidation(User, "dashboard", "analytics.projects", "analytics.people")
+register_invalidation(Team, "dashboard", "analytics.projects", "analytics.people")
+register_invalidation(TeamMember, "analytics.people")
+register_invalidation(Role, "analytics.people")
+register_invalidation(RolePermission, "analytics.people")
+register_invalidation(ActivityEvent, "dashboard")
+
 
 @router.get("/stats")
 async def get_dashboard_stats(
-    session: AsyncSession = Depends(get_session),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    _: None = Depends(release_session),
 ):
-    """获取仪表盘统计数据"""
-
-    # 项目统计
-    projects_q = await session.execute(select(func.count(Project.id)))
-    total_projects = projects_q.scalar()
-
-    # 任务统计
-    tasks_q = await session.execute(select(func.count(Task.id)))
-    total_tasks = tasks_q.scalar()
-
-    completed_tasks_q = await session.execute(
-        select(func.count(Task.id)).where(Task.status == "已完成")
-    )
-    completed_tasks = completed_tasks_q.scalar()
-
-    in_progress_tasks_q = await session.execute(
-        select(func.count(Task.id)).where(Task.status == "进行中")
-    )
-    in_progress_tasks = in_progress_tasks_q.scalar()
-
-    pending_tasks_q = await session.execute(
-        select(func.count(Task.id)).where(Task.status == "待处理")
-    )
-    pending_tasks = pending_tasks_q.scalar()
+    """获取仪表盘统计数据（全局数据，走响应缓存）"""
+    return await response_cache.get_or_compute("dashboard", "stats", compute_dashboard_stats)
 
-    # 用户统计
-    users_q = await session.execute(select(func.count(User.id)))
-    total_users = users_q.scalar()
 
-    # 团队统计
-    teams_q = await session.execute(select(func.count(Team.id)))
-    total_teams = teams_q.scalar()
-
-    # 最近7天创建的任务
+async def compute_dashboard_stats() -> dict:
+    """计算仪表盘统计数据（各项统计在独立连接上并发查询）"""
     seven_days_ago = datetime.now() - timedelta(days=7)
-    recent_tasks_q = await session.execute(
-        select(func.count(Task.id)).where(Task.created_at >= seven_days_ago)
-    )
-    recent_tasks = recent_tasks_q.scalar()
 
-    # 最近7天完成的任务
-    recent_completed_q = await session.execute(
-        select(func.count(Task.id)).where(
+    (
+        total_projects,
+        status_rows,
+        total_users,
+        total_teams,
+        recent_tasks,
+        recent_completed,
+    ) = await fanout(
+        # 项目统计
+        scalar(select(func.count(Project.id))),
+        # 任务按状态统计（一次 GROUP BY 代替逐个状态 COUNT）
+        rows(select(Task.status, func.count(Task.id)).group_by(Task.status)),
+        # 用户统计
+        scalar(select(func.count(User.id))),
+        # 团队统计
+        scalar(select(func.count(Team.id))),
+        # 最近7天创建的任务
+        scalar(select(func.count(Task.id)).where(Task.created_at >= seven_days_ago)),
+        # 最近7天完成的任务
+        scalar(select(func.count(Task.id)).where(
             Task.status == "已完成",
             Task.updated_at >= seven_days_ago
-        )
+        )),
     )
-    recent_completed = recent_completed_q.scalar()
+    status_counts = {status: count for status, count in status_rows}
 
     return {
         "projects": {
             "total": total_projects,
         },
         "tasks": {
-            "total": total_tasks,
-            "completed": completed_tasks,
-            "in_progress": in_progress_tasks,
-            "pending": pending_tasks,
+            "total": sum(status_counts.values()),
+            "completed": status_counts.get("已完成", 0),
+            "in_progress": status_counts.get("进行中", 0),
+            "pending": status_counts.get("待处理", 0),
             "recent_created": recent_tasks,
             "recent_completed": recent_completed,
         },
@@ -93,65 +96,63 @@ async def get_dashboard_stats(
 
 @router.get("/recent-activity")
 async def get_recent_activity(
-    session: AsyncSession = Depends(get_session),
+    response: Response,
     current_user: User = Depends(get_current_user),
-    limit: int = 10
+    limit: int = Query(10, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="分页游标（上一页响应头 X-Next-Cursor）"),
+    project_id: Optional[int] = Query(None, description="按项目过滤"),
+    actor_id: Optional[int] = Query(None, description="按操作人过滤"),
 ):
-    """获取最近活动"""
-
-    # 最近创建的项目
-    recent_projects_q = await session.execute(
-        select(Project).options(selectinload(Project.owner)).order_by(Project.created_at.desc()).limit(limit)
+    """获取最近活动（全局数据，走响应缓存）
+
+    返回活动列表；还有更早的活动时通过响应头 X-Next-Cursor 返回下一页游标。
+    """
+    feed = await response_cache.get_or_compute(
+        "dashboard",
+        "recent-activity",
+        lambda: compute_recent_activity(limit, cursor, project_id, actor_id),
+        params={"limit": limit, "cursor": cursor, "project_id": project_id, "actor_id": actor_id},
     )
-    recent_projects = recent_projects_q.scalars().all()
-
-    # 最近创建的任务
-    recent_tasks_q = await session.execute(
-        select(Task).options(selectinload(Task.creator)).order_by(Task.created_at.desc()).limit(limit)
-    )
-    recent_tasks = recent_tasks_q.scalars().all()
+    if feed["next_cursor"]:
+        response.headers["X-Next-Cursor"] = feed["next_cursor"]
+    return feed["items"]
+
+
+async def compute_recent_activity(
+    limit: int,
+    cursor: str | None = None,
+    project_id: int | None = None,
+    actor_id: int | None = None,
+) -> dict:
+    """读取活动记录（按 created_at, id 倒序的键集分页；缓存刷新可能发生在请求结束后，使用独立会话）"""
+    stmt = select(ActivityEvent).options(joinedload(ActivityEvent.actor))
+    if project_id is not None:
+        stmt = stmt.where(ActivityEvent.project_id == project_id)
+    if actor_id is not None:
+        stmt = stmt.where(ActivityEvent.actor_id == actor_id)
+
+    async with AsyncSessionLocal() as session:
+        result = await paginate(
+            session,
+            stmt,
+            keys=[(ActivityEvent.created_at, True), (ActivityEvent.id, True)],
+            count_stmt=select(ActivityEvent.id),
+            page_size=limit,
+            cursor=cursor,
+            total_mode="none",
+        )
 
-    # 最近更新的任务
-    recent_updated_tasks_q = await session.execute(
-        select(Task).options(selectinload(Task.creator)).where(Task.updated_at.isnot(None)).order_by(Task.updated_at.desc()).limit(limit)
-    )
-    recent_updated_tasks = recent_updated_tasks_q.scalars().all()
-
-    activities = []
-
-    # 添加项目创建活动
-    for project in recent_projects:
-        activities.append({
-            "type": "project_created",
-            "title": f"创建了项目 '{project.name}'",
-            "timestamp": project.created_at.isoformat(),
-            "user": project.owner.nickname or project.owner.username if project.owner else "未知用户"
-        })
-
-    # 添加任务创建活动
-    for task in recent_tasks:
-        activities.append({
-            "type": "task_created",
-            "title": f"创建了任务 '{task.title}'",
-            "timestamp": task.created_at.isoformat(),
-            "user": task.creator.nickname or task.creator.username if task.creator else "未知用户",
-            "project": task.project.name if task.project else None
-        })
-
-    # 添加任务更新活动
-    for task in recent_updated_tasks:
-        if task.updated_at != task.created_at:  # 只显示真正更新的任务
-            activities.append({
-                "type": "task_updated",
-                "title": f"更新了任务 '{task.title}'",
-                "timestamp": task.updated_at.isoformat(),
-                "user": task.creator.nickname or task.creator.username if task.creator else "未知用户",
-                "project": task.project.name if task.project else None
-            })
-
-    # 按时间排序并限制数量
-    activities.sort(key=lambda x: x["timestamp"], reverse=True)
-    return activities[:limit]
+    items = [
+        {
+            "type": event.type,
+            "title": event.title,
+            "timestamp": event.created_at.isoformat(),
+            "user": event.actor.nickname or event.actor.username if event.actor else "未知用户",
+            "project": event.project_name,
+        }
+        for event in result["items"]
+    ]
+    return {"items": items, "next_cursor": result["next_cursor"]}
 
 
 @router.get("/pending-tasks")
@@ -0,0 +1,87 @@
+"""数据导出路由（中文注释）。
+
+- GET  /exports/{dataset}       流式下载（CSV/XLSX，CSV 可 gzip）
+- POST /exports/{dataset}/jobs  后台导出，完成后通过通知告知下载地址
+- GET  /exports/files/{id}      下载后台导出的文件（仅发起人）
+"""
+
+import os
+from datetime import datetime
+
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi.responses import FileResponse, StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from urllib.parse import quote
+
+from db.session import get_session
+from db.models.export import ExportFile
+from db.models.user import User
+from api.deps.auth import get_current_user, require_permissions
+from core.export import DATASETS, FORMATS, MEDIA_TYPES, iter_dataset, render, export_filename, enqueue_export_job
+
+router = APIRouter(prefix="/exports", tags=["exports"])
+
+
+def check_export_params(dataset: str, format: str):
+    if dataset not in DATASETS:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"不支持的导出数据: {dataset}，可选值: {', '.join(DATASETS)}")
+    if format not in FORMATS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"不支持的导出格式，可选值: {', '.join(FORMATS)}")
+
+
+def attachment_headers(filename: str) -> dict:
+    return {"Content-Disposition": f"attachment; filename*=UTF-8''{quote(filename)}"}
+
+
+def streaming_file(stream, filename: str, extension: str) -> StreamingResponse:
+    """以附件形式流式返回（文件名按 RFC 5987 编码，支持中文）。"""
+    return StreamingResponse(
+        stream,
+        media_type=MEDIA_TYPES[extension],
+        headers=attachment_headers(filename),
+    )
+
+
+@router.get("/files/{export_id}")
+async def download_export_file(
+    export_id: str,
+    session: AsyncSession = Depends(get_session),
+    current_user: User = Depends(get_current_user)
+):
+    """下载后台导出的文件（仅导出发起人，过期后不可下载）"""
+    export = (await session.execute(
+        select(ExportFile).where(ExportFile.id == export_id, ExportFile.user_id == current_user.id)
+    )).scalar_one_or_none()
+    if not export or export.expires_at < datetime.utcnow() or not os.path.isfile(export.path):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="导出文件不存在或已过期")
+    extension = export.filename.split(".", 1)[1]
+    return FileResponse(export.path, media_type=MEDIA_TYPES[extension], headers=attachment_headers(export.filename))
+
+
+@router.get("/{dataset}", dependencies=[Depends(require_permissions("analytics.export"))])
+async def export_dataset(
+    dataset: str,
+    format: str = Query("csv"),
+    gzip: bool = Query(False),
+):
+    """流式导出全部数据（内存占用与行数无关）"""
+    check_export_params(dataset, format)
+    item = DATASETS[dataset]
+    stream, extension = render(item.headers, iter_dataset(item), format, gzip, item.title)
+    return streaming_file(stream, export_filename(dataset, extension), extension)
+
+
+@router.post("/{dataset}/jobs", status_code=status.HTTP_202_ACCEPTED, dependencies=[Depends(require_permissions("analytics.export"))])
+async def create_export_job(
+    dataset: str,
+    format: str = Query("csv"),
+    gzip: bool = Query(False),
+    session: AsyncSession = Depends(get_session),
+    current_user: User = Depends(get_current_user)
+):
+    """后台导出：完成后发送通知，通知内容为下载地址"""
+    check_export_params(dataset, format)
+    job = enqueue_export_job(session, dataset, format, gzip, current_user.id)
+    await session.commit()
+    return {"message": "导出任务已提交，完成后将通过通知告知", "job_id": job.id}
@@ -0,0 +1,46 @@
+"""指标路由：Prometheus 文本格式的 /metrics（无 API 前缀，供采集端抓取）。"""
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from db.session import AsyncSessionLocal
+from core import metrics, user_cache
+from core.outbox import queue_stats
+from core.permission_cache import permission_cache
+from core.response_cache import response_cache
+from core.unread_counter import unread_counter
+from api.routes.ws import manager as ws_manager
+
+router = APIRouter(tags=["metrics"])
+
+
+async def _extra_gauges() -> dict:
+    """WebSocket 连接、各缓存与外发箱队列的当前状态。"""
+    caches = {
+        "permission": permission_cache.stats(),
+        "user": user_cache.stats(),
+        "unread_count": unread_counter.stats(),
+        "response": await response_cache.stats(),
+    }
+    gauges = {
+        "ws_state": ("WebSocket 连接与发送队列", "field", ws_manager.metrics()),
+        "app_cache_size": ("缓存条目数", "cache", {k: v["size"] for k, v in caches.items()}),
+        "app_cache_hits": ("缓存命中次数", "cache", {k: v["hits"] for k, v in caches.items()}),
+        "app_cache_misses": ("缓存未命中次数", "cache", {k: v["misses"] for k, v in caches.items()}),
+        "app_cache_hit_ratio": ("缓存命中率", "cache", {k: v["hit_ratio"] for k, v in caches.items()}),
+    }
+    try:
+        async with AsyncSessionLocal() as session:
+            gauges["outbox_queue"] = ("外发箱队列状态", "field", await queue_stats(session))
+    except Exception as e:
+        print(f"读取外发箱队列状态失败: {e}")
+    return gauges
+
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def get_metrics():
+    """Prometheus 指标"""
+    return PlainTextResponse(
+        metrics.render(await _extra_gauges()),
+        media_type="text/plain; version=0.0.4; charset=utf-8",
+    )
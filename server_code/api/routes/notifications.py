@@ -2,13 +2,20 @@
 
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, update
+from sqlalchemy import select, update
 from typing import List
 
 from db.session import get_session
-from db.models.notification import Notification
-from schemas.notification import NotificationOut, NotificationListResponse
+from db.models.notification import Notification, NotificationArchive
+from schemas.notification import (
+    NotificationOut,
+    NotificationListResponse,
+    NotificationArchiveOut,
+    NotificationArchiveListResponse,
+)
 from api.deps.auth import get_current_user
+from core.pagination import paginate
+from core.unread_counter import unread_counter
 from db.models.user import User
 
 router = APIRouter(prefix="/notifications", tags=["notifications"])
@@ -19,6 +26,8 @@ async def list_notifications(
     page: int = Query(1, ge=1),
     page_size: int = Query(20, ge=1, le=100),
     only_unread: bool = Query(False),
+    cursor: str | None = None,
+    total_mode: str | None = None,
     session: AsyncSession = Depends(get_session),
     current_user: User = Depends(get_current_user)
 ):
@@ -27,34 +36,69 @@ async def list_notifications(
     if only_unread:
         filters.append(Notification.is_read == False)
 
-    # 获取总数
-    total_stmt = select(func.count()).select_from(
-        select(Notification).where(*filters).subquery()
+    # 获取未读数量（计数器缓存）
+    unread_count = await unread_counter.get(session, current_user.id)
+
+    # 获取通知列表：未读的排在前面，再按时间倒序
+    result = await paginate(
+        session,
+        select(Notification).where(*filters),
+        keys=[(Notification.is_read, False), (Notification.created_at, True), (Notification.id, True)],
+        count_stmt=select(Notification.id).where(*filters),
+        page=page,
+        page_size=page_size,
+        cursor=cursor,
+        total_mode=total_mode,
     )
-    total = (await session.execute(total_stmt)).scalar_one()
 
-    # 获取未读数量
-    unread_stmt = select(func.count()).where(
-        Notification.user_id == current_user.id,
-        Notification.is_read == False
+    return NotificationListResponse(
+        total=result["total"],
+        items=[NotificationOut.model_validate(n) for n in result["items"]],
+        unread_count=unread_count,
+        next_cursor=result["next_cursor"],
+        prev_cursor=result["prev_cursor"],
     )
-    unread_count = (await session.execute(unread_stmt)).scalar_one()
 
-    # 获取通知列表
-    stmt = select(Notification).where(*filters).order_by(
-        Notification.is_read.asc(),  # 未读的排在前面
-        Notification.created_at.desc()
-    ).offset((page - 1) * page_size).limit(page_size)
 
-    notifications = (await session.execute(stmt)).scalars().all()
+@router.get("/archive", response_model=NotificationArchiveListResponse)
+async def list_archived_notifications(
+    page: int = Query(1, ge=1),
+    page_size: int = Query(20, ge=1, le=100),
+    cursor: str | None = None,
+    total_mode: str | None = None,
+    session: AsyncSession = Depends(get_session),
+    current_user: User = Depends(get_current_user)
+):
+    """获取已归档的通知（按时间倒序）"""
+    condition = NotificationArchive.user_id == current_user.id
+    result = await paginate(
+        session,
+        select(NotificationArchive).where(condition),
+        keys=[(NotificationArchive.created_at, True), (NotificationArchive.id, True)],
+        count_stmt=select(NotificationArchive.id).where(condition),
+        page=page,
+        page_size=page_size,
+        cursor=cursor,
+        total_mode=total_mode,
+    )
 
-    return NotificationListResponse(
-        total=total,
-        items=[NotificationOut.model_validate(n) for n in notifications],
-        unread_count=unread_count
+    return NotificationArchiveListResponse(
+        total=result["total"],
+        items=[NotificationArchiveOut.model_validate(n) for n in result["items"]],
+        next_cursor=result["next_cursor"],
+        prev_cursor=result["prev_cursor"],
     )
 
 
+@router.get("/unread-count")
+async def get_unread_count(
+    session: AsyncSession = Depends(get_session),
+    current_user: User = Depends(get_current_user)
+):
+    """获取未读通知数量（轻量接口，供通知铃铛轮询）"""
+    return {"unread_count": await unread_counter.get(session, current_user.id)}
+
+
 @router.put("/{notification_id}/read")
 async def mark_notification_read(
     notification_id: int,
@@ -71,8 +115,10 @@ async def mark_notification_read(
     if not notification:
         raise HTTPException(status_code=404, detail="通知不存在")
 
-    notification.is_read = True
-    await session.commit()
+    if not notification.is_read:
+        notification.is_read = True
+        await session.commit()
+        await unread_counter.apply(session, current_user.id, -1)
 
     return {"message": "已标记为已读"}
 
@@ -88,9 +134,12 @@ async def mark_all_notifications_read(
         Notification.is_read == False
     ).values(is_read=True)
 
-    await session.execute(stmt)
+    result = await session.execute(stmt)
     await session.commit()
 
+    if result.rowcount:
+        await unread_counter.apply(session, current_user.id, -result.rowcount)
+
     return {"message": "已标记所有通知为已读"}
 
 
@@ -110,7 +159,10 @@ async def delete_notification(
     if not notification:
         raise HTTPException(status_code=404, detail="通知不存在")
 
+    was_unread = not notification.is_read
     await session.delete(notification)
     await session.commit()
+    if was_unread:
+        await unread_counter.apply(session, current_user.id, -1)
 
     return {"message": "通知已删除"}
\ No newline at end of file
@@ -6,6 +6,7 @@ from db.session import get_session
 from db.models.user import User
 from db.models.permission import Permission
 from core.security import decode_token
+from core.permission_cache import permission_cache
 from schemas.permission import PermissionOut, PermissionGroupOut
 from api.deps.auth import require_permissions
 
@@ -47,3 +48,9 @@ async def list_permissions_grouped(session: AsyncSession = Depends(get_session))
     for p in items:
         groups.setdefault(p.group, []).append(PermissionOut(id=p.id, code=p.code, name=p.name, group=p.group, description=p.description))
     return [{"group": g, "items": v} for g, v in groups.items()]
+
+
+@router.get("/cache-stats", dependencies=[Depends(require_permissions("roles.view"))])
+async def permission_cache_stats():
+    """权限缓存命中统计（用于观察认证热点路径）。"""
+    return permission_cache.stats()
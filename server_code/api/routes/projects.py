@@ -1,14 +1,12 @@
 """项目路由：列表、创建、详情。"""
 
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Query, Request
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, or_, delete, func
+from sqlalchemy import select, or_, delete, func, case
 from sqlalchemy.orm import selectinload
 from datetime import date, timedelta, datetime
 import json
 import os
-import uuid
 import shutil
 
 from db.session import get_session
@@ -18,8 +16,14 @@ from db.models.role import Role
 from db.models.user_role import UserRole
 from db.models.team import TeamMember
 from db.models.task import Task
-from core.notification_service import NotificationService
+from core import outbox
+from core.activity import record_activity
+from core.uploads import save_upload
+from core.downloads import file_response
+from core import thumbnails
 from api.deps.auth import require_permissions, get_current_user
+from core.pagination import paginate
+from core.config import UPLOAD_DIR  # 文件上传目录（位于服务端根目录下）
 from schemas.project import (
     ProjectCreate,
     ProjectUpdate,
@@ -37,13 +41,54 @@ from schemas.project import (
 
 router = APIRouter(prefix="/projects", tags=["projects"])
 
-# 文件上传目录（相对于项目根目录）
-BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-UPLOAD_DIR = os.path.join(BASE_DIR, "uploads")
+# 视为"未完成"之外的任务状态
+CLOSED_TASK_STATUSES = ("已完成", "已取消")
+
+
+async def load_task_counters(session: AsyncSession, project_ids: list[int]) -> dict[int, tuple[int, int]]:
+    """按项目批量统计任务数，返回 {project_id: (总任务数, 未完成任务数)}。
+
+    使用一次 GROUP BY 聚合（COUNT + SUM(CASE ...)）完成，不再逐个项目加载任务行。
+    """
+    if not project_ids:
+        return {}
+    incomplete = func.sum(case((Task.status.not_in(CLOSED_TASK_STATUSES), 1), else_=0))
+    res = await session.execute(
+        select(Task.project_id, func.count(Task.id), incomplete)
+        .where(Task.project_id.in_(project_ids))
+        .group_by(Task.project_id)
+    )
+    return {pid: (int(total or 0), int(open_ or 0)) for pid, total, open_ in res.all()}
+
+
+async def load_leader_ids(session: AsyncSession, project_ids: list[int]) -> dict[int, list[int]]:
+    """按项目批量获取负责人ID列表（一次 IN 查询）。"""
+    if not project_ids:
+        return {}
+    res = await session.execute(
+        select(ProjectMember.project_id, ProjectMember.user_id).where(
+            ProjectMember.project_id.in_(project_ids),
+            ProjectMember.role == "负责人"
+        )
+    )
+    leaders: dict[int, list[int]] = {}
+    for pid, uid in res.all():
+        leaders.setdefault(pid, []).append(uid)
+    return leaders
 
 
 @router.get("/", response_model=list[ProjectBrief], dependencies=[Depends(require_permissions("projects.view"))])
-async def list_projects(session: AsyncSession = Depends(get_session), current_user: User = Depends(get_current_user)):
+async def list_projects(
+    session: AsyncSession = Depends(get_session),
+    current_user: User = Depends(get_current_user),
+    before_id: int | None = Query(None, ge=1, description="游标分页：只返回 id 小于该值的项目"),
+    limit: int | None = Query(None, ge=1, le=500, description="游标分页：每页数量，不传则返回全部"),
+):
+    """项目列表。
+
+    查询次数与项目数量无关：项目列 1 次 + 任务聚合 1 次 + 负责人 1 次。
+    传入 limit 时按 id 倒序进行键集分页，下一页使用本页最后一个 id 作为 before_id。
+    """
     # 检查用户是否为超级管理员
     user_roles_q = await session.execute(
         select(Role).join(UserRole, UserRole.role_id == Role.id).where(UserRole.user_id == current_user.id)
@@ -55,13 +100,22 @@ async def list_projects(session: AsyncSession = Depends(get_session), current_us
         ).scalar_one_or_none().is_superadmin
     )
     
-    base_query = select(Project)
+    # 只取列表需要的列，避免加载 description 等大字段
+    base_query = select(
+        Project.id,
+        Project.name,
+        Project.status,
+        Project.team_id,
+        Project.development_days,
+        Project.start_date,
+        Project.end_date,
+        Project.created_at,
+    )
     if not is_superadmin:
         # 普通用户只能看到：
         # 1. 自己作为负责人的项目
         # 2. 自己作为项目成员的项目  
         # 3. 自己所属团队的项目
-        from db.models.team import TeamMember
         base_query = base_query.where(
             or_(
                 Project.owner_id == current_user.id,
@@ -73,55 +127,38 @@ async def list_projects(session: AsyncSession = Depends(get_session), current_us
                 )
             )
         )
-    
-    q = await session.execute(base_query.order_by(Project.id.desc()))
-    projects = q.scalars().all()
-    
-    # 为每个项目计算任务数量
+    if before_id is not None:
+        base_query = base_query.where(Project.id < before_id)
+    base_query = base_query.order_by(Project.id.desc())
+    if limit is not None:
+        base_query = base_query.limit(limit)
+
+    rows = (await session.execute(base_query)).mappings().all()
+    project_ids = [row["id"] for row in rows]
+
+    # 批量加载任务统计和负责人
+    counters = await load_task_counters(session, project_ids)
+    leaders = await load_leader_ids(session, project_ids)
+
     result = []
-    for project in projects:
-        # 计算总任务数
-        total_tasks_q = await session.execute(
-            select(Task).where(Task.project_id == project.id)
-        )
-        total_tasks = len(total_tasks_q.scalars().all())
-        
-        # 计算未完成任务数（状态不为"已完成"且不为"已取消"的任务）
-        incomplete_tasks_q = await session.execute(
-            select(Task).where(Task.project_id == project.id, Task.status != "已完成", Task.status != "已取消")
-        )
-        incomplete_tasks = len(incomplete_tasks_q.scalars().all())
-        
-        # 获取项目负责人列表
-        leaders_q = await session.execute(
-            select(ProjectMember.user_id).where(
-                ProjectMember.project_id == project.id,
-                ProjectMember.role == "负责人"
-            )
-        )
-        leader_ids = [row[0] for row in leaders_q]
-        
-        # 创建带有任务统计的项目对象
-        project_dict = {
-            "id": project.id,
-            "name": project.name,
-            "status": project.status,
-            "leader_ids": leader_ids,
-            "team_id": project.team_id,
-            "development_days": project.development_days,
-            "start_date": project.start_date,
-            "end_date": project.end_date,
-            "created_at": project.created_at,
+    for row in rows:
+        total_tasks, incomplete_tasks = counters.get(row["id"], (0, 0))
+        result.append({
+            **row,
+            "leader_ids": leaders.get(row["id"], []),
             "total_tasks": total_tasks,
             "incomplete_tasks": incomplete_tasks,
-        }
-        result.append(project_dict)
+        })
     
     return result
 
 
 @router.post("/", response_model=ProjectDetail, status_code=status.HTTP_201_CREATED, dependencies=[Depends(require_permissions("projects.create"))])
-async def create_project(payload: ProjectCreate, session: AsyncSession = Depends(get_session)):
+async def create_project(
+    payload: ProjectCreate,
+    session: AsyncSession = Depends(get_session),
+    current_user: User = Depends(get_current_user)
+):
     # 自动计算开始日期和结束日期
     start_date = payload.start_date or date.today()  # 默认今天开始
     end_date = payload.end_date
@@ -140,8 +177,7 @@ async def create_project(payload: ProjectCreate, session: AsyncSession = Depends
         end_date=end_date,
     )
     session.add(project)
-    await session.commit()
-    await session.refresh(project)
+    await session.flush()
     
     # 如果指定了项目负责人，批量创建项目成员记录
     if payload.leader_ids:
@@ -153,36 +189,26 @@ async def create_project(payload: ProjectCreate, session: AsyncSession = Depends
                 role="负责人"
             )
             session.add(member)
-        await session.commit()
         
         # 给项目负责人发送通知
-        await NotificationService.create_project_member_added_notifications(
-            session, payload.leader_ids, None, project
-        )
+        outbox.enqueue(session, "notification.project_member_added", {
+            "project_id": project.id, "user_ids": payload.leader_ids, "adder_id": None,
+        })
     
     # 如果指定了团队，给团队成员发送通知
     if project.team_id:
-        from db.models.team import TeamMember
-        # 获取团队成员
-        team_members_q = await session.execute(
-            select(TeamMember.user_id).where(TeamMember.team_id == project.team_id)
-        )
-        team_member_ids = [row[0] for row in team_members_q]
-        
-        if team_member_ids:
-            await NotificationService.create_team_project_assigned_notifications(
-                session, team_member_ids, project
-            )
+        outbox.enqueue(session, "notification.team_project_assigned", {
+            "project_id": project.id, "team_id": project.team_id,
+        })
     
     # 创建项目专属目录
     project_dir = os.path.join(UPLOAD_DIR, "projects", str(project.id))
-    tasks_dir = os.path.join(project_dir, "tasks")
-    try:
-        os.makedirs(project_dir, exist_ok=True)
-        os.makedirs(tasks_dir, exist_ok=True)
-    except Exception as e:
-        # 记录错误但不影响项目创建
-        print(f"创建项目目录失败: {str(e)}")
+    outbox.enqueue(session, "fs.makedirs", {"paths": [os.path.join(project_dir, "tasks")]})
+    record_activity(session, "project_created", f"创建了项目 '{project.name}'", current_user, project)
+    
+    # 项目、成员与外发箱事件一次提交；通知和目录创建由后台 worker 执行
+    await session.commit()
+    await session.refresh(project)
     
     return project
 
@@ -194,25 +220,9 @@ async def get_project(project_id: int, session: AsyncSession = Depends(get_sessi
     if not project:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="项目不存在")
     
-    # 获取项目负责人列表
-    leaders_q = await session.execute(
-        select(ProjectMember.user_id).where(
-            ProjectMember.project_id == project_id,
-            ProjectMember.role == "负责人"
-        )
-    )
-    leader_ids = [row[0] for row in leaders_q]
-    
-    # 计算任务统计
-    total_tasks_q = await session.execute(
-        select(Task).where(Task.project_id == project_id)
-    )
-    total_tasks = len(total_tasks_q.scalars().all())
-    
-    incomplete_tasks_q = await session.execute(
-        select(Task).where(Task.project_id == project_id, Task.status != "已完成", Task.status != "已取消")
-    )
-    incomplete_tasks = len(incomplete_tasks_q.scalars().all())
+    # 获取项目负责人列表与任务统计
+    leader_ids = (await load_leader_ids(session, [project_id])).get(project_id, [])
+    total_tasks, incomplete_tasks = (await load_task_counters(session, [project_id])).get(project_id, (0, 0))
     
     # 手动构造返回对象
     return {
@@ -304,23 +314,16 @@ async def update_project(
     elif payload.end_date is not None:
         project.end_date = payload.end_date
     
+    # 如果团队发生了变化，给新团队成员发送通知
+    if payload.team_id is not None and payload.team_id != original_team_id:
+        outbox.enqueue(session, "notification.team_project_assigned", {
+            "project_id": project.id, "team_id": payload.team_id,
+        })
+    
+    record_activity(session, "project_updated", f"更新了项目 '{project.name}'", current_user, project)
     await session.commit()
     await session.refresh(project)
     
-    # 如果团队发生了变化，给新团队成员发送通知
-    if payload.team_id is not None and payload.team_id != original_team_id and payload.team_id is not None:
-        from db.models.team import TeamMember
-        # 获取新团队成员
-        team_members_q = await session.execute(
-            select(TeamMember.user_id).where(TeamMember.team_id == payload.team_id)
-        )
-        team_member_ids = [row[0] for row in team_members_q]
-        
-        if team_member_ids:
-            await NotificationService.create_team_project_assigned_notifications(
-                session, team_member_ids, project
-            )
-    
     return project
 
 
@@ -368,6 +371,7 @@ async def delete_project(
             print(f"删除项目目录失败: {str(e)}")
     
     # 删除项目（级联删除会处理相关数据）
+    record_activity(session, "project_deleted", f"删除了项目 '{project.name}'", current_user, project)
     await session.delete(project)
     await session.commit()
     return {"ok": True}
@@ -379,6 +383,7 @@ async def list_attachments(project_id: int, session: AsyncSession = Depends(get_
         select(ProjectAttachment).where(ProjectAttachment.project_id == project_id).order_by(ProjectAttachment.id.desc())
     )
     attachments = q.scalars().all()
+    thumbnail_urls = await thumbnails.thumbnail_urls(session, (att.sha256 for att in attachments))
     
     # 填充上传者姓名
     result = []
@@ -390,7 +395,8 @@ async def list_attachments(project_id: int, session: AsyncSession = Depends(get_
             'file_size': att.file_size,
             'uploaded_by': att.uploaded_by,
             'uploaded_at': att.uploaded_at,
-            'uploader_name': None
+            'uploader_name': None,
+            'thumbnail_url': thumbnail_urls.get(att.sha256),
         }
         
         # 获取上传者信息
@@ -410,6 +416,8 @@ async def list_comments(
     project_id: int,
     page: int = 1,
     page_size: int = 20,
+    cursor: str | None = None,
+    total_mode: str | None = None,
     session: AsyncSession = Depends(get_session)
 ):
     """获取项目评论列表"""
@@ -418,20 +426,18 @@ async def list_comments(
     if not project_res.scalar_one_or_none():
         raise HTTPException(status_code=404, detail="项目不存在")
 
-    # 获取评论总数
-    count_res = await session.execute(
-        select(func.count(ProjectComment.id)).where(ProjectComment.project_id == project_id)
-    )
-    total = count_res.scalar()
-
     # 获取评论列表
-    comments_res = await session.execute(
-        select(ProjectComment).where(ProjectComment.project_id == project_id)
-        .order_by(ProjectComment.created_at.desc())
-        .offset((page - 1) * page_size)
-        .limit(page_size)
+    result = await paginate(
+        session,
+        select(ProjectComment).where(ProjectComment.project_id == project_id),
+        keys=[(ProjectComment.created_at, True), (ProjectComment.id, True)],
+        count_stmt=select(ProjectComment.id).where(ProjectComment.project_id == project_id),
+        page=page,
+        page_size=page_size,
+        cursor=cursor,
+        total_mode=total_mode,
     )
-    comments = comments_res.scalars().all()
+    comments = result["items"]
 
     # 填充用户信息
     comment_list = []
@@ -475,9 +481,11 @@ async def list_comments(
 
     return {
         "items": comment_list,
-        "total": total,
+        "total": result["total"],
         "page": page,
-        "page_size": page_size
+        "page_size": page_size,
+        "next_cursor": result["next_cursor"],
+        "prev_cursor": result["prev_cursor"],
     }
 
 
@@ -536,18 +544,19 @@ async def add_comment(project_id: int, payload: CommentCreate, user: User = Depe
         mentioned_users=mentioned_users_json
     )
     session.add(c)
-    await session.commit()
-    await session.refresh(c)
+    record_activity(session, "comment_created", f"评论了项目 '{project.name}'", user, project)
     
-    # 创建@提及通知
+    # 创建@提及通知（随评论一起提交，由后台 worker 发送）
     if payload.mentioned_user_ids:
-        await NotificationService.create_mention_notifications(
-            session=session,
-            mentioned_user_ids=payload.mentioned_user_ids,
-            mentioner=user,
-            project_id=project_id,
-            comment_content=payload.content
-        )
+        outbox.enqueue(session, "notification.mention", {
+            "user_ids": payload.mentioned_user_ids,
+            "mentioner_id": user.id,
+            "project_id": project_id,
+            "content": payload.content,
+        })
+    
+    await session.commit()
+    await session.refresh(c)
     
     # 手动构建返回字典，解析 JSON 字符串
     mentioned_list = []
@@ -631,18 +640,17 @@ async def update_comment(
     else:
         comment.mentioned_users = None
     
-    await session.commit()
-    await session.refresh(comment)
-    
     # 创建@提及通知
     if payload.mentioned_user_ids:
-        await NotificationService.create_mention_notifications(
-            session=session,
-            mentioned_user_ids=payload.mentioned_user_ids,
-            mentioner=current_user,
-            project_id=comment.project_id,
-            comment_content=payload.content
-        )
+        outbox.enqueue(session, "notification.mention", {
+            "user_ids": payload.mentioned_user_ids,
+            "mentioner_id": current_user.id,
+            "project_id": comment.project_id,
+            "content": payload.content,
+        })
+    
+    await session.commit()
+    await session.refresh(comment)
     
     # 返回时填充用户信息
     comment_dict = {
@@ -686,43 +694,44 @@ async def upload_attachment(
     if not project:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="项目不存在")
     
-    # 生成唯一文件名
-    file_ext = os.path.splitext(file.filename)[1]
-    unique_filename = f"{uuid.uuid4()}{file_ext}"
-    
-    # 使用项目专属目录
+    # 流式保存到项目专属目录（检查大小上限与项目配额）
     project_dir = os.path.join(UPLOAD_DIR, "projects", str(project_id))
-    os.makedirs(project_dir, exist_ok=True)
-    file_path = os.path.join(project_dir, unique_filename)
-    
-    # 保存文件并获取文件大小
-    file_size = 0
-    try:
-        with open(file_path, "wb") as f:
-            shutil.copyfileobj(file.file, f)
-        file_size = os.path.getsize(file_path)
-    except Exception as e:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"文件保存失败: {str(e)}")
+    stored = await save_upload(session, file, project_dir, project_id=project_id)
     
     # 创建数据库记录
     attachment = ProjectAttachment(
         project_id=project_id,
         filename=file.filename,  # 保存原始文件名
-        url=f"/uploads/projects/{project_id}/{unique_filename}",  # 包含项目ID的URL路径
-        file_size=file_size,  # 保存文件大小
+        url=f"/uploads/projects/{project_id}/{stored.filename}",  # 包含项目ID的URL路径
+        file_size=stored.size,  # 保存文件大小
+        sha256=stored.sha256,
         uploaded_by=current_user.id,
         uploaded_at=datetime.now()
     )
     session.add(attachment)
+    thumbnails.schedule(session, stored.sha256, file.filename)
+    record_activity(session, "attachment_uploaded", f"上传了附件 '{file.filename}'", current_user, project)
     await session.commit()
     await session.refresh(attachment)
-    
-    return attachment
+
+    # 与附件列表返回相同的字段（相同内容已有缩略图时直接返回）
+    thumbnail_urls = await thumbnails.thumbnail_urls(session, [attachment.sha256])
+    return AttachmentBrief(
+        id=attachment.id,
+        filename=attachment.filename,
+        url=attachment.url,
+        file_size=attachment.file_size,
+        uploaded_by=attachment.uploaded_by,
+        uploaded_at=attachment.uploaded_at,
+        uploader_name=current_user.nickname or current_user.username,
+        thumbnail_url=thumbnail_urls.get(attachment.sha256),
+    )
 
 
 @router.get("/attachments/{attachment_id}/download", dependencies=[Depends(require_permissions("projects.view"))])
 async def download_attachment(
     attachment_id: int,
+    request: Request,
     session: AsyncSession = Depends(get_session)
 ):
     # 获取附件信息
@@ -743,15 +752,9 @@ async def download_attachment(
         unique_filename = attachment.url.split('/')[-1]
         file_path = os.path.join(UPLOAD_DIR, unique_filename)
     
-    # 检查文件是否存在
-    if not os.path.exists(file_path):
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="文件不存在")
-    
-    # 返回文件
-    return FileResponse(
-        path=file_path,
-        filename=attachment.filename,  # 使用原始文件名
-        media_type='application/octet-stream'
+    # 返回文件（支持 Range 续传与 ETag 条件请求；文件名为 uuid，内容不变）
+    return await file_response(
+        request, file_path, attachment.filename, sha256=attachment.sha256, immutable=True
     )
 
 
@@ -804,6 +807,7 @@ async def delete_attachment(
             print(f"删除文件失败: {str(e)}")
     
     # 删除数据库记录
+    record_activity(session, "attachment_deleted", f"删除了附件 '{attachment.filename}'", current_user, project)
     await session.delete(attachment)
     await session.commit()
     
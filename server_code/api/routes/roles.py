@@ -7,6 +7,7 @@ from db.models.role import Role
 from db.models.permission import Permission, RolePermission
 from db.models.user import User
 from core.security import decode_token
+from core.permission_cache import permission_cache
 from schemas.user import RoleOut
 from schemas.permission import RolePermissionUpdate
 from api.deps.auth import require_permissions
@@ -72,6 +73,7 @@ async def delete_role(role_id: int, session: AsyncSession = Depends(get_session)
     await session.execute(delete(RolePermission).where(RolePermission.role_id == role_id))
     await session.execute(delete(Role).where(Role.id == role_id))
     await session.commit()
+    permission_cache.invalidate_all()
     return {"ok": True}
 
 
@@ -106,4 +108,5 @@ async def set_role_permissions(role_id: int, payload: RolePermissionUpdate, sess
         for pid in valid_ids:
             session.add(RolePermission(role_id=role_id, permission_id=pid))
     await session.commit()
+    permission_cache.invalidate_all()
     return {"ok": True}
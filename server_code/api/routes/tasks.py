@@ -1,9 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Request
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, and_, or_, delete
+from sqlalchemy import select, and_, or_, delete
+from sqlalchemy.orm import joinedload, selectinload
 from datetime import datetime
 import os
-import uuid
 import json
 from typing import Optional, List
 
@@ -14,7 +14,13 @@ from db.models.project import Project
 from core.security import decode_token
 from schemas.task import TaskOut, TaskCreate, TaskListResponse, TaskUpdate, TaskQuery, TaskCommentCreate
 from schemas.project import AttachmentBrief
-from core.notification_service import NotificationService
+from core import outbox
+from core.activity import record_activity
+from core.uploads import save_upload
+from core.downloads import file_response
+from core import thumbnails
+from core.pagination import paginate
+from core.config import UPLOAD_DIR
 from api.deps.auth import require_permissions, get_current_user
 
 router = APIRouter(prefix="/tasks", tags=["tasks"])
@@ -23,6 +29,29 @@ router = APIRouter(prefix="/tasks", tags=["tasks"])
 TASK_STATUSES = ["待处理", "进行中", "已完成", "已取消"]
 TASK_PRIORITIES = ["低", "中", "高", "紧急"]
 
+def select_tasks_with_relations():
+    """带关联数据的任务查询。
+
+    项目与创建人随主查询 JOIN 加载，负责人及其用户用一次 selectin 查询加载，
+    无论一页多少条任务，总共只需 2 次查询。
+    """
+    return select(Task).options(
+        joinedload(Task.project),
+        joinedload(Task.creator),
+        selectinload(Task.assignees).joinedload(TaskAssignee.user),
+    )
+
+
+async def load_task(session: AsyncSession, task_id: int) -> Task | None:
+    """按 ID 加载任务及其关联数据（覆盖会话中已有的旧状态）。"""
+    res = await session.execute(
+        select_tasks_with_relations()
+        .where(Task.id == task_id)
+        .execution_options(populate_existing=True)
+    )
+    return res.unique().scalar_one_or_none()
+
+
 # 任务模型转换函数
 def to_task_out(t: Task) -> TaskOut:
     # 获取负责人信息
@@ -64,8 +93,13 @@ async def list_tasks(
     status: Optional[str] = None,
     priority: Optional[str] = None,
     exclude_status: Optional[str] = None,
+    cursor: Optional[str] = None,
+    total_mode: Optional[str] = None,
 ):
-    """分页查询任务列表"""
+    """分页查询任务列表
+
+    支持页码分页与游标分页（cursor），游标模式默认不执行 COUNT。
+    """
     filters = []
     if project_id:
         filters.append(Task.project_id == project_id)
@@ -83,39 +117,27 @@ async def list_tasks(
         exclude_list = [s.strip() for s in exclude_status.split(',') if s.strip()]
         filters.append(Task.status.not_in(exclude_list))
 
-    base_stmt = select(Task).where(and_(*filters)) if filters else select(Task)
-    count_stmt = select(func.count()).select_from(base_stmt.subquery())
-    total = (await session.execute(count_stmt)).scalar_one()
-
-    stmt = base_stmt.order_by(Task.created_at.desc()).offset((page - 1) * page_size).limit(page_size)
-    res = await session.execute(stmt)
-    tasks = res.scalars().all()
-
-    # 加载关联数据
-    items = []
-    for t in tasks:
-        await session.refresh(t, ['assignees', 'project', 'creator'])
-        # 加载负责人用户信息
-        for assignee_rel in t.assignees:
-            await session.refresh(assignee_rel, ['user'])
-        items.append(to_task_out(t))
-
-    return {"total": total, "items": items}
+    stmt = select_tasks_with_relations().where(*filters)
+    result = await paginate(
+        session,
+        stmt,
+        keys=[(Task.created_at, True), (Task.id, True)],
+        count_stmt=select(Task.id).where(*filters),
+        page=page,
+        page_size=page_size,
+        cursor=cursor,
+        total_mode=total_mode,
+    )
+    result["items"] = [to_task_out(t) for t in result["items"]]
+    return result
 
 
 @router.get("/{task_id}", response_model=TaskOut, dependencies=[Depends(require_permissions("tasks.view"))])
 async def get_task(task_id: int, session: AsyncSession = Depends(get_session)):
     """获取单个任务"""
-    res = await session.execute(select(Task).where(Task.id == task_id))
-    task = res.scalar_one_or_none()
+    task = await load_task(session, task_id)
     if not task:
         raise HTTPException(status_code=404, detail="任务不存在")
-
-    await session.refresh(task, ['assignees', 'project', 'creator'])
-    # 加载负责人用户信息
-    for assignee_rel in task.assignees:
-        await session.refresh(assignee_rel, ['user'])
-    
     return to_task_out(task)
 
 
@@ -194,8 +216,7 @@ async def create_task(
         due_date=due_date,
     )
     session.add(task)
-    await session.commit()
-    await session.refresh(task)
+    await session.flush()
 
     # 添加多个负责人
     if payload.assignee_ids:
@@ -205,25 +226,19 @@ async def create_task(
                 user_id=assignee_id
             )
             session.add(task_assignee)
-        await session.commit()
 
-    await session.refresh(task, ['assignees', 'project', 'creator'])
-    # 加载负责人用户信息
-    for assignee_rel in task.assignees:
-        await session.refresh(assignee_rel, ['user'])
-    
-    # 发送通知给负责人
-    if payload.assignee_ids:
-        await send_task_assignment_notifications(session, task, payload.assignee_ids, current_user)
-    
+        # 发送通知给负责人
+        send_task_assignment_notifications(session, task, payload.assignee_ids, current_user)
+
     # 附件文件夹创建（按项目/任务分组）：projects/{project_id}/tasks/{task_id}
-    project_folder = os.path.join(UPLOAD_DIR, "projects", str(task.project_id))
-    task_folder = os.path.join(project_folder, "tasks", str(task.id))
-    try:
-        os.makedirs(task_folder, exist_ok=True)
-    except Exception as e:
-        # 记录但不阻止任务创建
-        print(f"创建任务附件目录失败: {e}")
+    task_folder = os.path.join(UPLOAD_DIR, "projects", str(task.project_id), "tasks", str(task.id))
+    outbox.enqueue(session, "fs.makedirs", {"paths": [task_folder]})
+    record_activity(session, "task_created", f"创建了任务 '{task.title}'", current_user, project, task.id)
+
+    # 任务、负责人与外发箱事件一次提交；通知和目录创建由后台 worker 执行
+    await session.commit()
+
+    task = await load_task(session, task.id)
 
     return to_task_out(task)
 
@@ -324,19 +339,20 @@ async def update_task(
             )
             session.add(task_assignee)
     
+    project = await session.get(Project, task.project_id)
+    record_activity(session, "task_updated", f"更新了任务 '{task.title}'", current_user, project, task.id)
     await session.commit()
-    await session.refresh(task)
 
-    await session.refresh(task, ['assignees', 'project', 'creator'])
-    # 加载负责人用户信息
-    for assignee_rel in task.assignees:
-        await session.refresh(assignee_rel, ['user'])
-    
+    task = await load_task(session, task_id)
     return to_task_out(task)
 
 
 @router.delete("/{task_id}", dependencies=[Depends(require_permissions("tasks.delete"))])
-async def delete_task(task_id: int, session: AsyncSession = Depends(get_session)):
+async def delete_task(
+    task_id: int,
+    session: AsyncSession = Depends(get_session),
+    current_user: User = Depends(get_current_user)
+):
     """删除任务"""
     res = await session.execute(select(Task).where(Task.id == task_id))
     task = res.scalar_one_or_none()
@@ -349,13 +365,14 @@ async def delete_task(task_id: int, session: AsyncSession = Depends(get_session)
         import shutil
         shutil.rmtree(task_folder, ignore_errors=True)
 
+    project = await session.get(Project, task.project_id)
+    record_activity(session, "task_deleted", f"删除了任务 '{task.title}'", current_user, project, task.id)
     await session.delete(task)
     await session.commit()
     return {"ok": True}
 
 
 # 附件相关路由
-UPLOAD_DIR = "uploads"
 
 
 @router.get("/{task_id}/attachments", response_model=list[AttachmentBrief], dependencies=[Depends(require_permissions("tasks.view"))])
@@ -370,9 +387,11 @@ async def list_task_attachments(task_id: int, session: AsyncSession = Depends(ge
     res = await session.execute(
         select(TaskAttachment)
         .where(TaskAttachment.task_id == task_id)
+        .options(selectinload(TaskAttachment.uploader))
         .order_by(TaskAttachment.uploaded_at.desc())
     )
     attachments = res.scalars().all()
+    thumbnail_urls = await thumbnails.thumbnail_urls(session, (a.sha256 for a in attachments))
 
     result = []
     for a in attachments:
@@ -380,9 +399,11 @@ async def list_task_attachments(task_id: int, session: AsyncSession = Depends(ge
             id=a.id,
             filename=a.original_filename,
             url=f"/uploads/projects/{task.project_id}/tasks/{task_id}/{a.filename}",
+            uploaded_by=a.uploaded_by,
             uploaded_at=a.uploaded_at,
             file_size=a.file_size,
-            uploader_name=a.uploader.nickname or a.uploader.username if a.uploader else "未知"
+            uploader_name=a.uploader.nickname or a.uploader.username if a.uploader else "未知",
+            thumbnail_url=thumbnail_urls.get(a.sha256),
         ))
     return result
 
@@ -392,6 +413,7 @@ async def upload_task_attachment(
     task_id: int,
     file: UploadFile = File(...),
     session: AsyncSession = Depends(get_session),
+    current_user: User = Depends(get_current_user)
 ):
     """上传任务附件"""
     # 验证任务存在并获取任务信息
@@ -402,52 +424,63 @@ async def upload_task_attachment(
     if not task:
         raise HTTPException(status_code=404, detail="任务不存在")
 
-    # 创建任务专属目录：projects/{project_id}/tasks/{task_id}/
+    # 流式保存到任务专属目录：projects/{project_id}/tasks/{task_id}/（检查大小上限与项目配额）
     task_dir = os.path.join(UPLOAD_DIR, "projects", str(task.project_id), "tasks", str(task_id))
-    try:
-        os.makedirs(task_dir, exist_ok=True)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"创建任务目录失败: {str(e)}")
-
-    # 生成唯一文件名
-    file_ext = os.path.splitext(file.filename)[1]
-    unique_filename = f"{uuid.uuid4()}{file_ext}"
-    file_path = os.path.join(task_dir, unique_filename)
-
-    # 保存文件
-    try:
-        content = await file.read()
-        with open(file_path, "wb") as f:
-            f.write(content)
-        file_size = len(content)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"文件保存失败: {str(e)}")
+    stored = await save_upload(session, file, task_dir, project_id=task.project_id)
 
     # 创建数据库记录
     attachment = TaskAttachment(
         task_id=task_id,
-        filename=unique_filename,
+        filename=stored.filename,
         original_filename=file.filename,
-        file_path=file_path,
-        file_size=file_size,
-        uploaded_by=1,  # TODO: 从认证中获取当前用户ID
+        file_path=stored.path,
+        file_size=stored.size,
+        sha256=stored.sha256,
+        uploaded_by=current_user.id,
     )
     session.add(attachment)
+    thumbnails.schedule(session, stored.sha256, file.filename)
+    project = await session.get(Project, task.project_id)
+    record_activity(session, "attachment_uploaded", f"上传了附件 '{file.filename}'", current_user, project, task_id)
     await session.commit()
     await session.refresh(attachment)
 
+    # 与附件列表返回相同的字段（相同内容已有缩略图时直接返回）
+    thumbnail_urls = await thumbnails.thumbnail_urls(session, [attachment.sha256])
     return AttachmentBrief(
         id=attachment.id,
         filename=attachment.original_filename,
         url=f"/uploads/projects/{task.project_id}/tasks/{task_id}/{attachment.filename}",
+        uploaded_by=attachment.uploaded_by,
         uploaded_at=attachment.uploaded_at,
         file_size=attachment.file_size,
-        uploader_name=attachment.uploader.nickname or attachment.uploader.username if attachment.uploader else "未知"
+        uploader_name=current_user.nickname or current_user.username,
+        thumbnail_url=thumbnail_urls.get(attachment.sha256),
+    )
+
+
+@router.get("/attachments/{attachment_id}/download", dependencies=[Depends(require_permissions("tasks.view"))])
+async def download_task_attachment(
+    attachment_id: int,
+    request: Request,
+    session: AsyncSession = Depends(get_session)
+):
+    """下载任务附件（支持 Range 续传与 ETag 条件请求）"""
+    res = await session.execute(select(TaskAttachment).where(TaskAttachment.id == attachment_id))
+    attachment = res.scalar_one_or_none()
+    if not attachment:
+        raise HTTPException(status_code=404, detail="附件不存在")
+    return await file_response(
+        request, attachment.file_path, attachment.original_filename, sha256=attachment.sha256, immutable=True
     )
 
 
 @router.delete("/attachments/{attachment_id}", dependencies=[Depends(require_permissions("tasks.update"))])
-async def delete_task_attachment(attachment_id: int, session: AsyncSession = Depends(get_session)):
+async def delete_task_attachment(
+    attachment_id: int,
+    session: AsyncSession = Depends(get_session),
+    current_user: User = Depends(get_current_user)
+):
     """删除任务附件"""
     res = await session.execute(select(TaskAttachment).where(TaskAttachment.id == attachment_id))
     attachment = res.scalar_one_or_none()
@@ -462,6 +495,12 @@ async def delete_task_attachment(attachment_id: int, session: AsyncSession = Dep
         print(f"删除文件失败: {e}")  # 不抛出错误，继续删除数据库记录
 
     # 删除数据库记录
+    task = await session.get(Task, attachment.task_id)
+    project = await session.get(Project, task.project_id) if task else None
+    record_activity(
+        session, "attachment_deleted", f"删除了附件 '{attachment.original_filename}'",
+        current_user, project, attachment.task_id
+    )
     await session.delete(attachment)
     await session.commit()
     return {"ok": True}
@@ -470,14 +509,13 @@ async def delete_task_attachment(attachment_id: int, session: AsyncSession = Dep
 # 获取项目成员列表（用于任务负责人选择）- 通过团队成员接口获取
 # 此接口已移除，请使用 /teams/{team_id}/members 接口
 # 通知相关函数
-async def send_task_assignment_notifications(session: AsyncSession, task: Task, assignee_ids: List[int], assigner: User):
-    """发送任务分配通知"""
-    await NotificationService.create_task_assigned_notifications(
-        session=session,
-        assignee_ids=assignee_ids,
-        assigner=assigner,
-        task=task
-    )
+def send_task_assignment_notifications(session: AsyncSession, task: Task, assignee_ids: List[int], assigner: User):
+    """发送任务分配通知（写入外发箱，随当前事务提交）"""
+    outbox.enqueue(session, "notification.task_assigned", {
+        "task_id": task.id,
+        "user_ids": assignee_ids,
+        "assigner_id": assigner.id,
+    })
 
 # 任务评论相关API
 @router.get("/{task_id}/comments", response_model=dict, dependencies=[Depends(require_permissions("tasks.view"))])
@@ -485,6 +523,8 @@ async def get_task_comments(
     task_id: int,
     page: int = 1,
     page_size: int = 20,
+    cursor: Optional[str] = None,
+    total_mode: Optional[str] = None,
     session: AsyncSession = Depends(get_session)
 ):
     """获取任务评论列表"""
@@ -493,20 +533,18 @@ async def get_task_comments(
     if not task_res.scalar_one_or_none():
         raise HTTPException(status_code=404, detail="任务不存在")
 
-    # 获取评论总数
-    count_res = await session.execute(
-        select(func.count(TaskComment.id)).where(TaskComment.task_id == task_id)
-    )
-    total = count_res.scalar()
-
-    # 获取评论列表
-    comments_res = await session.execute(
-        select(TaskComment).where(TaskComment.task_id == task_id)
-        .order_by(TaskComment.created_at.desc())
-        .offset((page - 1) * page_size)
-        .limit(page_size)
+    # 获取评论列表（评论者随查询一并加载）
+    result = await paginate(
+        session,
+        select(TaskComment).where(TaskComment.task_id == task_id).options(joinedload(TaskComment.user)),
+        keys=[(TaskComment.created_at, True), (TaskComment.id, True)],
+        count_stmt=select(TaskComment.id).where(TaskComment.task_id == task_id),
+        page=page,
+        page_size=page_size,
+        cursor=cursor,
+        total_mode=total_mode,
     )
-    comments = comments_res.scalars().all()
+    comments = result["items"]
 
     # 格式化评论数据
     comment_list = []
@@ -525,9 +563,11 @@ async def get_task_comments(
 
     return {
         "items": comment_list,
-        "total": total,
+        "total": result["total"],
         "page": page,
-        "page_size": page_size
+        "page_size": page_size,
+        "next_cursor": result["next_cursor"],
+        "prev_cursor": result["prev_cursor"],
     }
 
 
@@ -541,7 +581,8 @@ async def create_task_comment(
     """创建任务评论"""
     # 验证任务存在
     task_res = await session.execute(select(Task).where(Task.id == task_id))
-    if not task_res.scalar_one_or_none():
+    task = task_res.scalar_one_or_none()
+    if not task:
         raise HTTPException(status_code=404, detail="任务不存在")
 
     # 将mentioned_users转换为JSON字符串存储
@@ -556,6 +597,8 @@ async def create_task_comment(
         mentioned_users=mentioned_users_json
     )
     session.add(comment)
+    project = await session.get(Project, task.project_id)
+    record_activity(session, "comment_created", f"评论了任务 '{task.title}'", current_user, project, task_id)
     await session.commit()
     await session.refresh(comment)
 
@@ -1,6 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, delete
+from sqlalchemy import select, delete, func, case
 
 from db.session import get_session
 from db.models.team import Team, TeamMember
@@ -9,13 +9,31 @@ from db.models.role import Role
 from db.models.user_role import UserRole
 from core.notification_service import NotificationService
 from api.deps.auth import require_permissions, get_current_user, get_user_permissions
+from core.pagination import paginate
 from schemas.team import TeamCreate
 
 router = APIRouter(prefix="/teams", tags=["teams"])
 
 
+async def load_team_member_counts(session: AsyncSession, team_ids: list[int]) -> dict[int, tuple[int, int]]:
+    """按团队批量统计成员数与在线人数（一次 GROUP BY），返回 {team_id: (成员数, 在线数)}。
+
+    在线人数按 users.online 统计，该列由在线状态服务根据所有 worker 的连接维护。
+    """
+    if not team_ids:
+        return {}
+    online = func.sum(case((User.online == True, 1), else_=0))
+    res = await session.execute(
+        select(TeamMember.team_id, func.count(TeamMember.id), online)
+        .join(User, User.id == TeamMember.user_id)
+        .where(TeamMember.team_id.in_(team_ids))
+        .group_by(TeamMember.team_id)
+    )
+    return {team_id: (int(total or 0), int(online_ or 0)) for team_id, total, online_ in res.all()}
+
+
 @router.get("/")
-async def list_teams(session: AsyncSession = Depends(get_session), current_user: User = Depends(get_current_user), page: int = Query(1, ge=1), page_size: int = Query(10, ge=1, le=100), q: str | None = None):
+async def list_teams(session: AsyncSession = Depends(get_session), current_user: User = Depends(get_current_user), page: int = Query(1, ge=1), page_size: int = Query(10, ge=1, le=100), q: str | None = None, cursor: str | None = None, total_mode: str | None = None):
     # 检查权限：需要teams.view权限，或者只返回用户所属的团队
     has_full_permission = False
 
@@ -37,27 +55,23 @@ async def list_teams(session: AsyncSession = Depends(get_session), current_user:
         user_team_ids = select(TeamMember.team_id).where(TeamMember.user_id == current_user.id)
         filters.append(Team.id.in_(user_team_ids))
 
-    base = select(Team)
-    if filters:
-        from sqlalchemy import and_ as _and
-        base = base.where(_and(*filters))
-    total = (await session.execute(select(func.count()).select_from(base.subquery()))).scalar_one()
-    rows = (await session.execute(base.order_by(Team.id.desc()).offset((page-1)*page_size).limit(page_size))).scalars().all()
+    result = await paginate(
+        session,
+        select(Team).where(*filters),
+        keys=[(Team.id, True)],
+        count_stmt=select(Team.id).where(*filters),
+        page=page,
+        page_size=page_size,
+        cursor=cursor,
+        total_mode=total_mode,
+    )
+    rows = result["items"]
     
-    # 获取每个团队的成员数和在线成员数
+    # 一次查询统计每个团队的成员数与在线人数
+    counts = await load_team_member_counts(session, [t.id for t in rows])
     items = []
     for t in rows:
-        # 总成员数
-        member_count_stmt = select(func.count()).select_from(TeamMember).where(TeamMember.team_id == t.id)
-        member_count = (await session.execute(member_count_stmt)).scalar_one()
-        
-        # 在线成员数
-        online_count_stmt = select(func.count()).select_from(TeamMember).join(User, User.id == TeamMember.user_id).where(
-            TeamMember.team_id == t.id,
-            User.online == True
-        )
-        online_count = (await session.execute(online_count_stmt)).scalar_one()
-        
+        member_count, online_count = counts.get(t.id, (0, 0))
         items.append({
             "id": t.id,
             "name": t.name,
@@ -67,7 +81,8 @@ async def list_teams(session: AsyncSession = Depends(get_session), current_user:
             "online_count": online_count,
         })
     
-    return {"total": total, "items": items}
+    result["items"] = items
+    return result
 
 
 @router.get("/{team_id}")
@@ -100,14 +115,7 @@ async def get_team(team_id: int, session: AsyncSession = Depends(get_session), c
         raise HTTPException(status_code=404, detail="团队不存在")
     
     # 获取成员数和在线数
-    member_count_stmt = select(func.count()).select_from(TeamMember).where(TeamMember.team_id == team_id)
-    member_count = (await session.execute(member_count_stmt)).scalar_one()
-    
-    online_count_stmt = select(func.count()).select_from(TeamMember).join(User, User.id == TeamMember.user_id).where(
-        TeamMember.team_id == team_id,
-        User.online == True
-    )
-    online_count = (await session.execute(online_count_stmt)).scalar_one()
+    member_count, online_count = (await load_team_member_counts(session, [team_id])).get(team_id, (0, 0))
     
     return {
         "id": team.id,
@@ -0,0 +1,406 @@
+"""断点续传上传路由（中文注释）。
+
+- POST   /upload-sessions                        创建会话（声明目标、文件名、总大小）
+- GET    /upload-sessions/{id}                   查询会话与已收到的分块（用于续传）
+- PUT    /upload-sessions/{id}/chunks/{index}    上传一个分块（请求体为原始字节，可并发、可重试）
+- POST   /upload-sessions/{id}/complete          完成上传，生成项目附件或任务附件（重复调用返回同一附件）
+- DELETE /upload-sessions/{id}                   放弃上传
+"""
+
+import asyncio
+import hashlib
+import os
+import uuid
+from datetime import datetime, timedelta
+
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Header
+from sqlalchemy import select, update, delete, func, or_, and_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db.session import get_session
+from db.models.user import User
+from db.models.project import Project, ProjectAttachment
+from db.models.task import Task, TaskAttachment
+from db.models.upload import UploadChunk, UploadSession, UploadSessionStatus
+from api.deps.auth import get_current_user, get_user_permissions
+from core.config import settings, UPLOAD_DIR
+from core.activity import record_activity
+from core.uploads import upload_limit, too_large
+from core import blobs, thumbnails, upload_sessions
+from schemas.project import AttachmentBrief
+from schemas.upload import UploadSessionCreate, UploadSessionOut, UploadChunkOut
+
+router = APIRouter(prefix="/upload-sessions", tags=["uploads"])
+
+# 目标类型 -> 需要的权限
+TARGET_PERMISSIONS = {"project": "projects.update", "task": "tasks.update"}
+
+
+def _expires_at() -> datetime:
+    return datetime.utcnow() + timedelta(seconds=settings.UPLOAD_SESSION_TTL_SECONDS)
+
+
+def _finalize_stale_before() -> datetime:
+    return datetime.utcnow() - timedelta(seconds=settings.UPLOAD_SESSION_FINALIZE_TIMEOUT_SECONDS)
+
+
+def _interrupted(upload: UploadSession) -> bool:
+    """合并超时未完成（如进程在合并中退出）。"""
+    return (
+        upload.status == UploadSessionStatus.FINALIZING
+        and (upload.finalizing_at is None or upload.finalizing_at < _finalize_stale_before())
+    )
+
+
+async def _received_chunks(session: AsyncSession, session_id: str) -> list[int]:
+    res = await session.execute(
+        select(UploadChunk.chunk_index).where(UploadChunk.session_id == session_id).order_by(UploadChunk.chunk_index)
+    )
+    return list(res.scalars().all())
+
+
+async def _session_out(session: AsyncSession, upload: UploadSession) -> UploadSessionOut:
+    return UploadSessionOut(
+        id=upload.id,
+        target_type=upload.target_type,
+        target_id=upload.target_id,
+        filename=upload.filename,
+        total_size=upload.total_size,
+        chunk_size=upload.chunk_size,
+        chunk_count=upload_sessions.chunk_count(upload.total_size, upload.chunk_size),
+        received_chunks=await _received_chunks(session, upload.id),
+        status=upload.status,
+        attachment_id=upload.attachment_id,
+        expires_at=upload.expires_at,
+    )
+
+
+async def _get_own_session(session: AsyncSession, session_id: str, user: User) -> UploadSession:
+    upload = await session.get(UploadSession, session_id)
+    if not upload or upload.created_by != user.id:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="上传会话不存在或已过期")
+    return upload
+
+
+async def _attachment_brief(session: AsyncSession, upload: UploadSession) -> AttachmentBrief:
+    """会话生成的附件。"""
+    if upload.target_type == "project":
+        attachment = await session.get(ProjectAttachment, upload.attachment_id)
+        url = attachment.url if attachment else None
+        filename = attachment.filename if attachment else None
+    else:
+        attachment = await session.get(TaskAttachment, upload.attachment_id)
+        url = f"/uploads/projects/{upload.project_id}/tasks/{upload.target_id}/{attachment.filename}" if attachment else None
+        filename = attachment.original_filename if attachment else None
+    if not attachment:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="附件不存在")
+    uploader = await session.get(User, attachment.uploaded_by) if attachment.uploaded_by else None
+    thumbnail_urls = await thumbnails.thumbnail_urls(session, [attachment.sha256])
+    return AttachmentBrief(
+        id=attachment.id,
+        filename=filename,
+        url=url,
+        file_size=attachment.file_size,
+        uploaded_by=attachment.uploaded_by,
+        uploaded_at=attachment.uploaded_at,
+        uploader_name=uploader.nickname or uploader.username if uploader else "未知",
+        thumbnail_url=thumbnail_urls.get(attachment.sha256),
+    )
+
+
+@router.post("", response_model=UploadSessionOut, status_code=status.HTTP_201_CREATED)
+async def create_upload_session(
+    payload: UploadSessionCreate,
+    session: AsyncSession = Depends(get_session),
+    current_user: User = Depends(get_current_user)
+):
+    """创建上传会话"""
+    perms = await get_user_permissions(current_user, session)
+    if TARGET_PERMISSIONS[payload.target_type] not in perms:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="无权限")
+
+    if payload.target_type == "project":
+        project = await session.get(Project, payload.target_id)
+        if not project:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="项目不存在")
+        project_id = project.id
+    else:
+        task = await session.get(Task, payload.target_id)
+        if not task:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="任务不存在")
+        project_id = task.project_id
+
+    chunk_size = payload.chunk_size or settings.UPLOAD_SESSION_CHUNK_SIZE
+    if not settings.UPLOAD_SESSION_MIN_CHUNK_SIZE <= chunk_size <= settings.UPLOAD_SESSION_MAX_CHUNK_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"分块大小需在 {settings.UPLOAD_SESSION_MIN_CHUNK_SIZE} 到 {settings.UPLOAD_SESSION_MAX_CHUNK_SIZE} 字节之间",
+        )
+
+    # 先检查大小上限与项目配额（进行中的会话与上传预留都计入已用空间），避免传完才失败
+    limit, quota_limited = await upload_limit(session, project_id)
+    if payload.total_size > limit:
+        raise too_large(limit, quota_limited)
+
+    session_id = uuid.uuid4().hex
+    path = upload_sessions.temp_path(session_id)
+    try:
+        await asyncio.to_thread(upload_sessions.allocate, path, payload.total_size)
+    except OSError as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"创建临时文件失败: {str(e)}")
+
+    upload = UploadSession(
+        id=session_id,
+        target_type=payload.target_type,
+        target_id=payload.target_id,
+        project_id=project_id,
+        filename=payload.filename,
+        total_size=payload.total_size,
+        chunk_size=chunk_size,
+        temp_path=path,
+        created_by=current_user.id,
+        expires_at=_expires_at(),
+    )
+    session.add(upload)
+    await session.commit()
+
+    # 会话提交后再检查一次：并发创建的会话至少有一个能看到对方，合计不会超过配额
+    if settings.UPLOAD_PROJECT_QUOTA_BYTES > 0:
+        limit, quota_limited = await upload_limit(session, project_id, exclude_session=session_id)
+        if payload.total_size > limit:
+            await session.delete(upload)
+            await session.commit()
+            await asyncio.to_thread(upload_sessions.remove_file, path)
+            raise too_large(limit, quota_limited)
+    return await _session_out(session, upload)
+
+
+@router.get("/{session_id}", response_model=UploadSessionOut)
+async def get_upload_session(
+    session_id: str,
+    session: AsyncSession = Depends(get_session),
+    current_user: User = Depends(get_current_user)
+):
+    """查询会话状态与已收到的分块"""
+    upload = await _get_own_session(session, session_id, current_user)
+    return await _session_out(session, upload)
+
+
+@router.put("/{session_id}/chunks/{index}", response_model=UploadChunkOut)
+async def upload_chunk(
+    session_id: str,
+    index: int,
+    request: Request,
+    x_chunk_sha256: str | None = Header(default=None),
+    session: AsyncSession = Depends(get_session),
+    current_user: User = Depends(get_current_user)
+):
+    """上传一个分块；可带 X-Chunk-SHA256 头校验内容"""
+    upload = await _get_own_session(session, session_id, current_user)
+    if upload.status != UploadSessionStatus.UPLOADING:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="上传会话已完成")
+    if not 0 <= index < upload_sessions.chunk_count(upload.total_size, upload.chunk_size):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="分块序号超出范围")
+    expected = upload_sessions.chunk_length(upload, index)
+    # 接收请求体期间不占用数据库连接
+    await session.commit()
+
+    try:
+        fd = await asyncio.to_thread(upload_sessions.open_for_write, upload.temp_path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=status.HTTP_410_GONE, detail="上传会话已过期")
+
+    digest = hashlib.sha256()
+    size = 0
+    offset = index * upload.chunk_size
+    buffer = bytearray()
+    try:
+        async for data in request.stream():
+            size += len(data)
+            if size > expected:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"分块大小应为 {expected} 字节")
+            digest.update(data)
+            buffer += data
+            if len(buffer) >= settings.UPLOAD_CHUNK_SIZE:
+                await asyncio.to_thread(upload_sessions.write_at, fd, bytes(buffer), offset)
+                offset += len(buffer)
+                buffer.clear()
+        if buffer:
+            await asyncio.to_thread(upload_sessions.write_at, fd, bytes(buffer), offset)
+    finally:
+        os.close(fd)
+
+    if size != expected:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"分块大小应为 {expected} 字节")
+    sha256 = digest.hexdigest()
+    if x_chunk_sha256 and x_chunk_sha256.lower() != sha256:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="分块校验失败")
+
+    # 记录分块；重复上传同一分块只更新记录
+    chunk = (await session.execute(
+        select(UploadChunk).where(UploadChunk.session_id == session_id, UploadChunk.chunk_index == index)
+    )).scalar_one_or_none()
+    if chunk:
+        chunk.size = size
+        chunk.sha256 = sha256
+        chunk.received_at = datetime.utcnow()
+    else:
+        session.add(UploadChunk(session_id=session_id, chunk_index=index, size=size, sha256=sha256))
+    upload.expires_at = _expires_at()
+    try:
+        await session.commit()
+    except IntegrityError:
+        # 同一分块的并发重试已经写入记录
+        await session.rollback()
+
+    received = (await session.execute(
+        select(func.count(UploadChunk.id)).where(UploadChunk.session_id == session_id)
+    )).scalar_one()
+    return UploadChunkOut(index=index, size=size, received=received)
+
+
+@router.post("/{session_id}/complete", response_model=AttachmentBrief)
+async def complete_upload_session(
+    session_id: str,
+    session: AsyncSession = Depends(get_session),
+    current_user: User = Depends(get_current_user)
+):
+    """完成上传：合并后的文件移入附件目录并生成附件记录"""
+    upload = await _get_own_session(session, session_id, current_user)
+    if upload.status == UploadSessionStatus.COMPLETED:
+        return await _attachment_brief(session, upload)
+
+    received = await _received_chunks(session, session_id)
+    missing = sorted(set(range(upload_sessions.chunk_count(upload.total_size, upload.chunk_size))) - set(received))
+    if missing:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"还有 {len(missing)} 个分块未上传，例如: {missing[:20]}",
+        )
+
+    if upload.target_type == "project":
+        project = await session.get(Project, upload.target_id)
+        if not project:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="项目不存在")
+        directory = os.path.join(UPLOAD_DIR, "projects", str(project.id))
+    else:
+        task = await session.get(Task, upload.target_id)
+        if not task:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="任务不存在")
+        project = await session.get(Project, task.project_id)
+        directory = os.path.join(UPLOAD_DIR, "projects", str(task.project_id), "tasks", str(task.id))
+
+    limit, quota_limited = await upload_limit(session, upload.project_id, exclude_session=session_id)
+    if upload.total_size > limit:
+        raise too_large(limit, quota_limited)
+
+    # 条件更新认领会话，并发的完成请求只有一个继续执行；合并中断超时的会话可以重新认领。
+    # 认领时间同时作为令牌（取整到秒，与 MySQL DATETIME 精度一致）
+    claimed_at = datetime.utcnow().replace(microsecond=0)
+    claimed = await session.execute(
+        update(UploadSession)
+        .where(
+            UploadSession.id == session_id,
+            or_(
+                UploadSession.status == UploadSessionStatus.UPLOADING,
+                and_(
+                    UploadSession.status == UploadSessionStatus.FINALIZING,
+                    or_(UploadSession.finalizing_at.is_(None), UploadSession.finalizing_at < _finalize_stale_before()),
+                ),
+            ),
+        )
+        .values(status=UploadSessionStatus.FINALIZING, finalizing_at=claimed_at, expires_at=_expires_at())
+        .execution_options(synchronize_session=False)
+    )
+    await session.commit()
+    if claimed.rowcount == 0:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="上传会话正在处理，请稍后查询")
+    owned = and_(
+        UploadSession.id == session_id,
+        UploadSession.status == UploadSessionStatus.FINALIZING,
+        UploadSession.finalizing_at == claimed_at,
+    )
+
+    # 临时文件保留到数据库提交成功，任何一步失败都可以恢复为上传中并重试
+    filename = f"{uuid.uuid4()}{os.path.splitext(upload.filename)[1]}"
+    file_path = None
+    try:
+        sha256 = await asyncio.to_thread(upload_sessions.file_sha256, upload.temp_path)
+        file_path = await blobs.store(upload.temp_path, sha256, upload.total_size, directory, filename, keep_source=True)
+
+        if upload.target_type == "project":
+            attachment = ProjectAttachment(
+                project_id=project.id,
+                filename=upload.filename,
+                url=f"/uploads/projects/{project.id}/{filename}",
+                file_size=upload.total_size,
+                sha256=sha256,
+                uploaded_by=current_user.id,
+                uploaded_at=datetime.now()
+            )
+        else:
+            attachment = TaskAttachment(
+                task_id=upload.target_id,
+                filename=filename,
+                original_filename=upload.filename,
+                file_path=file_path,
+                file_size=upload.total_size,
+                sha256=sha256,
+                uploaded_by=current_user.id,
+            )
+        session.add(attachment)
+        thumbnails.schedule(session, sha256, upload.filename)
+        record_activity(
+            session, "attachment_uploaded", f"上传了附件 '{upload.filename}'", current_user, project,
+            upload.target_id if upload.target_type == "task" else None
+        )
+        await session.flush()
+
+        # 完成的会话保留一段时间，重复调用 complete 返回同一附件；
+        # 认领已超时被其他请求接管（或会话已被放弃）时不再写入
+        completed = await session.execute(
+            update(UploadSession)
+            .where(owned)
+            .values(status=UploadSessionStatus.COMPLETED, attachment_id=attachment.id, expires_at=_expires_at())
+            .execution_options(synchronize_session=False)
+        )
+        if completed.rowcount == 0:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="上传会话已被其他请求处理")
+        await session.commit()
+    except Exception as e:
+        await session.rollback()
+        if file_path:
+            await asyncio.to_thread(upload_sessions.remove_file, file_path)
+        await session.execute(
+            update(UploadSession)
+            .where(owned)
+            .values(status=UploadSessionStatus.UPLOADING, finalizing_at=None)
+            .execution_options(synchronize_session=False)
+        )
+        await session.commit()
+        if isinstance(e, OSError):
+            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"文件保存失败: {str(e)}")
+        raise
+
+    await asyncio.to_thread(upload_sessions.remove_file, upload.temp_path)
+    upload = await session.get(UploadSession, session_id, populate_existing=True)
+    return await _attachment_brief(session, upload)
+
+
+@router.delete("/{session_id}")
+async def abort_upload_session(
+    session_id: str,
+    session: AsyncSession = Depends(get_session),
+    current_user: User = Depends(get_current_user)
+):
+    """放弃上传，删除临时文件"""
+    upload = await _get_own_session(session, session_id, current_user)
+    # 合并中断超时的会话也可以放弃
+    if upload.status == UploadSessionStatus.FINALIZING and not _interrupted(upload):
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="上传会话正在处理")
+    await asyncio.to_thread(upload_sessions.remove_file, upload.temp_path)
+    await session.execute(delete(UploadChunk).where(UploadChunk.session_id == session_id))
+    await session.delete(upload)
+    await session.commit()
+    return {"ok": True}
@@ -1,38 +1,25 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Header, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, and_, or_, delete
+from sqlalchemy import select, or_, delete
 from datetime import datetime, timedelta
 
 from db.session import get_session
 from db.models.user import User
 from db.models.role import Role
 from db.models.user_role import UserRole
-from core.security import decode_token, get_password_hash
+from core.security import get_password_hash_async
 from schemas.user import UserOut, UserCreate, UserListResponse, UserActiveUpdate, UserPasswordReset, UserPasswordUpdate, UserUpdate
-from api.deps.auth import require_permissions
+from core.permission_cache import permission_cache
+from core import user_cache
+from core.pagination import paginate
+from api.deps.auth import require_permissions, get_current_user
 
 router = APIRouter(prefix="/users", tags=["users"])
 
 # 管理员权限依赖
-async def require_admin(
-    authorization: str | None = Header(default=None),
-    session: AsyncSession = Depends(get_session),
-) -> User:
-    if not authorization or not authorization.startswith("Bearer "):
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="未提供凭证")
-    token = authorization.removeprefix("Bearer ").strip()
-    payload = decode_token(token)
-    if not payload:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="凭证无效或已过期")
-    user_id = int(payload.get("sub", 0))
-    q = await session.execute(select(User).where(User.id == user_id))
-    user = q.scalar_one_or_none()
-    if not user:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="用户不存在")
+async def require_admin(user: User = Depends(get_current_user)) -> User:
     if not user.is_admin:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="无权访问")
-    if not user.is_active:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="账号已被禁用")
     return user
 
 # 用户模型转换函数
@@ -60,8 +47,10 @@ async def list_users(
     q: str | None = None,
     role_id: int | None = None,
     online: bool | None = None,
+    cursor: str | None = None,
+    total_mode: str | None = None,
 ):
-    """分页查询用户列表，支持多条件过滤。"""
+    """分页查询用户列表，支持多条件过滤与游标分页。"""
     filters = []
     if q:
         like = f"%{q}%"
@@ -75,15 +64,18 @@ async def list_users(
         # 依据数据库 online 字段过滤
         filters.append(User.online == online)
 
-    base_stmt = select(User).where(and_(*filters)) if filters else select(User)
-    count_stmt = select(func.count()).select_from(base_stmt.subquery())
-    total = (await session.execute(count_stmt)).scalar_one()
-
-    stmt = base_stmt.order_by(User.id.desc()).offset((page - 1) * page_size).limit(page_size)
-    res = await session.execute(stmt)
-    users = res.scalars().all()
+    result = await paginate(
+        session,
+        select(User).where(*filters),
+        keys=[(User.id, True)],
+        count_stmt=select(User.id).where(*filters),
+        page=page,
+        page_size=page_size,
+        cursor=cursor,
+        total_mode=total_mode,
+    )
     items = []
-    for u in users:
+    for u in result["items"]:
         out = to_user_out(u)
         # 查询主角色
         role_names = []
@@ -100,7 +92,8 @@ async def list_users(
             role_names.extend([r[0] for r in extra_roles.all() if r[0] and r[0] not in role_names])
         out.roles = role_names
         items.append(out)
-    return {"total": total, "items": items}
+    result["items"] = items
+    return result
 
 
 @router.get("/{user_id}", response_model=UserOut)
@@ -133,7 +126,7 @@ async def create_user(
     user = User(
         username=payload.username,
         nickname=payload.nickname,
-        password_hash=get_password_hash(payload.password),
+        password_hash=await get_password_hash_async(payload.password),
         is_admin=payload.is_admin,
         role_id=payload.role_id,
         remark=payload.remark,
@@ -165,6 +158,8 @@ async def set_user_active(user_id: int, payload: UserActiveUpdate, _: User = Dep
         raise HTTPException(status_code=404, detail="用户不存在")
     user.is_active = payload.is_active
     await session.commit()
+    user_cache.evict(user.id)
+    permission_cache.invalidate_user(user.id)
     return {"ok": True}
 
 
@@ -174,8 +169,9 @@ async def reset_password(user_id: int, payload: UserPasswordReset, _: User = Dep
     user = res.scalar_one_or_none()
     if not user:
         raise HTTPException(status_code=404, detail="用户不存在")
-    user.password_hash = get_password_hash(payload.password)
+    user.password_hash = await get_password_hash_async(payload.password)
     await session.commit()
+    user_cache.evict(user.id)
     return {"ok": True}
 
 
@@ -186,8 +182,9 @@ async def update_password(user_id: int, payload: UserPasswordUpdate, _: User = D
     user = res.scalar_one_or_none()
     if not user:
         raise HTTPException(status_code=404, detail="用户不存在")
-    user.password_hash = get_password_hash(payload.new_password)
+    user.password_hash = await get_password_hash_async(payload.new_password)
     await session.commit()
+    user_cache.evict(user.id)
     return {"ok": True}
 
 
@@ -227,6 +224,8 @@ async def update_user(user_id: int, payload: UserUpdate, _: User = Depends(requi
     if payload.remark is not None:
         user.remark = payload.remark
     await session.commit()
+    user_cache.evict(user.id)
+    permission_cache.invalidate_user(user.id)
     await session.refresh(user)
     out = to_user_out(user)
     extra = await session.execute(select(UserRole.role_id).where(UserRole.user_id == user.id))
@@ -1,38 +1,192 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends
-from sqlalchemy.ext.asyncio import AsyncSession
+import asyncio
+import json
+from typing import Callable
+
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 from sqlalchemy import select
 from datetime import datetime
 
+from core.config import settings
 from core.security import decode_token
-from db.session import get_session
+from core.pubsub import PubSubBackend, create_pubsub_backend
+from core.presence import presence
+from db.session import AsyncSessionLocal
 from db.models.user import User
 
 router = APIRouter()
 
+class ClientConnection:
+    """单个 WebSocket 连接及其有界发送队列。
+
+    消息先进入队列，由独立的写协程逐条发送，慢客户端只会堆积自己的队列，
+    不会拖慢其他连接。
+    """
+
+    def __init__(self, user_id: int, websocket: WebSocket, maxsize: int):
+        self.user_id = user_id
+        self.websocket = websocket
+        self.queue: asyncio.Queue[str] = asyncio.Queue(maxsize=maxsize)
+        self._writer: asyncio.Task | None = None
+
+    def start(self):
+        self._writer = asyncio.create_task(self._write_loop())
+
+    async def _write_loop(self):
+        try:
+            while True:
+                text = await self.queue.get()
+                await self.websocket.send_text(text)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # 连接已断开，接收循环会负责清理
+            pass
+
+    def enqueue(self, text: str) -> bool:
+        """放入发送队列；队列已满时返回 False。"""
+        try:
+            self.queue.put_nowait(text)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    def send(self, message: dict) -> bool:
+        return self.enqueue(json.dumps(message, ensure_ascii=False, default=str))
+
+    async def close(self, code: int = 1000):
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass
+
+    def stop(self):
+        if self._writer is not None:
+            self._writer.cancel()
+            self._writer = None
+
+
 class ConnectionManager:
-    # 管理 WebSocket 连接
-    def __init__(self):
-        self.active: dict[int, WebSocket] = {}
-    # 连接用户
-    async def connect(self, user_id: int, websocket: WebSocket):
+    """管理本 worker 持有的 WebSocket 连接。
+
+    定向消息与广播都经过消息总线发布，各 worker 收到后只投递给本地连接，
+    因此多 worker 部署时消息会到达真正持有连接的 worker。
+    投递只是把预先序列化好的文本放入各连接的发送队列，不等待网络发送。
+    总线也用来让所有 worker 失效进程内缓存（invalidate），不投递给连接。
+    """
+
+    def __init__(self, backend: PubSubBackend | None = None):
+        # 每个用户可同时持有多个连接（多个标签页/设备）
+        self.active: dict[int, set[ClientConnection]] = {}
+        self.backend = backend or create_pubsub_backend()
+        # 指标：因队列溢出丢弃的消息数、因过慢被断开的连接数
+        self.dropped_messages = 0
+        self.slow_disconnects = 0
+        # 缓存失效消息的处理函数：名称 -> handler(keys)
+        self._invalidation_handlers: dict[str, Callable[[list], None]] = {}
+
+    # 启动总线订阅
+    async def start(self):
+        await self.backend.start(self._deliver)
+
+    # 停止总线订阅
+    async def stop(self):
+        await self.backend.stop()
+
+    # 连接用户；返回连接对象，以及是否为该用户在本 worker 的第一个连接
+    async def connect(self, user_id: int, websocket: WebSocket) -> tuple[ClientConnection, bool]:
         await websocket.accept()
-        self.active[user_id] = websocket
-    # 断开用户
-    def disconnect(self, user_id: int):
-        self.active.pop(user_id, None)
-    # 获取用户连接
-    def get(self, user_id: int) -> WebSocket | None:
-        return self.active.get(user_id)
+        connection = ClientConnection(user_id, websocket, settings.WS_SEND_QUEUE_SIZE)
+        connection.start()
+        connections = self.active.setdefault(user_id, set())
+        connections.add(connection)
+        return connection, len(connections) == 1
+    # 断开连接；返回是否为该用户的最后一个连接（重复调用返回 False）
+    def disconnect(self, connection: ClientConnection) -> bool:
+        connection.stop()
+        connections = self.active.get(connection.user_id)
+        if connections is None or connection not in connections:
+            return False
+        connections.discard(connection)
+        if connections:
+            return False
+        del self.active[connection.user_id]
+        return True
+    # 移除连接；用户在本 worker 的最后一个连接关闭时登记离线
+    async def release(self, connection: ClientConnection):
+        if self.disconnect(connection):
+            presence.mark_offline(connection.user_id)
+    # 广播用户上线/下线（由在线状态服务在 users.online 实际变化时调用）
+    async def broadcast_status(self, user_id: int, online: bool):
+        await self.broadcast({
+            "type": "user_status_change",
+            "user_id": user_id,
+            "online": online
+        })
+    # 用户在本 worker 是否在线
+    def is_online(self, user_id: int) -> bool:
+        return bool(self.active.get(user_id))
+    # 发送消息给指定用户（无论连接在哪个 worker）
+    async def send_to_user(self, user_id: int, message: dict):
+        await self.backend.publish({"target": user_id, "message": message})
     # 广播消息给所有连接的用户
     async def broadcast(self, message: dict):
-        for connection in self.active.values():
-            try:
-                await connection.send_json(message)
-            except Exception:
-                # 忽略发送失败的连接
-                pass
+        await self.backend.publish({"target": None, "message": message})
+
+    # 注册缓存失效处理函数（各 worker 收到同名失效消息时调用）
+    def on_invalidate(self, name: str, handler: Callable[[list], None]):
+        self._invalidation_handlers[name] = handler
+    # 通知所有 worker（包括自己）失效指定缓存键
+    async def invalidate(self, name: str, keys: list):
+        await self.backend.publish({"invalidate": name, "keys": keys})
+
+    # 总线消息回调：投递给本地连接，或失效本地缓存
+    async def _deliver(self, envelope: dict):
+        if "invalidate" in envelope:
+            handler = self._invalidation_handlers.get(envelope["invalidate"])
+            if handler is not None:
+                handler(envelope.get("keys") or [])
+            return
+        target = envelope.get("target")
+        message = envelope.get("message") or {}
+        if target is None:
+            connections = [c for conns in self.active.values() for c in conns]
+        else:
+            connections = list(self.active.get(target, ()))
+        if not connections:
+            return
+        # 每条消息只序列化一次
+        text = json.dumps(message, ensure_ascii=False, default=str)
+        for connection in connections:
+            if not connection.enqueue(text):
+                self._on_overflow(connection)
+
+    # 发送队列溢出处理：丢弃消息，或按配置断开过慢的客户端（立即移出 active，后续消息不再投递）
+    def _on_overflow(self, connection: ClientConnection):
+        self.dropped_messages += 1
+        if settings.WS_OVERFLOW_POLICY == "disconnect":
+            self.slow_disconnects += 1
+            last = self.disconnect(connection)
+            asyncio.create_task(self._drop_slow(connection, last))
+
+    async def _drop_slow(self, connection: ClientConnection, last: bool):
+        if last:
+            presence.mark_offline(connection.user_id)
+        await connection.close(code=1013)
+
+    # 连接与队列指标
+    def metrics(self) -> dict:
+        depths = [c.queue.qsize() for conns in self.active.values() for c in conns]
+        return {
+            "users": len(self.active),
+            "connections": len(depths),
+            "queue_depth_total": sum(depths),
+            "queue_depth_max": max(depths, default=0),
+            "dropped_messages": self.dropped_messages,
+            "slow_disconnects": self.slow_disconnects,
+        }
 
 manager = ConnectionManager()
+presence.set_listener(manager.broadcast_status)
 
 async def authenticate(websocket: WebSocket) -> int | None:
     token = websocket.query_params.get("token")
@@ -47,55 +201,37 @@ async def authenticate(websocket: WebSocket) -> int | None:
         return None
 
 @router.websocket("/ws")
-async def ws_endpoint(websocket: WebSocket, session: AsyncSession = Depends(get_session)):
+async def ws_endpoint(websocket: WebSocket):
     user_id = await authenticate(websocket)
     if not user_id:
         await websocket.close(code=4401)
         return
-    # 校验用户存在与激活
-    res = await session.execute(select(User).where(User.id == user_id))
-    user = res.scalar_one_or_none()
+    # 校验用户存在与激活（短会话，避免长连接期间占用数据库连接）
+    async with AsyncSessionLocal() as session:
+        res = await session.execute(select(User).where(User.id == user_id))
+        user = res.scalar_one_or_none()
     if not user or not user.is_active:
         await websocket.close(code=4403)
         return
 
-    # 标记在线 + 更新时间
-    user.online = True
-    user.last_login = datetime.utcnow()
-    await session.commit()
+    connection, first = await manager.connect(user_id, websocket)
 
-    await manager.connect(user_id, websocket)
-    
-    # 广播用户上线消息
-    await manager.broadcast({
-        "type": "user_status_change",
-        "user_id": user_id,
-        "online": True
-    })
+    # 用户在本 worker 的第一个连接时登记在线；写库与上线广播由在线状态服务批量完成，
+    # 用户已在其他 worker 上在线时不会重复广播
+    if first:
+        presence.mark_online(user_id)
 
     try:
         while True:
             data = await websocket.receive_json()
             msg_type = data.get("type")
             if msg_type == "ping":
-                await websocket.send_json({"type": "pong", "ts": datetime.utcnow().isoformat()})
+                connection.send({"type": "pong", "ts": datetime.utcnow().isoformat()})
             else:
                 # 预留：后续聊天等消息类型
-                await websocket.send_json({"type": "ack"})
+                connection.send({"type": "ack"})
     except WebSocketDisconnect:
         pass
     finally:
-        manager.disconnect(user_id)
-        # 清理在线状态
-        res = await session.execute(select(User).where(User.id == user_id))
-        user = res.scalar_one_or_none()
-        if user:
-            user.online = False
-            await session.commit()
-        
-        # 广播用户下线消息
-        await manager.broadcast({
-            "type": "user_status_change",
-            "user_id": user_id,
-            "online": False
-        })
+        # 只有最后一个连接关闭时才标记离线（因过慢被断开的连接已由 _on_overflow 移除）
+        await manager.release(connection)
@@ -0,0 +1,201 @@
+"""登录突发时无关接口的延迟基准（中文注释）。
+
+在子进程中用 uvicorn 启动只包含认证路由的应用（SQLite 临时库），
+以固定间隔探测 GET /api/auth/me，同时在给定时间窗口内发起一批登录请求，统计：
+- 探测请求的 p50/p99（客户端视角）
+- 服务端事件循环延迟的 p99/最大值（后台协程每 10ms 醒来一次，记录实际多睡了多久）
+
+分别测量两种模式：
+- inline：在事件循环中直接计算 PBKDF2（改动前的行为）
+- pool：使用 core.security 的有界工作池（当前行为，池满返回 503）
+
+运行：python -m benchmarks.login_burst [登录数量] [窗口秒数]
+（需要 requirements-dev.txt 中的 httpx；窗口为 0 表示全部同时发出）
+"""
+
+import asyncio
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import time
+from contextlib import asynccontextmanager
+
+_TMP_DIR = tempfile.mkdtemp(prefix="pm_bench_")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(_TMP_DIR, 'bench.sqlite3')}"
+
+import httpx  # noqa: E402
+import uvicorn  # noqa: E402
+from fastapi import FastAPI  # noqa: E402
+
+from db.base import Base  # noqa: E402  先导入全部模型
+from api.routes import auth as auth_routes  # noqa: E402
+from core.config import settings  # noqa: E402
+from core.security import get_password_hash, shutdown_password_hasher, verify_password  # noqa: E402
+from db.models.user import User  # noqa: E402
+from db.session import AsyncSessionLocal, engine  # noqa: E402
+
+PORT = 8765
+PASSWORD = "bench-password"
+PROBE_INTERVAL = 0.01
+LAG_INTERVAL = 0.01
+
+
+async def _inline_verify(plain_password: str, hashed_password: str) -> bool:
+    return verify_password(plain_password, hashed_password)
+
+
+def _percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+async def _setup_database() -> None:
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with AsyncSessionLocal() as session:
+        password_hash = get_password_hash(PASSWORD)
+        session.add_all([
+            User(username="bench", password_hash=password_hash),
+            User(username="probe", password_hash=password_hash),
+        ])
+        await session.commit()
+    await engine.dispose()
+
+
+def _serve(mode: str) -> None:
+    """子进程：启动只包含认证路由的应用，并记录事件循环延迟。"""
+    if mode == "inline":
+        auth_routes.verify_password_async = _inline_verify
+    lags: list[float] = []
+
+    async def monitor() -> None:
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(LAG_INTERVAL)
+            lags.append(time.perf_counter() - started - LAG_INTERVAL)
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        task = asyncio.create_task(monitor())
+        yield
+        task.cancel()
+        shutdown_password_hasher()
+
+    app = FastAPI(lifespan=lifespan)
+    app.include_router(auth_routes.router, prefix=settings.API_PREFIX)
+
+    @app.post("/bench/lag")
+    async def collect_lag() -> dict:
+        values = lags[:] or [0.0]
+        lags.clear()
+        return {"p99": _percentile(values, 0.99), "max": max(values)}
+
+    uvicorn.run(app, host="127.0.0.1", port=PORT, log_level="warning", timeout_keep_alive=120)
+
+
+def _start_server(mode: str) -> multiprocessing.Process:
+    # 非守护进程：PASSWORD_HASH_EXECUTOR=process 时服务进程还需创建子进程
+    process = multiprocessing.Process(target=_serve, args=(mode,))
+    process.start()
+    while True:
+        try:
+            httpx.get(f"http://127.0.0.1:{PORT}/docs", timeout=1)
+            return process
+        except httpx.TransportError:
+            time.sleep(0.1)
+
+
+async def _probe(client: httpx.AsyncClient, token: str, stop: asyncio.Event, latencies: list[float]) -> None:
+    headers = {"Authorization": f"Bearer {token}"}
+    while not stop.is_set():
+        started = time.perf_counter()
+        response = await client.get("/api/auth/me", headers=headers)
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - started)
+        await asyncio.sleep(PROBE_INTERVAL)
+
+
+async def _login(client: httpx.AsyncClient, delay: float) -> int:
+    await asyncio.sleep(delay)
+    response = await client.post("/api/auth/login", json={"username": "bench", "password": PASSWORD})
+    return response.status_code
+
+
+async def _probe_window(client: httpx.AsyncClient, token: str, work) -> tuple[list[float], dict, object]:
+    """执行 work 期间持续探测，返回 (探测延迟, 服务端循环延迟, work 结果)。"""
+    await client.post("/bench/lag")
+    stop = asyncio.Event()
+    latencies: list[float] = []
+    probe = asyncio.create_task(_probe(client, token, stop, latencies))
+    result = await work()
+    stop.set()
+    await probe
+    lag = (await client.post("/bench/lag")).json()
+    return latencies, lag, result
+
+
+async def _run(logins: int, window: float) -> dict:
+    limits = httpx.Limits(max_connections=logins + 10, max_keepalive_connections=logins + 10)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{PORT}", limits=limits, timeout=60) as client:
+        # 探测请求使用另一个账号：其用户快照不会被突发中的登录清除
+        response = await client.post("/api/auth/login", json={"username": "probe", "password": PASSWORD})
+        token = response.json()["access_token"]
+
+        idle, idle_lag, _ = await _probe_window(client, token, lambda: asyncio.sleep(1.0))
+
+        async def burst():
+            started = time.perf_counter()
+            statuses = await asyncio.gather(*(_login(client, window * i / logins) for i in range(logins)))
+            return statuses, time.perf_counter() - started
+
+        busy, busy_lag, (statuses, seconds) = await _probe_window(client, token, burst)
+    return {
+        "idle_p50": statistics.median(idle) * 1000,
+        "idle_p99": _percentile(idle, 0.99) * 1000,
+        "idle_lag_p99": idle_lag["p99"] * 1000,
+        "burst_p50": statistics.median(busy) * 1000,
+        "burst_p99": _percentile(busy, 0.99) * 1000,
+        "burst_lag_p99": busy_lag["p99"] * 1000,
+        "burst_lag_max": busy_lag["max"] * 1000,
+        "burst_seconds": seconds,
+        "ok": statuses.count(200),
+        "busy": statuses.count(503),
+    }
+
+
+def main() -> None:
+    logins = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    window = float(sys.argv[2]) if len(sys.argv) > 2 else 1.0
+    asyncio.run(_setup_database())
+    results = {}
+    for mode in ("inline", "pool"):
+        server = _start_server(mode)
+        try:
+            results[mode] = asyncio.run(_run(logins, window))
+        finally:
+            server.terminate()
+            server.join(10)
+            if server.is_alive():
+                server.kill()
+                server.join()
+    print(
+        f"logins: {logins} over {window:g}s, cpus: {os.cpu_count()}, executor: {settings.PASSWORD_HASH_EXECUTOR}, "
+        f"workers: {settings.PASSWORD_HASH_WORKERS}, queue_limit: {settings.PASSWORD_HASH_QUEUE_LIMIT}"
+    )
+    columns = [
+        ("idle_p50", "idle p50"), ("idle_p99", "idle p99"), ("idle_lag_p99", "idle lag99"),
+        ("burst_p50", "burst p50"), ("burst_p99", "burst p99"),
+        ("burst_lag_p99", "burst lag99"), ("burst_lag_max", "burst lagmax"),
+    ]
+    print(f"{'mode':<8}" + "".join(f"{title:>14}" for _, title in columns) + f"{'burst s':>9}{'200':>6}{'503':>6}")
+    for mode, r in results.items():
+        print(
+            f"{mode:<8}" + "".join(f"{r[key]:>12.1f}ms" for key, _ in columns)
+            + f"{r['burst_seconds']:>9.2f}{r['ok']:>6}{r['busy']:>6}"
+        )
+
+
+if __name__ == "__main__":
+    main()
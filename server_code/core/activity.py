@@ -0,0 +1,79 @@
+"""活动记录（中文注释）。
+
+路由在修改项目、任务、评论、附件时调用 record_activity()，
+活动与业务数据在同一事务中提交。
+
+已有数据升级后可执行一次 python -m core.activity，按项目、任务的创建时间补录历史活动。
+"""
+
+import asyncio
+
+from sqlalchemy import func, insert, literal, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db.session import AsyncSessionLocal
+from db.models.activity import ActivityEvent
+from db.models.project import Project
+from db.models.task import Task
+from db.models.user import User
+
+
+def record_activity(
+    session: AsyncSession,
+    type: str,
+    title: str,
+    actor: User | None,
+    project: Project | None = None,
+    task_id: int | None = None,
+) -> ActivityEvent:
+    """追加一条活动记录（随当前事务提交）。"""
+    event = ActivityEvent(
+        type=type,
+        title=title,
+        actor_id=actor.id if actor else None,
+        project_id=project.id if project else None,
+        project_name=project.name if project else None,
+        task_id=task_id,
+    )
+    session.add(event)
+    return event
+
+
+async def backfill() -> int:
+    """活动表为空时，用已有项目、任务的创建记录补录，返回补录条数。"""
+    columns = ["type", "title", "actor_id", "project_id", "project_name", "task_id", "created_at"]
+    async with AsyncSessionLocal() as session:
+        if (await session.execute(select(func.count(ActivityEvent.id)))).scalar_one():
+            return 0
+        await session.execute(insert(ActivityEvent).from_select(columns, select(
+            literal("project_created"),
+            literal("创建了项目 '") + Project.name + literal("'"),
+            Project.owner_id,
+            Project.id,
+            Project.name,
+            literal(None),
+            Project.created_at,
+        )))
+        await session.execute(insert(ActivityEvent).from_select(columns, select(
+            literal("task_created"),
+            literal("创建了任务 '") + Task.title + literal("'"),
+            Task.created_by,
+            Task.project_id,
+            Project.name,
+            Task.id,
+            Task.created_at,
+        ).join(Project, Project.id == Task.project_id)))
+        await session.commit()
+        return (await session.execute(select(func.count(ActivityEvent.id)))).scalar_one()
+
+
+async def _run_backfill() -> None:
+    from db.session import engine
+
+    count = await backfill()
+    await engine.dispose()
+    print(f"已补录 {count} 条活动记录")
+
+
+if __name__ == "__main__":
+    asyncio.run(_run_backfill())
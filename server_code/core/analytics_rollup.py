@@ -0,0 +1,220 @@
+"""图表分析汇总（中文注释）。
+
+把分析接口原先每次请求都要执行的全表聚合改为读取预聚合计数（analytics_rollups）：
+- 会话 after_flush 事件根据任务/项目的新增、修改、删除计算计数增量，
+  在同一事务中以 upsert 写入，提交或回滚与业务数据一致
+- 绕过 ORM 的批量语句不会触发事件，由后台定期全量校准（rebuild）修正：
+  在同一个一致性快照（REPEATABLE READ）中重算计数并读取汇总表，只把两者的差值按增量累加回去，
+  与校准期间并发提交的增量可以交换顺序，不会丢失也不会重复
+- 校准通过后台任务租约（core.leases）每轮只在一个 worker 上执行
+
+指标：
+- project.status / project.owner / project.team：按状态、负责人、团队计数
+- project.created_month：按创建月份（YYYY-MM）计数
+- task.status / task.priority：按状态、优先级计数
+- task.completed_day：已完成任务按完成日期（updated_at，YYYY-MM-DD）计数
+"""
+
+import asyncio
+from collections import Counter
+from typing import Any, Callable, Iterable
+
+from sqlalchemy import delete, event, insert, inspect, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from core import leases
+from core.config import settings
+from db.session import AsyncSessionLocal
+from db.models.analytics import AnalyticsRollup
+from db.models.project import Project
+from db.models.task import Task
+
+COMPLETED_STATUS = "已完成"
+
+RollupKey = tuple[str, str, str]  # (metric, bucket, dim)
+
+
+def project_keys(v: Any) -> list[RollupKey]:
+    keys = [("project.status", "", str(v["status"]))]
+    if v["created_at"] is not None:
+        keys.append(("project.created_month", v["created_at"].strftime("%Y-%m"), ""))
+    if v["owner_id"] is not None:
+        keys.append(("project.owner", "", str(v["owner_id"])))
+    if v["team_id"] is not None:
+        keys.append(("project.team", "", str(v["team_id"])))
+    return keys
+
+
+def task_keys(v: Any) -> list[RollupKey]:
+    keys = [("task.status", "", v["status"])]
+    if v["priority"] is not None:
+        keys.append(("task.priority", "", v["priority"]))
+    if v["status"] == COMPLETED_STATUS and v["updated_at"] is not None:
+        keys.append(("task.completed_day", v["updated_at"].strftime("%Y-%m-%d"), ""))
+    return keys
+
+
+# 模型 -> (计数键函数, 相关字段)
+TRACKED: dict[type, tuple[Callable[[Any], list[RollupKey]], tuple[str, ...]]] = {
+    Project: (project_keys, ("status", "created_at", "owner_id", "team_id")),
+    Task: (task_keys, ("status", "priority", "updated_at")),
+}
+
+
+def _current_values(obj, fields: Iterable[str]) -> dict:
+    return {f: getattr(obj, f) for f in fields}
+
+
+def _previous_values(obj, fields: Iterable[str]) -> dict:
+    """flush 前的字段值；未记录旧值的字段视为未变化。"""
+    attrs = inspect(obj).attrs
+    values = {}
+    for f in fields:
+        history = attrs[f].history
+        values[f] = history.deleted[0] if history.deleted else getattr(obj, f)
+    return values
+
+
+def _collect_deltas(session: Session) -> Counter:
+    deltas: Counter = Counter()
+    for obj in session.new:
+        tracked = TRACKED.get(type(obj))
+        if tracked:
+            keys, fields = tracked
+            for key in keys(_current_values(obj, fields)):
+                deltas[key] += 1
+    for obj in session.deleted:
+        tracked = TRACKED.get(type(obj))
+        if tracked:
+            keys, fields = tracked
+            for key in keys(_previous_values(obj, fields)):
+                deltas[key] -= 1
+    for obj in session.dirty:
+        tracked = TRACKED.get(type(obj))
+        if tracked and session.is_modified(obj):
+            keys, fields = tracked
+            for key in keys(_previous_values(obj, fields)):
+                deltas[key] -= 1
+            for key in keys(_current_values(obj, fields)):
+                deltas[key] += 1
+    return Counter({k: v for k, v in deltas.items() if v})
+
+
+def _apply_deltas(connection, deltas: Counter) -> None:
+    """按数据库方言用 upsert 累加计数。"""
+    table = AnalyticsRollup.__table__
+    rows = [
+        {"metric": metric, "bucket": bucket, "dim": dim, "value": value}
+        for (metric, bucket, dim), value in deltas.items()
+    ]
+    dialect = connection.dialect.name
+    if dialect == "mysql":
+        from sqlalchemy.dialects.mysql import insert as mysql_insert
+
+        stmt = mysql_insert(table)
+        stmt = stmt.on_duplicate_key_update(value=table.c.value + stmt.inserted.value)
+        connection.execute(stmt, rows)
+    elif dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as upsert_insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as upsert_insert
+
+        stmt = upsert_insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["metric", "bucket", "dim"],
+            set_={"value": table.c.value + stmt.excluded.value},
+        )
+        connection.execute(stmt, rows)
+    else:
+        for row in rows:
+            result = connection.execute(
+                update(table)
+                .where(table.c.metric == row["metric"], table.c.bucket == row["bucket"], table.c.dim == row["dim"])
+                .values(value=table.c.value + row["value"])
+            )
+            if result.rowcount == 0:
+                connection.execute(insert(table).values(**row))
+
+
+@event.listens_for(Session, "after_flush")
+def _rollup_after_flush(session: Session, flush_context) -> None:
+    deltas = _collect_deltas(session)
+    if deltas:
+        _apply_deltas(session.connection(), deltas)
+
+
+async def rebuild() -> int:
+    """全量校准汇总表：在同一快照中比较重算结果与汇总表，把差值累加回去，返回修正的行数。"""
+    counts: Counter = Counter()
+    async with AsyncSessionLocal() as session:
+        # SQLite 写入本身串行，其余方言需要可重复读保证两次读取来自同一快照
+        if session.bind.dialect.name != "sqlite":
+            await session.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+        for model, (keys, fields) in TRACKED.items():
+            stmt = select(*(getattr(model, f) for f in fields)).execution_options(yield_per=1000)
+            async for row in await session.stream(stmt):
+                for key in keys(row._mapping):
+                    counts[key] += 1
+        current = Counter({
+            (row.metric, row.bucket, row.dim): row.value
+            for row in (await session.execute(
+                select(AnalyticsRollup.metric, AnalyticsRollup.bucket, AnalyticsRollup.dim, AnalyticsRollup.value)
+            )).all()
+        })
+        diff = Counter({key: counts[key] - current[key] for key in counts.keys() | current.keys()})
+        diff = Counter({key: value for key, value in diff.items() if value})
+        if diff:
+            await session.run_sync(lambda sync_session: _apply_deltas(sync_session.connection(), diff))
+        # 条件删除计数为 0 的行；并发增量已把计数改为非 0 的行不受影响
+        await session.execute(
+            delete(AnalyticsRollup).where(AnalyticsRollup.value == 0).execution_options(synchronize_session=False)
+        )
+        await session.commit()
+    return len(diff)
+
+
+async def read_metric(session: AsyncSession, metric: str, bucket_from: str | None = None) -> list[tuple[str, str, int]]:
+    """读取指标的 (bucket, dim, value) 列表。"""
+    stmt = select(AnalyticsRollup.bucket, AnalyticsRollup.dim, AnalyticsRollup.value).where(
+        AnalyticsRollup.metric == metric,
+    )
+    if bucket_from is not None:
+        stmt = stmt.where(AnalyticsRollup.bucket >= bucket_from)
+    rows = (await session.execute(stmt.order_by(AnalyticsRollup.bucket, AnalyticsRollup.dim))).all()
+    return [(row[0], row[1], row[2]) for row in rows]
+
+
+class RollupReconciler:
+    """启动时及按固定间隔全量校准汇总表（每轮只由取得租约的一个 worker 执行）。"""
+
+    def __init__(self):
+        self._task: asyncio.Task | None = None
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                # 租约略短于间隔：持有者下一轮可以续期，持有者退出后其他 worker 接手
+                if await leases.try_acquire("analytics_rollup.rebuild", settings.ANALYTICS_ROLLUP_RECONCILE_INTERVAL_SECONDS * 0.9):
+                    fixed = await rebuild()
+                    if fixed:
+                        print(f"统计汇总校准修正了 {fixed} 行")
+            except Exception as e:
+                print(f"校准统计汇总失败: {e}")
+            await asyncio.sleep(settings.ANALYTICS_ROLLUP_RECONCILE_INTERVAL_SECONDS)
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+rollup_reconciler = RollupReconciler()
@@ -0,0 +1,257 @@
+"""按内容寻址的附件存储（中文注释）。
+
+- 每份内容按 SHA-256 只保存一次：BLOB_DIR/ab/cd/<sha256>
+- 附件原有路径（uploads/projects/...）通过硬链接指向该文件，文件系统不支持时依次尝试 reflink、复制；
+  静态文件访问和删除附件的逻辑不变，删除附件只删除链接
+- 附件行的新增/删除在 after_flush 中同步调整引用计数；绕过 ORM 的删除（如项目级联删除）
+  由后台任务定期按附件表分批重算计数修正（每批单独提交，不长时间锁住整张表）
+- 后台重算与清理每轮只由取得租约的一个 worker 执行
+- 引用计数为 0 且超过宽限期未被上传引用的内容由后台任务删除
+"""
+
+import asyncio
+import os
+import shutil
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, event, func, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from core import leases
+from core.config import settings
+from db.session import AsyncSessionLocal
+from db.models.blob import Blob
+from db.models.project import ProjectAttachment
+from db.models.task import TaskAttachment
+
+# Linux FICLONE ioctl（btrfs、xfs 等支持 reflink 的文件系统）
+_FICLONE = 0x40049409
+
+
+def blob_path(sha256: str) -> str:
+    return os.path.join(settings.BLOB_DIR, sha256[:2], sha256[2:4], sha256)
+
+
+def _derivatives(sha256: str) -> list[str]:
+    """内容旁边的派生文件（<sha256>.thumb.webp 等）。"""
+    directory = os.path.dirname(blob_path(sha256))
+    try:
+        return [os.path.join(directory, name) for name in os.listdir(directory) if name.startswith(f"{sha256}.")]
+    except FileNotFoundError:
+        return []
+
+
+def temp_dir() -> str:
+    """写入中的临时文件目录（与内容存储在同一文件系统，便于原子重命名）。"""
+    return os.path.join(settings.BLOB_DIR, "tmp")
+
+
+def _move_in(source: str, path: str) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    shutil.move(source, path)
+
+
+def _copy_in(source: str, path: str) -> None:
+    """保留源文件，把内容放入存储（先在临时目录生成再原子重命名）。"""
+    tmp = _materialize(source, temp_dir(), f"{os.path.basename(path)}.{uuid.uuid4().hex}")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    os.replace(tmp, path)
+
+
+def _reflink(source: str, destination: str) -> None:
+    import fcntl
+
+    with open(source, "rb") as src, open(destination, "wb") as dst:
+        fcntl.ioctl(dst.fileno(), _FICLONE, src.fileno())
+
+
+def _materialize(source: str, directory: str, filename: str) -> str:
+    """在附件目录生成指向内容的文件：硬链接 > reflink > 复制。"""
+    os.makedirs(directory, exist_ok=True)
+    destination = os.path.join(directory, filename)
+    try:
+        os.link(source, destination)
+        return destination
+    except OSError:
+        pass
+    try:
+        _reflink(source, destination)
+        return destination
+    except (OSError, ImportError):
+        try:
+            os.remove(destination)
+        except FileNotFoundError:
+            pass
+    shutil.copyfile(source, destination)
+    return destination
+
+
+def _place(source: str, sha256: str, directory: str, filename: str, keep_source: bool = False) -> str:
+    """把临时文件放入存储（内容已存在时复用）并生成附件文件。
+
+    keep_source=False 时临时文件在附件文件生成后删除；为 True 时保留，由调用方在数据库提交成功后删除。
+    """
+    path = blob_path(sha256)
+    put = _copy_in if keep_source else _move_in
+    try:
+        if not os.path.exists(path):
+            put(source, path)
+        try:
+            return _materialize(path, directory, filename)
+        except FileNotFoundError:
+            # 已有内容恰好被后台清理删除，用本次上传的临时文件补回
+            put(source, path)
+            return _materialize(path, directory, filename)
+    finally:
+        if not keep_source and os.path.exists(source):
+            os.remove(source)
+
+
+async def _touch(sha256: str, size: int) -> None:
+    """登记内容并刷新最近使用时间（立即提交，防止后台清理与本次上传竞争）。"""
+    now = datetime.utcnow()
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            update(Blob).where(Blob.sha256 == sha256).values(last_used_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 0:
+            session.add(Blob(sha256=sha256, size=size, ref_count=0, created_at=now, last_used_at=now))
+        try:
+            await session.commit()
+        except IntegrityError:
+            # 并发上传了相同内容，对方已经登记
+            await session.rollback()
+
+
+async def store(source: str, sha256: str, size: int, directory: str, filename: str, keep_source: bool = False) -> str:
+    """把已计算摘要的临时文件存入内容存储，并在 directory/filename 生成附件文件，返回附件路径。"""
+    await _touch(sha256, size)
+    return await asyncio.to_thread(_place, source, sha256, directory, filename, keep_source)
+
+
+@event.listens_for(Session, "after_flush")
+def _count_references(session: Session, flush_context) -> None:
+    deltas: Counter = Counter()
+    for obj in session.new:
+        if isinstance(obj, (ProjectAttachment, TaskAttachment)) and obj.sha256:
+            deltas[obj.sha256] += 1
+    for obj in session.deleted:
+        if isinstance(obj, (ProjectAttachment, TaskAttachment)) and obj.sha256:
+            deltas[obj.sha256] -= 1
+    connection = None
+    for sha256, delta in deltas.items():
+        if delta:
+            connection = connection or session.connection()
+            connection.execute(
+                update(Blob.__table__)
+                .where(Blob.__table__.c.sha256 == sha256)
+                .values(ref_count=Blob.__table__.c.ref_count + delta)
+            )
+
+
+async def reconcile() -> int:
+    """按附件表分批重算引用计数，返回修正的行数。"""
+    project_refs = (
+        select(func.count(ProjectAttachment.id)).where(ProjectAttachment.sha256 == Blob.sha256).scalar_subquery()
+    )
+    task_refs = select(func.count(TaskAttachment.id)).where(TaskAttachment.sha256 == Blob.sha256).scalar_subquery()
+    batch_size = settings.BLOB_GC_BATCH_SIZE
+    fixed = 0
+    last = ""
+    while True:
+        async with AsyncSessionLocal() as session:
+            batch = (await session.execute(
+                select(Blob.sha256).where(Blob.sha256 > last).order_by(Blob.sha256).limit(batch_size)
+            )).scalars().all()
+            if not batch:
+                break
+            result = await session.execute(
+                update(Blob)
+                .where(Blob.sha256.in_(batch), Blob.ref_count != project_refs + task_refs)
+                .values(ref_count=project_refs + task_refs)
+                .execution_options(synchronize_session=False)
+            )
+            await session.commit()
+        fixed += result.rowcount
+        if len(batch) < batch_size:
+            break
+        last = batch[-1]
+        await asyncio.sleep(0)
+    return fixed
+
+
+async def collect_garbage() -> int:
+    """删除一批无引用且超过宽限期的内容，返回删除数量。"""
+    cutoff = datetime.utcnow() - timedelta(seconds=settings.BLOB_GC_GRACE_SECONDS)
+    async with AsyncSessionLocal() as session:
+        candidates = (await session.execute(
+            select(Blob.sha256)
+            .where(Blob.ref_count <= 0, Blob.last_used_at < cutoff)
+            .limit(settings.BLOB_GC_BATCH_SIZE)
+        )).scalars().all()
+        if not candidates:
+            return 0
+        # 条件删除：期间重新被引用或刚被上传使用的内容保留
+        await session.execute(
+            delete(Blob)
+            .where(Blob.sha256.in_(candidates), Blob.ref_count <= 0, Blob.last_used_at < cutoff)
+            .execution_options(synchronize_session=False)
+        )
+        await session.commit()
+        kept = set((await session.execute(select(Blob.sha256).where(Blob.sha256.in_(candidates)))).scalars().all())
+    deleted = [sha256 for sha256 in candidates if sha256 not in kept]
+    for sha256 in deleted:
+        # 同时删除旁边的缩略图等派生文件
+        for path in (blob_path(sha256), *_derivatives(sha256)):
+            try:
+                await asyncio.to_thread(os.remove, path)
+            except FileNotFoundError:
+                pass
+    return len(deleted)
+
+
+class BlobCollector:
+    """定时重算引用计数并清理无引用的内容（每轮只由取得租约的一个 worker 执行）。"""
+
+    def __init__(self):
+        self._task: asyncio.Task | None = None
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                # 租约略短于间隔：持有者下一轮可以续期，持有者退出后其他 worker 接手
+                if await leases.try_acquire("blobs.collect", settings.BLOB_GC_INTERVAL_SECONDS * 0.9):
+                    fixed = await reconcile()
+                    if fixed:
+                        print(f"已修正 {fixed} 个附件内容的引用计数")
+                    removed = 0
+                    while True:
+                        count = await collect_garbage()
+                        removed += count
+                        if count < settings.BLOB_GC_BATCH_SIZE:
+                            break
+                        await asyncio.sleep(0)
+                    if removed:
+                        print(f"已清理 {removed} 个无引用的附件内容")
+            except Exception as e:
+                print(f"清理附件内容失败: {e}")
+            await asyncio.sleep(settings.BLOB_GC_INTERVAL_SECONDS)
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+blob_collector = BlobCollector()
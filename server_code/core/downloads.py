@@ -0,0 +1,235 @@
+"""附件下载（中文注释）。
+
+file_response() 在 FileResponse 的基础上补充：
+- ETag：有 SHA-256 时使用强校验值 "<sha256>"，否则按大小和修改时间生成弱校验值
+- 条件请求：If-None-Match / If-Modified-Since 命中返回 304
+- Range：单段返回 206，多段返回 multipart/byteranges；If-Range 不匹配时返回完整文件；
+  无法满足的范围返回 416
+- 完整文件仍由 FileResponse 发送，服务器支持 pathsend 等扩展时可零拷贝
+
+CachedStaticFiles 为 /uploads 下以 uuid 或摘要命名的文件（内容不会变化）加上长期缓存头；
+内容存储（BLOB_DIR）中只对外提供缩略图，原文件按摘要即可定位，不经静态路径公开。
+"""
+
+import asyncio
+import mimetypes
+import os
+import re
+import uuid
+from email.utils import formatdate, parsedate_to_datetime
+from urllib.parse import quote
+
+from fastapi import HTTPException, Request, status
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from fastapi.staticfiles import StaticFiles
+
+from core.config import settings
+
+IMMUTABLE_CACHE_CONTROL = "max-age=31536000, immutable"
+
+# uuid 文件名或内容存储路径（含缩略图）：内容写入后不会再变化
+_BLOB_THUMBNAIL_NAME = re.compile(r"^[0-9a-f]{64}\.thumb\.\w+$")
+
+_IMMUTABLE_NAME = re.compile(
+    r"(^|/)[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}(\.[\w-]+)?$"
+    r"|(^|/)blobs/.+/[0-9a-f]{64}(\.thumb\.\w+)?$"
+)
+
+
+def _etag(st: os.stat_result, sha256: str | None) -> str:
+    if sha256:
+        return f'"{sha256}"'
+    return f'W/"{st.st_size:x}-{int(st.st_mtime):x}"'
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    """If-None-Match 比较（弱比较）。"""
+    if header.strip() == "*":
+        return True
+    target = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == target for tag in header.split(","))
+
+
+def _not_modified_since(header: str, st: os.stat_result) -> bool:
+    try:
+        return int(st.st_mtime) <= parsedate_to_datetime(header).timestamp()
+    except (TypeError, ValueError):
+        return False
+
+
+def _if_range_matches(header: str, etag: str, last_modified: str) -> bool:
+    """If-Range 只接受强校验值或与 Last-Modified 完全相同的日期。"""
+    header = header.strip()
+    if header.startswith('"'):
+        return not etag.startswith("W/") and header == etag
+    return header == last_modified
+
+
+def parse_range(header: str, size: int) -> list[tuple[int, int]] | None:
+    """解析 Range 头，返回合并后的 [(起始, 结束)]（含结束字节）。
+
+    格式不支持或范围过多时返回 None（忽略 Range，返回完整文件）；没有可满足的范围时返回空列表。
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or not spec:
+        return None
+    ranges = []
+    for part in spec.split(","):
+        first, dash, last = part.strip().partition("-")
+        if not dash:
+            return None
+        try:
+            if first:
+                start = int(first)
+                end = int(last) if last else size - 1
+                if last and end < start:
+                    return None
+            else:
+                suffix = int(last)
+                if suffix == 0:
+                    continue
+                start, end = max(size - suffix, 0), size - 1
+        except ValueError:
+            return None
+        if start < size:
+            ranges.append((start, min(end, size - 1)))
+    # 合并重叠或相邻的范围
+    merged: list[tuple[int, int]] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    if len(merged) > settings.DOWNLOAD_MAX_RANGES:
+        return None
+    return merged
+
+
+async def _read_ranges(path: str, parts: list[tuple[bytes, int, int]], trailer: bytes = b""):
+    """按段读取文件：parts 为 [(段前缀, 起始, 结束)]。"""
+    fd = await asyncio.to_thread(os.open, path, os.O_RDONLY)
+    try:
+        for prefix, start, end in parts:
+            if prefix:
+                yield prefix
+            offset = start
+            while offset <= end:
+                length = min(settings.DOWNLOAD_CHUNK_SIZE, end - offset + 1)
+                data = await asyncio.to_thread(os.pread, fd, length, offset)
+                if not data:
+                    return
+                yield data
+                offset += len(data)
+        if trailer:
+            yield trailer
+    finally:
+        os.close(fd)
+
+
+def content_disposition(filename: str) -> str:
+    """附件下载头（文件名按 RFC 5987 编码，支持中文）。"""
+    return f"attachment; filename*=UTF-8''{quote(filename)}"
+
+
+async def file_response(
+    request: Request,
+    path: str,
+    filename: str,
+    sha256: str | None = None,
+    immutable: bool = False,
+) -> Response:
+    """下载文件，支持条件请求与 Range。"""
+    try:
+        st = await asyncio.to_thread(os.stat, path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="文件不存在")
+
+    etag = _etag(st, sha256)
+    last_modified = formatdate(st.st_mtime, usegmt=True)
+    media_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    headers = {
+        "ETag": etag,
+        "Last-Modified": last_modified,
+        "Accept-Ranges": "bytes",
+        # 下载需要登录，只允许浏览器缓存
+        "Cache-Control": f"private, {IMMUTABLE_CACHE_CONTROL}" if immutable else "private, no-cache",
+    }
+
+    if_none_match = request.headers.get("if-none-match")
+    if_modified_since = request.headers.get("if-modified-since")
+    if (if_none_match and _etag_matches(if_none_match, etag)) or (
+        not if_none_match and if_modified_since and _not_modified_since(if_modified_since, st)
+    ):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    headers["Content-Disposition"] = content_disposition(filename)
+    size = st.st_size
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    ranges = None
+    if range_header and (not if_range or _if_range_matches(if_range, etag, last_modified)):
+        ranges = parse_range(range_header, size)
+
+    if ranges is None:
+        if range_header:
+            # Range 被忽略：自行流式返回完整文件，避免 FileResponse 再次解析 Range
+            headers["Content-Length"] = str(size)
+            return StreamingResponse(_read_ranges(path, [(b"", 0, size - 1)]), media_type=media_type, headers=headers)
+        return FileResponse(path, media_type=media_type, headers=headers, stat_result=st)
+
+    if not ranges:
+        return Response(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            headers={"Content-Range": f"bytes */{size}", "ETag": etag},
+        )
+
+    if len(ranges) == 1:
+        start, end = ranges[0]
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        headers["Content-Length"] = str(end - start + 1)
+        return StreamingResponse(
+            _read_ranges(path, [(b"", start, end)]),
+            status_code=status.HTTP_206_PARTIAL_CONTENT,
+            media_type=media_type,
+            headers=headers,
+        )
+
+    boundary = uuid.uuid4().hex
+    parts = []
+    for index, (start, end) in enumerate(ranges):
+        prefix = (
+            ("" if index == 0 else "\r\n") + f"--{boundary}\r\n"
+            f"Content-Type: {media_type}\r\n"
+            f"Content-Range: bytes {start}-{end}/{size}\r\n\r\n"
+        ).encode()
+        parts.append((prefix, start, end))
+    trailer = f"\r\n--{boundary}--\r\n".encode()
+    headers["Content-Length"] = str(sum(len(p) + e - s + 1 for p, s, e in parts) + len(trailer))
+    return StreamingResponse(
+        _read_ranges(path, parts, trailer),
+        status_code=status.HTTP_206_PARTIAL_CONTENT,
+        media_type=f"multipart/byteranges; boundary={boundary}",
+        headers=headers,
+    )
+
+
+class CachedStaticFiles(StaticFiles):
+    """静态文件：uuid 或摘要命名的文件加长期缓存头（ETag、304、Range 由 StaticFiles 处理）。"""
+
+    def lookup_path(self, path: str) -> tuple[str, os.stat_result | None]:
+        full_path, stat_result = super().lookup_path(path)
+        if stat_result is not None:
+            # 内容存储下除缩略图外一律按不存在处理
+            blob_root = os.path.realpath(settings.BLOB_DIR)
+            real_path = os.path.realpath(full_path)
+            if os.path.commonpath([real_path, blob_root]) == blob_root and not _BLOB_THUMBNAIL_NAME.match(
+                os.path.basename(real_path)
+            ):
+                return "", None
+        return full_path, stat_result
+
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        if _IMMUTABLE_NAME.search(str(full_path).replace(os.sep, "/")):
+            response.headers["Cache-Control"] = f"public, {IMMUTABLE_CACHE_CONTROL}"
+        return response
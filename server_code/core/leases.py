@@ -0,0 +1,44 @@
+"""后台任务租约（中文注释）。
+
+try_acquire() 以条件更新抢占 background_leases 中的一行：租约已过期或本来就由自己持有时成功，
+行不存在时插入（并发插入由主键冲突判定）。多个 worker 同时尝试只有一个成功。
+"""
+
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import or_, update
+from sqlalchemy.exc import IntegrityError
+
+from db.session import AsyncSessionLocal
+from db.models.lease import BackgroundLease
+
+# 本进程的持有者 ID
+HOLDER = uuid.uuid4().hex
+
+
+async def try_acquire(name: str, seconds: float) -> bool:
+    """尝试获取（或续期）名为 name 的租约，有效期 seconds 秒。"""
+    now = datetime.utcnow()
+    expires_at = now + timedelta(seconds=seconds)
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            update(BackgroundLease)
+            .where(
+                BackgroundLease.name == name,
+                or_(BackgroundLease.expires_at < now, BackgroundLease.holder == HOLDER),
+            )
+            .values(holder=HOLDER, expires_at=expires_at)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount:
+            await session.commit()
+            return True
+        session.add(BackgroundLease(name=name, holder=HOLDER, expires_at=expires_at))
+        try:
+            await session.commit()
+        except IntegrityError:
+            # 租约由其他 worker 持有
+            await session.rollback()
+            return False
+        return True
@@ -0,0 +1,254 @@
+"""请求与 SQL 指标（中文注释）。
+
+- MetricsMiddleware（ASGI 中间件）按路由模板记录请求耗时、响应字节数、状态码
+- 引擎 before/after_cursor_execute 事件统计每个请求的 SQL 条数与数据库耗时；
+  当前请求的统计对象放在 contextvar 中，fanout 等并发子任务继承同一个对象
+- 慢请求（超过 METRICS_SLOW_REQUEST_SECONDS）打印日志，附耗时最长的 SQL
+- N+1 检测：同一请求中去掉字面量后相同的 SQL 超过 METRICS_N_PLUS_ONE_THRESHOLD 条时打印告警并计数
+- render() 输出 Prometheus 文本格式，由 /metrics 接口返回
+"""
+
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Iterable
+
+from sqlalchemy import event
+
+from core.config import settings
+from db.session import engine
+
+# 耗时直方图的桶（秒）
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# 每请求 SQL 条数直方图的桶
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+# 响应字节数直方图的桶
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+Labels = tuple[tuple[str, str], ...]
+
+
+def _labels(**values) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in values.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Labels, extra: Iterable[tuple[str, str]] = ()) -> str:
+    pairs = [*labels, *extra]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+class Histogram:
+    """按标签分组的直方图（累计桶 + 总和 + 次数）。"""
+
+    def __init__(self, name: str, help: str, buckets: tuple):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self._data: dict[Labels, list] = {}  # labels -> [各桶计数..., sum, count]
+
+    def observe(self, value: float, **labels) -> None:
+        key = _labels(**labels)
+        data = self._data.get(key)
+        if data is None:
+            data = self._data[key] = [0] * len(self.buckets) + [0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                data[i] += 1
+        data[-2] += value
+        data[-1] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, data in self._data.items():
+            for i, bound in enumerate(self.buckets):
+                lines.append(f"{self.name}_bucket{_format_labels(key, [('le', str(bound))])} {data[i]}")
+            lines.append(f"{self.name}_bucket{_format_labels(key, [('le', '+Inf')])} {data[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {round(data[-2], 6)}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {data[-1]}")
+        return lines
+
+
+class CounterMetric:
+    """按标签分组的计数器。"""
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._data: Counter = Counter()
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        self._data[_labels(**labels)] += amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, value in self._data.items():
+            lines.append(f"{self.name}{_format_labels(key)} {round(value, 6)}")
+        return lines
+
+
+request_latency = Histogram("http_request_duration_seconds", "请求耗时（秒）", LATENCY_BUCKETS)
+request_queries = Histogram("http_request_db_queries", "每个请求执行的 SQL 条数", QUERY_COUNT_BUCKETS)
+request_db_time = Histogram("http_request_db_duration_seconds", "每个请求的数据库耗时（秒）", LATENCY_BUCKETS)
+response_size = Histogram("http_response_size_bytes", "响应体字节数", SIZE_BUCKETS)
+requests_total = CounterMetric("http_requests_total", "请求总数")
+slow_requests_total = CounterMetric("http_slow_requests_total", "慢请求次数")
+n_plus_one_total = CounterMetric("http_n_plus_one_total", "疑似 N+1 查询的请求次数")
+db_queries_total = CounterMetric("db_queries_total", "SQL 总条数（含后台任务）")
+db_query_seconds_total = CounterMetric("db_query_duration_seconds_total", "SQL 总耗时（秒，含后台任务）")
+
+_METRICS = (
+    request_latency, request_queries, request_db_time, response_size, requests_total,
+    slow_requests_total, n_plus_one_total, db_queries_total, db_query_seconds_total,
+)
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LISTS = re.compile(r"\((?:\s*(?:\?|%s|:\w+|__\[POSTCOMPILE_\w+\])\s*,?)+\)")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_sql(statement: str) -> str:
+    """去掉字面量与 IN 列表长度差异，用于识别“相同形状”的 SQL。"""
+    statement = _LITERALS.sub("?", statement)
+    statement = _PLACEHOLDER_LISTS.sub("(?)", statement)
+    return _SPACES.sub(" ", statement).strip()
+
+
+class RequestStats:
+    """单个请求的 SQL 统计。"""
+
+    __slots__ = ("queries", "db_time", "statements", "shapes")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.statements: list[tuple[float, str]] = []  # 耗时最长的若干条 (耗时, SQL)
+        self.shapes: Counter = Counter()
+
+    def record(self, statement: str, elapsed: float) -> None:
+        self.queries += 1
+        self.db_time += elapsed
+        self.shapes[normalize_sql(statement)] += 1
+        # 只保留最慢的若干条，供慢请求日志使用
+        if len(self.statements) < settings.METRICS_SLOW_LOG_MAX_STATEMENTS:
+            self.statements.append((elapsed, statement))
+        elif self.statements:
+            fastest = min(range(len(self.statements)), key=lambda i: self.statements[i][0])
+            if elapsed > self.statements[fastest][0]:
+                self.statements[fastest] = (elapsed, statement)
+
+
+_current: ContextVar[RequestStats | None] = ContextVar("request_stats", default=None)
+
+
+@event.listens_for(engine.sync_engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(engine.sync_engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    starts = conn.info.get("query_start")
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    db_queries_total.inc()
+    db_query_seconds_total.inc(elapsed)
+    stats = _current.get()
+    if stats is not None:
+        stats.record(statement, elapsed)
+
+
+@event.listens_for(engine.sync_engine, "handle_error")
+def _handle_error(exception_context) -> None:
+    # 执行失败时不会触发 after_cursor_execute，丢弃对应的开始时间
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("query_start"):
+        conn.info["query_start"].pop()
+
+
+def _route_template(scope) -> str:
+    route = scope.get("route")
+    path = getattr(route, "path_format", None) or getattr(route, "path", None)
+    return path or "unmatched"
+
+
+def _report(method: str, route: str, elapsed: float, stats: RequestStats) -> None:
+    """慢请求日志与 N+1 检测。"""
+    if elapsed >= settings.METRICS_SLOW_REQUEST_SECONDS:
+        slow_requests_total.inc(method=method, route=route)
+        print(
+            f"慢请求 {method} {route}: {elapsed * 1000:.1f}ms，"
+            f"SQL {stats.queries} 条，数据库耗时 {stats.db_time * 1000:.1f}ms"
+        )
+        for duration, statement in sorted(stats.statements, reverse=True):
+            print(f"  {duration * 1000:.1f}ms  {_SPACES.sub(' ', statement)[:500]}")
+    threshold = settings.METRICS_N_PLUS_ONE_THRESHOLD
+    repeated = [(shape, count) for shape, count in stats.shapes.items() if count > threshold]
+    if repeated:
+        n_plus_one_total.inc(method=method, route=route)
+        for shape, count in repeated:
+            print(f"疑似 N+1 查询 {method} {route}: 同一语句执行 {count} 次: {shape[:300]}")
+
+
+class MetricsMiddleware:
+    """ASGI 中间件：记录每个 HTTP 请求的耗时、SQL 与响应大小。"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        status_code = 500
+        body_bytes = 0
+
+        async def send_wrapper(message):
+            nonlocal status_code, body_bytes
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                body_bytes += len(message.get("body", b""))
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            _current.reset(token)
+            method = scope["method"]
+            route = _route_template(scope)
+            requests_total.inc(method=method, route=route, status=status_code)
+            request_latency.observe(elapsed, method=method, route=route)
+            request_queries.observe(stats.queries, method=method, route=route)
+            request_db_time.observe(stats.db_time, method=method, route=route)
+            response_size.observe(body_bytes, method=method, route=route)
+            _report(method, route, elapsed, stats)
+
+
+def _gauges(name: str, help: str, values: dict[str, float], label: str) -> list[str]:
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} gauge"]
+    for key, value in values.items():
+        lines.append(f'{name}{{{label}="{_escape(str(key))}"}} {value}')
+    return lines
+
+
+def render(extra_gauges: dict[str, tuple[str, str, dict[str, float]]] | None = None) -> str:
+    """输出 Prometheus 文本格式；extra_gauges 为 {指标名: (说明, 标签名, {标签值: 数值})}。"""
+    lines: list[str] = []
+    for metric in _METRICS:
+        lines += metric.render()
+    for name, (help, label, values) in (extra_gauges or {}).items():
+        lines += _gauges(name, help, values, label)
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,113 @@
+"""通知保留与归档（中文注释）。
+
+后台任务按固定间隔把超过保留期的已读通知移到 notifications_archive：
+- 保留天数可按通知类型单独配置（NOTIFICATION_RETENTION_BY_TYPE），其余类型使用默认值
+- 每批按 id 取固定数量，INSERT ... SELECT 复制后删除原行，每批单独提交，避免长事务和大锁
+- 未读通知不归档，因此不影响未读计数
+- 每轮只由取得租约的一个 worker 执行：多个 worker 同时归档会选中同一批 id，重复写入归档表
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, insert, select
+
+from core import leases
+from core.config import settings
+from db.session import AsyncSessionLocal
+from db.models.notification import Notification, NotificationArchive, NotificationType
+
+_COPY_COLUMNS = ("id", "user_id", "type", "title", "content", "related_id", "related_type", "is_read", "created_at")
+
+
+def retention_rules() -> list[tuple[list[NotificationType], int]]:
+    """返回 [(通知类型列表, 保留天数)]，未单独配置的类型归入默认规则。"""
+    overrides = {NotificationType(t): days for t, days in settings.NOTIFICATION_RETENTION_BY_TYPE.items()}
+    rules = [([t], days) for t, days in overrides.items()]
+    default_types = [t for t in NotificationType if t not in overrides]
+    if default_types:
+        rules.append((default_types, settings.NOTIFICATION_RETENTION_DAYS))
+    return rules
+
+
+async def archive_batch(types: list[NotificationType], cutoff: datetime) -> int:
+    """归档一批，返回移动的行数。"""
+    batch_size = settings.NOTIFICATION_ARCHIVE_BATCH_SIZE
+    async with AsyncSessionLocal() as session:
+        ids = (await session.execute(
+            select(Notification.id)
+            .where(
+                Notification.type.in_(types),
+                Notification.is_read == True,
+                Notification.created_at < cutoff,
+            )
+            .order_by(Notification.id)
+            .limit(batch_size)
+        )).scalars().all()
+        if not ids:
+            return 0
+        columns = [getattr(Notification, c) for c in _COPY_COLUMNS]
+        await session.execute(
+            insert(NotificationArchive).from_select(
+                list(_COPY_COLUMNS), select(*columns).where(Notification.id.in_(ids))
+            )
+        )
+        await session.execute(
+            delete(Notification)
+            .where(Notification.id.in_(ids))
+            .execution_options(synchronize_session=False)
+        )
+        await session.commit()
+        return len(ids)
+
+
+async def compact() -> int:
+    """按全部保留规则归档，返回移动的总行数。"""
+    moved = 0
+    now = datetime.utcnow()
+    for types, days in retention_rules():
+        if days <= 0:
+            continue
+        cutoff = now - timedelta(days=days)
+        while True:
+            count = await archive_batch(types, cutoff)
+            moved += count
+            if count < settings.NOTIFICATION_ARCHIVE_BATCH_SIZE:
+                break
+            # 批次之间让出事件循环
+            await asyncio.sleep(0)
+    return moved
+
+
+class NotificationRetention:
+    """定时运行归档任务（每轮只由取得租约的一个 worker 执行）。"""
+
+    def __init__(self):
+        self._task: asyncio.Task | None = None
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                # 租约略短于间隔：持有者下一轮可以续期，持有者退出后其他 worker 接手
+                if await leases.try_acquire("notification_retention.compact", settings.NOTIFICATION_COMPACTION_INTERVAL_SECONDS * 0.9):
+                    moved = await compact()
+                    if moved:
+                        print(f"已归档 {moved} 条通知")
+            except Exception as e:
+                print(f"归档通知失败: {e}")
+            await asyncio.sleep(settings.NOTIFICATION_COMPACTION_INTERVAL_SECONDS)
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+notification_retention = NotificationRetention()
@@ -1,18 +1,26 @@
 """通知服务（中文注释）。
 
-提供创建和管理通知的功能。
+提供创建和管理通知的功能：
+- 批量写入通知（一次 INSERT、一次提交）
+- WebSocket 推送由后台派发器并发执行，不阻塞请求
+- 路由通过外发箱事件（core.outbox）异步触发通知，处理函数见文件末尾
 """
 
+import asyncio
 import re
+from datetime import datetime
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, insert, text
 from typing import List, Optional
 
 from db.models.notification import Notification, NotificationType
 from db.models.user import User
 from db.models.project import Project
 from db.models.task import Task
+from db.models.team import TeamMember
 from schemas.notification import NotificationCreate
+from core import outbox
+from core.unread_counter import unread_counter
 from api.routes.ws import manager
 
 
@@ -25,54 +33,134 @@ def clean_html_tags(text: str) -> str:
     return clean_text
 
 
+class NotificationDispatcher:
+    """后台 WebSocket 推送派发器。
+
+    通知写库提交后，推送交给后台任务并发执行，不阻塞 HTTP 请求。
+    """
+
+    def __init__(self):
+        self._tasks: set[asyncio.Task] = set()
+
+    def dispatch(self, items: List[tuple[int, dict]]):
+        """提交一批 (user_id, notification_data) 推送。"""
+        if not items:
+            return
+        task = asyncio.create_task(self._send_all(items))
+        # 保留引用，避免任务在完成前被回收
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _send_all(self, items: List[tuple[int, dict]]):
+        await asyncio.gather(
+            *(NotificationService.send_ws_notification(user_id, data) for user_id, data in items),
+            return_exceptions=True,
+        )
+
+
+dispatcher = NotificationDispatcher()
+
+# MySQL 自增步长（主从/集群部署可能不是 1），首次使用时查询
+_autoinc_step: int | None = None
+
+
+async def _insert_mysql(session: AsyncSession, rows: list[dict]) -> List[Notification]:
+    """MySQL 不支持 RETURNING：一条多行 INSERT 写入，按 lastrowid 与 rowcount 还原 id。
+
+    InnoDB 为行数已知的多行 INSERT 一次分配连续的自增值，lastrowid 是第一行的 id。
+    """
+    global _autoinc_step
+    if _autoinc_step is None:
+        _autoinc_step = int((await session.execute(text("SELECT @@auto_increment_increment"))).scalar_one())
+    created_at = datetime.utcnow()
+    rows = [{**row, "is_read": False, "created_at": created_at} for row in rows]
+    result = await session.execute(insert(Notification).values(rows))
+    if result.rowcount != len(rows):
+        raise RuntimeError(f"批量写入通知的行数不一致: {result.rowcount} != {len(rows)}")
+    first_id = result.lastrowid
+    return [Notification(id=first_id + i * _autoinc_step, **row) for i, row in enumerate(rows)]
+
+
+def to_notification_data(n: Notification) -> dict:
+    """WebSocket 推送的通知数据。"""
+    return {
+        "id": n.id,
+        "type": n.type.value,
+        "title": n.title,
+        "content": n.content,
+        "related_id": n.related_id,
+        "related_type": n.related_type,
+        "created_at": n.created_at.isoformat(),
+        "is_read": False
+    }
+
+
 class NotificationService:
     """通知服务类"""
 
     @staticmethod
     async def send_ws_notification(user_id: int, notification_data: dict):
-        """通过WebSocket发送通知"""
-        websocket = manager.get(user_id)
-        if websocket:
-            try:
-                await websocket.send_json({
-                    "type": "notification",
-                    "data": notification_data
-                })
-            except Exception as e:
-                print(f"发送WebSocket通知失败: {e}")
+        """通过WebSocket发送通知（经消息总线路由到持有连接的 worker）"""
+        try:
+            await manager.send_to_user(user_id, {
+                "type": "notification",
+                "data": notification_data
+            })
+        except Exception as e:
+            print(f"发送WebSocket通知失败: {e}")
+
+    @staticmethod
+    async def create_notifications(
+        session: AsyncSession,
+        notifications: List[NotificationCreate]
+    ) -> List[Notification]:
+        """批量创建通知。
+
+        - 一条多行 INSERT 写入全部通知（数据库支持时用 RETURNING 取回 id，MySQL 按 lastrowid 还原）
+        - 只提交一次
+        - WebSocket 推送交给后台派发器并发执行
+        """
+        if not notifications:
+            return []
+        rows = [
+            {
+                "user_id": n.user_id,
+                "type": n.type,
+                "title": n.title,
+                "content": n.content,
+                "related_id": n.related_id,
+                "related_type": n.related_type,
+            }
+            for n in notifications
+        ]
+        dialect = session.get_bind().dialect
+        if dialect.insert_executemany_returning:
+            result = await session.execute(insert(Notification).returning(Notification), rows)
+            db_notifications = list(result.scalars().all())
+        elif dialect.name == "mysql":
+            db_notifications = await _insert_mysql(session, rows)
+        else:
+            # 其他不支持 RETURNING 的数据库由 ORM 在同一事务内逐行写入
+            db_notifications = [Notification(**row) for row in rows]
+            session.add_all(db_notifications)
+            await session.flush()
+        await session.commit()
+
+        # 失效所有 worker 的未读数缓存（前端收到通知推送后自行加一）
+        await unread_counter.invalidate({n.user_id for n in db_notifications})
+
+        # 通过WebSocket发送实时通知
+        dispatcher.dispatch([(n.user_id, to_notification_data(n)) for n in db_notifications])
+        return db_notifications
 
     @staticmethod
     async def create_notification(
         session: AsyncSession,
         notification: NotificationCreate
     ) -> Notification:
-        """创建通知"""
-        db_notification = Notification(
-            user_id=notification.user_id,
-            type=notification.type,
-            title=notification.title,
-            content=notification.content,
-            related_id=notification.related_id,
-            related_type=notification.related_type
-        )
-        session.add(db_notification)
-        await session.commit()
-        await session.refresh(db_notification)
-        
-        # 通过WebSocket发送实时通知
-        notification_data = {
-            "id": db_notification.id,
-            "type": db_notification.type.value,
-            "title": db_notification.title,
-            "content": db_notification.content,
-            "related_id": db_notification.related_id,
-            "related_type": db_notification.related_type,
-            "created_at": db_notification.created_at.isoformat(),
-            "is_read": False
-        }
-        await NotificationService.send_ws_notification(notification.user_id, notification_data)
-        
-        return db_notification
+        """创建单条通知"""
+        created = await NotificationService.create_notifications(session, [notification])
+        return created[0]
 
     @staticmethod
     async def create_mention_notifications(
@@ -92,19 +180,21 @@ class NotificationService:
         if not project:
             return
 
-        for user_id in mentioned_user_ids:
-            if user_id == mentioner.id:  # 不给自己发通知
-                continue
-
-            notification = NotificationCreate(
+        text = clean_html_tags(comment_content)
+        summary = f"{text[:100]}{'...' if len(text) > 100 else ''}"
+        notifications = [
+            NotificationCreate(
                 user_id=user_id,
                 type=NotificationType.MENTION,
                 title=f"你在项目「{project.name}」中被提及",
-                content=f"{mentioner.nickname or mentioner.username} 在评论中提及了你: {clean_html_tags(comment_content)[:100]}{'...' if len(clean_html_tags(comment_content)) > 100 else ''}",
+                content=f"{mentioner.nickname or mentioner.username} 在评论中提及了你: {summary}",
                 related_id=project_id,
                 related_type="project"
             )
-            await NotificationService.create_notification(session, notification)
+            for user_id in mentioned_user_ids
+            if user_id != mentioner.id  # 不给自己发通知
+        ]
+        await NotificationService.create_notifications(session, notifications)
 
     @staticmethod
     async def create_task_assigned_notifications(
@@ -117,11 +207,8 @@ class NotificationService:
         if not assignee_ids:
             return
 
-        for user_id in assignee_ids:
-            if user_id == assigner.id:  # 不给自己发通知
-                continue
-
-            notification = NotificationCreate(
+        notifications = [
+            NotificationCreate(
                 user_id=user_id,
                 type=NotificationType.TASK_ASSIGNED,
                 title=f"你被分配了新任务",
@@ -129,7 +216,10 @@ class NotificationService:
                 related_id=task.id,
                 related_type="task"
             )
-            await NotificationService.create_notification(session, notification)
+            for user_id in assignee_ids
+            if user_id != assigner.id  # 不给自己发通知
+        ]
+        await NotificationService.create_notifications(session, notifications)
 
     @staticmethod
     async def create_team_member_added_notifications(
@@ -140,11 +230,8 @@ class NotificationService:
         team_name: str
     ):
         """创建团队成员添加通知"""
-        for user_id in new_member_ids:
-            if user_id == adder.id:  # 不给自己发通知
-                continue
-
-            notification = NotificationCreate(
+        notifications = [
+            NotificationCreate(
                 user_id=user_id,
                 type=NotificationType.TEAM_INVITE,
                 title=f"你被添加到团队「{team_name}」",
@@ -152,7 +239,10 @@ class NotificationService:
                 related_id=team_id,
                 related_type="team"
             )
-            await NotificationService.create_notification(session, notification)
+            for user_id in new_member_ids
+            if user_id != adder.id  # 不给自己发通知
+        ]
+        await NotificationService.create_notifications(session, notifications)
 
     @staticmethod
     async def create_project_member_added_notifications(
@@ -162,31 +252,28 @@ class NotificationService:
         project: Project
     ):
         """创建项目成员添加通知"""
-        for user_id in new_member_ids:
-            if adder and user_id == adder.id:  # 不给自己发通知
-                continue
-
-            if adder:
-                # 手动添加成员的通知
-                notification = NotificationCreate(
-                    user_id=user_id,
-                    type=NotificationType.PROJECT_ASSIGNED,
-                    title=f"你被分配到项目「{project.name}」",
-                    content=f"{adder.nickname or adder.username} 将你添加到了项目「{project.name}」",
-                    related_id=project.id,
-                    related_type="project"
-                )
-            else:
-                # 项目创建时自动分配的通知
-                notification = NotificationCreate(
-                    user_id=user_id,
-                    type=NotificationType.PROJECT_ASSIGNED,
-                    title=f"你被指派为项目「{project.name}」的负责人",
-                    content=f"你被指派为项目「{project.name}」的负责人",
-                    related_id=project.id,
-                    related_type="project"
-                )
-            await NotificationService.create_notification(session, notification)
+        if adder:
+            # 手动添加成员的通知
+            title = f"你被分配到项目「{project.name}」"
+            content = f"{adder.nickname or adder.username} 将你添加到了项目「{project.name}」"
+        else:
+            # 项目创建时自动分配的通知
+            title = f"你被指派为项目「{project.name}」的负责人"
+            content = f"你被指派为项目「{project.name}」的负责人"
+
+        notifications = [
+            NotificationCreate(
+                user_id=user_id,
+                type=NotificationType.PROJECT_ASSIGNED,
+                title=title,
+                content=content,
+                related_id=project.id,
+                related_type="project"
+            )
+            for user_id in new_member_ids
+            if not (adder and user_id == adder.id)  # 不给自己发通知
+        ]
+        await NotificationService.create_notifications(session, notifications)
 
     @staticmethod
     async def create_team_project_assigned_notifications(
@@ -195,8 +282,8 @@ class NotificationService:
         project: Project
     ):
         """创建团队项目分配通知"""
-        for user_id in team_member_ids:
-            notification = NotificationCreate(
+        notifications = [
+            NotificationCreate(
                 user_id=user_id,
                 type=NotificationType.PROJECT_ASSIGNED,
                 title=f"你的团队被分配了新项目",
@@ -204,4 +291,50 @@ class NotificationService:
                 related_id=project.id,
                 related_type="project"
             )
-            await NotificationService.create_notification(session, notification)
\ No newline at end of file
+            for user_id in team_member_ids
+        ]
+        await NotificationService.create_notifications(session, notifications)
+
+
+# ---- 外发箱事件处理（payload 只存 id，执行时再加载最新数据） ----
+
+@outbox.handler("notification.mention")
+async def _on_mention(session: AsyncSession, payload: dict):
+    mentioner = await session.get(User, payload["mentioner_id"])
+    if mentioner:
+        await NotificationService.create_mention_notifications(
+            session, payload["user_ids"], mentioner, payload["project_id"], payload["content"]
+        )
+
+
+@outbox.handler("notification.task_assigned")
+async def _on_task_assigned(session: AsyncSession, payload: dict):
+    task = await session.get(Task, payload["task_id"])
+    assigner = await session.get(User, payload["assigner_id"])
+    if task and assigner:
+        await NotificationService.create_task_assigned_notifications(
+            session, payload["user_ids"], assigner, task
+        )
+
+
+@outbox.handler("notification.project_member_added")
+async def _on_project_member_added(session: AsyncSession, payload: dict):
+    project = await session.get(Project, payload["project_id"])
+    adder = await session.get(User, payload["adder_id"]) if payload.get("adder_id") else None
+    if project:
+        await NotificationService.create_project_member_added_notifications(
+            session, payload["user_ids"], adder, project
+        )
+
+
+@outbox.handler("notification.team_project_assigned")
+async def _on_team_project_assigned(session: AsyncSession, payload: dict):
+    project = await session.get(Project, payload["project_id"])
+    if not project:
+        return
+    member_ids = (await session.execute(
+        select(TeamMember.user_id).where(TeamMember.team_id == payload["team_id"])
+    )).scalars().all()
+    await NotificationService.create_team_project_assigned_notifications(
+        session, list(member_ids), project
+    )
@@ -0,0 +1,315 @@
+"""事务外发箱（中文注释）。
+
+把通知、WebSocket 推送、目录创建等副作用移出请求路径：
+- 路由在同一事务中调用 enqueue() 写入事件，请求只需一次提交
+- 后台 worker（由 main.lifespan 启动）认领事件并调用已注册的处理函数
+- 失败按指数退避重试，超过最大次数标记为 failed；认领后超时未完成的事件会被重新投递，
+  因此处理函数需容忍重复执行（至少执行一次）
+- 超时被重新投递的事件同样计入尝试次数：处理函数一直卡住时，达到最大次数后在认领时标记为 failed
+- 已完成的事件保留 OUTBOX_DONE_RETENTION_HOURS 后分批删除，外发箱表不会无限增长
+- 耗时较长的处理函数（如后台导出）注册时声明 timeout：执行期间定期刷新认领时间，
+  不会因超过认领超时被其他 worker 重复执行，超过 timeout 则取消并按失败重试
+
+查看队列积压：python -m core.outbox
+"""
+
+import asyncio
+import json
+import os
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable
+
+from sqlalchemy import and_, delete, event, func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from db.session import AsyncSessionLocal
+from db.models.outbox import OutboxEvent, OutboxStatus
+
+Handler = Callable[[AsyncSession, dict], Awaitable[None]]
+
+_handlers: dict[str, Handler] = {}
+_timeouts: dict[str, float] = {}  # 声明了执行时限的长任务
+
+# session.info 标记：本事务写入了外发箱事件，提交后唤醒 worker
+_PENDING_KEY = "outbox_pending"
+
+
+def handler(topic: str, timeout: float | None = None):
+    """注册事件处理函数：async def fn(session, payload)。
+
+    timeout 用于执行时间可能超过认领超时的长任务：执行期间持续续约，超过 timeout 视为失败。
+    """
+    def decorator(fn: Handler) -> Handler:
+        _handlers[topic] = fn
+        if timeout:
+            _timeouts[topic] = timeout
+        return fn
+    return decorator
+
+
+def enqueue(session: AsyncSession, topic: str, payload: dict[str, Any]) -> OutboxEvent:
+    """在当前事务中写入一个事件（随业务数据一起提交）。"""
+    item = OutboxEvent(topic=topic, payload=json.dumps(payload, ensure_ascii=False, default=str))
+    session.add(item)
+    session.info[_PENDING_KEY] = True
+    return item
+
+
+def _stale(now: datetime):
+    """认领后超时未完成的事件（处理函数卡住或 worker 已退出）。"""
+    stale = now - timedelta(seconds=settings.OUTBOX_VISIBILITY_TIMEOUT_SECONDS)
+    return and_(OutboxEvent.status == OutboxStatus.PROCESSING, OutboxEvent.locked_at < stale)
+
+
+def _claimable(now: datetime):
+    return or_(
+        and_(OutboxEvent.status == OutboxStatus.PENDING, OutboxEvent.available_at <= now),
+        and_(_stale(now), OutboxEvent.attempts < settings.OUTBOX_MAX_ATTEMPTS),
+    )
+
+
+def _retry_delay(attempts: int) -> float:
+    delay = settings.OUTBOX_RETRY_BASE_SECONDS * (2 ** max(attempts - 1, 0))
+    return min(delay, settings.OUTBOX_RETRY_MAX_SECONDS)
+
+
+class OutboxWorker:
+    """外发箱后台 worker：一个认领协程 + 若干处理协程。"""
+
+    def __init__(self):
+        self._queue: asyncio.Queue | None = None
+        self._tasks: list[asyncio.Task] = []
+        self._wake = asyncio.Event()
+
+    def wake(self) -> None:
+        """有新事件提交时立即开始认领，不必等待轮询间隔。"""
+        self._wake.set()
+
+    async def _claim(self) -> list[dict]:
+        """认领一批事件；用令牌做条件更新，多个进程并发认领也不会重复。"""
+        now = datetime.utcnow()
+        token = uuid.uuid4().hex
+        async with AsyncSessionLocal() as session:
+            # 已用完尝试次数仍超时未完成的事件不再投递
+            abandoned = await session.execute(
+                update(OutboxEvent)
+                .where(_stale(now), OutboxEvent.attempts >= settings.OUTBOX_MAX_ATTEMPTS)
+                .values(status=OutboxStatus.FAILED, last_error="处理超时，已达到最大尝试次数", locked_by=None)
+                .execution_options(synchronize_session=False)
+            )
+            if abandoned.rowcount:
+                await session.commit()
+                print(f"{abandoned.rowcount} 个外发箱事件多次处理超时，已放弃")
+            ids = (await session.execute(
+                select(OutboxEvent.id)
+                .where(_claimable(now))
+                .order_by(OutboxEvent.id)
+                .limit(settings.OUTBOX_BATCH_SIZE)
+            )).scalars().all()
+            if not ids:
+                return []
+            await session.execute(
+                update(OutboxEvent)
+                .where(OutboxEvent.id.in_(ids), _claimable(now))
+                .values(
+                    status=OutboxStatus.PROCESSING,
+                    locked_by=token,
+                    locked_at=now,
+                    attempts=OutboxEvent.attempts + 1,
+                )
+                .execution_options(synchronize_session=False)
+            )
+            await session.commit()
+            rows = (await session.execute(
+                select(OutboxEvent.id, OutboxEvent.topic, OutboxEvent.payload, OutboxEvent.attempts, OutboxEvent.locked_by)
+                .where(OutboxEvent.locked_by == token, OutboxEvent.status == OutboxStatus.PROCESSING)
+                .order_by(OutboxEvent.id)
+            )).mappings().all()
+        return [dict(row) for row in rows]
+
+    async def _finish(self, item: dict, **values) -> None:
+        async with AsyncSessionLocal() as session:
+            await session.execute(
+                update(OutboxEvent)
+                # 只更新仍由自己持有的事件（超时后可能已被重新认领）
+                .where(OutboxEvent.id == item["id"], OutboxEvent.locked_by == item["locked_by"])
+                .values(**values)
+                .execution_options(synchronize_session=False)
+            )
+            await session.commit()
+
+    async def _keep_lease(self, item: dict) -> None:
+        """长任务执行期间定期刷新认领时间，避免超时后被其他 worker 重复认领。"""
+        while True:
+            await asyncio.sleep(settings.OUTBOX_VISIBILITY_TIMEOUT_SECONDS / 3)
+            try:
+                async with AsyncSessionLocal() as session:
+                    await session.execute(
+                        update(OutboxEvent)
+                        .where(OutboxEvent.id == item["id"], OutboxEvent.locked_by == item["locked_by"])
+                        .values(locked_at=datetime.utcnow())
+                        .execution_options(synchronize_session=False)
+                    )
+                    await session.commit()
+            except Exception as e:
+                print(f"外发箱事件 {item['id']} 续约失败: {e}")
+
+    async def _process(self, item: dict) -> None:
+        fn = _handlers.get(item["topic"])
+        timeout = _timeouts.get(item["topic"])
+        try:
+            if fn is None:
+                raise LookupError(f"未注册的事件主题: {item['topic']}")
+            lease = asyncio.create_task(self._keep_lease(item)) if timeout else None
+            try:
+                async with AsyncSessionLocal() as session:
+                    await asyncio.wait_for(fn(session, json.loads(item["payload"])), timeout)
+            finally:
+                if lease is not None:
+                    lease.cancel()
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            if item["attempts"] >= settings.OUTBOX_MAX_ATTEMPTS:
+                print(f"外发箱事件 {item['id']} ({item['topic']}) 多次失败，已放弃: {error}")
+                await self._finish(item, status=OutboxStatus.FAILED, last_error=error, locked_by=None)
+            else:
+                retry_at = datetime.utcnow() + timedelta(seconds=_retry_delay(item["attempts"]))
+                await self._finish(
+                    item, status=OutboxStatus.PENDING, available_at=retry_at, last_error=error, locked_by=None
+                )
+        else:
+            await self._finish(
+                item, status=OutboxStatus.DONE, processed_at=datetime.utcnow(), last_error=None, locked_by=None
+            )
+
+    async def _poll_loop(self) -> None:
+        while True:
+            try:
+                items = await self._claim()
+            except Exception as e:
+                print(f"认领外发箱事件失败: {e}")
+                items = []
+            for item in items:
+                # 队列有界：处理不过来时暂停认领
+                await self._queue.put(item)
+            if len(items) < settings.OUTBOX_BATCH_SIZE:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=settings.OUTBOX_POLL_INTERVAL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake.clear()
+
+    async def _sweep_loop(self) -> None:
+        while True:
+            try:
+                while await sweep_done() >= settings.OUTBOX_SWEEP_BATCH_SIZE:
+                    await asyncio.sleep(0)
+            except Exception as e:
+                print(f"清理已完成外发箱事件失败: {e}")
+            await asyncio.sleep(settings.OUTBOX_SWEEP_INTERVAL_SECONDS)
+
+    async def _work_loop(self) -> None:
+        while True:
+            item = await self._queue.get()
+            try:
+                await self._process(item)
+            except Exception as e:
+                # 状态写回失败：事件仍为 processing，超时后会重新投递
+                print(f"处理外发箱事件 {item['id']} 失败: {e}")
+
+    async def start(self) -> None:
+        self._queue = asyncio.Queue(maxsize=settings.OUTBOX_BATCH_SIZE * 2)
+        self._tasks = [asyncio.create_task(self._poll_loop())]
+        self._tasks += [asyncio.create_task(self._work_loop()) for _ in range(settings.OUTBOX_WORKERS)]
+        if settings.OUTBOX_DONE_RETENTION_HOURS > 0:
+            self._tasks.append(asyncio.create_task(self._sweep_loop()))
+
+    async def stop(self) -> None:
+        # 未处理完的事件保持 processing 状态，下次启动超时后重新投递
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+
+
+async def sweep_done() -> int:
+    """删除一批超过保留时长的已完成事件，返回删除数量。"""
+    cutoff = datetime.utcnow() - timedelta(hours=settings.OUTBOX_DONE_RETENTION_HOURS)
+    async with AsyncSessionLocal() as session:
+        ids = (await session.execute(
+            select(OutboxEvent.id)
+            .where(OutboxEvent.status == OutboxStatus.DONE, OutboxEvent.processed_at < cutoff)
+            .limit(settings.OUTBOX_SWEEP_BATCH_SIZE)
+        )).scalars().all()
+        if not ids:
+            return 0
+        await session.execute(
+            delete(OutboxEvent).where(OutboxEvent.id.in_(ids)).execution_options(synchronize_session=False)
+        )
+        await session.commit()
+        return len(ids)
+
+
+outbox_worker = OutboxWorker()
+
+
+@event.listens_for(Session, "after_commit")
+def _wake_after_commit(session: Session) -> None:
+    if session.info.pop(_PENDING_KEY, False):
+        outbox_worker.wake()
+
+
+@event.listens_for(Session, "after_rollback")
+def _clear_after_rollback(session: Session) -> None:
+    session.info.pop(_PENDING_KEY, None)
+
+
+async def queue_stats(session: AsyncSession) -> dict:
+    """外发箱队列状态：未完成/失败事件数量与最早未完成事件的积压时长（秒）。
+
+    只统计 pending/processing/failed（走 status 索引），不扫描数量最多的已完成事件。
+    """
+    counts = dict((await session.execute(
+        select(OutboxEvent.status, func.count())
+        .where(OutboxEvent.status.in_([OutboxStatus.PENDING, OutboxStatus.PROCESSING, OutboxStatus.FAILED]))
+        .group_by(OutboxEvent.status)
+    )).all())
+    oldest = (await session.execute(
+        select(func.min(OutboxEvent.created_at)).where(
+            OutboxEvent.status.in_([OutboxStatus.PENDING, OutboxStatus.PROCESSING])
+        )
+    )).scalar_one_or_none()
+    return {
+        "pending": counts.get(OutboxStatus.PENDING, 0),
+        "processing": counts.get(OutboxStatus.PROCESSING, 0),
+        "failed": counts.get(OutboxStatus.FAILED, 0),
+        "lag_seconds": round((datetime.utcnow() - oldest).total_seconds(), 1) if oldest else 0.0,
+    }
+
+
+@handler("fs.makedirs")
+async def _make_dirs(session: AsyncSession, payload: dict) -> None:
+    """创建上传目录。"""
+    for path in payload["paths"]:
+        await asyncio.to_thread(os.makedirs, path, exist_ok=True)
+
+
+async def _print_stats() -> None:
+    from db.session import engine
+
+    async with AsyncSessionLocal() as session:
+        stats = await queue_stats(session)
+    await engine.dispose()
+    for key, value in stats.items():
+        print(f"{key}: {value}")
+
+
+if __name__ == "__main__":
+    asyncio.run(_print_stats())
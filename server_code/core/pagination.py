@@ -0,0 +1,149 @@
+"""列表分页工具（中文注释）。
+
+同时支持两种分页方式：
+- 页码分页（page/page_size）：兼容旧接口，使用 OFFSET
+- 游标分页（cursor）：键集分页，游标是对 (排序键..., id) 的不透明编码，
+  深翻页性能与第一页相同，可通过 next_cursor / prev_cursor 前后翻页
+
+总数统计可选：exact（精确 COUNT）、approx（最多统计到上限）、none（不统计）。
+"""
+
+import base64
+import json
+from datetime import date, datetime
+from typing import Any, Sequence
+
+from fastapi import HTTPException, status
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import Select
+
+from core.config import settings
+
+TOTAL_MODES = ("exact", "approx", "none")
+
+# 排序键：(列, 是否倒序)，最后一项必须是唯一列（通常是 id）
+SortKeys = Sequence[tuple[Any, bool]]
+
+
+def _dump_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"$dt": value.isoformat()}
+    if isinstance(value, date):
+        return {"$d": value.isoformat()}
+    return value
+
+
+def _load_value(value: Any) -> Any:
+    if isinstance(value, dict):
+        if "$dt" in value:
+            return datetime.fromisoformat(value["$dt"])
+        if "$d" in value:
+            return date.fromisoformat(value["$d"])
+    return value
+
+
+def encode_cursor(values: Sequence[Any], direction: str) -> str:
+    """编码游标；direction 为 next（向后）或 prev（向前）。"""
+    raw = json.dumps({"v": [_dump_value(v) for v in values], "d": direction}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, key_count: int) -> tuple[list[Any], str]:
+    """解码游标，格式不合法时返回 400。"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        values = [_load_value(v) for v in data["v"]]
+        direction = data["d"]
+    except Exception:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="无效的分页游标")
+    if len(values) != key_count or direction not in ("next", "prev"):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="无效的分页游标")
+    return values, direction
+
+
+def _keyset_condition(keys: SortKeys, values: Sequence[Any], backward: bool):
+    """生成“排在游标之后”的条件：(k1 > v1) OR (k1 = v1 AND k2 > v2) ..."""
+    clauses = []
+    for i, (column, descending) in enumerate(keys):
+        after_desc = descending != backward
+        cmp = column < values[i] if after_desc else column > values[i]
+        prefix = [keys[j][0] == values[j] for j in range(i)]
+        clauses.append(and_(*prefix, cmp))
+    return or_(*clauses)
+
+
+def _order_by(keys: SortKeys, backward: bool) -> list:
+    return [
+        column.desc() if descending != backward else column.asc()
+        for column, descending in keys
+    ]
+
+
+def _key_values(item: Any, keys: SortKeys) -> list[Any]:
+    return [getattr(item, column.key) for column, _ in keys]
+
+
+async def count_total(session: AsyncSession, count_stmt: Select, mode: str) -> int | None:
+    """按统计模式计算总数；count_stmt 为只选 id 列且带过滤条件的查询。"""
+    if mode == "none":
+        return None
+    if mode == "approx":
+        count_stmt = count_stmt.limit(settings.PAGINATION_APPROX_TOTAL_CAP)
+    return (await session.execute(select(func.count()).select_from(count_stmt.subquery()))).scalar_one()
+
+
+async def paginate(
+    session: AsyncSession,
+    stmt: Select,
+    *,
+    keys: SortKeys,
+    count_stmt: Select,
+    page: int = 1,
+    page_size: int = 20,
+    cursor: str | None = None,
+    total_mode: str | None = None,
+) -> dict:
+    """执行分页查询。
+
+    - stmt：带过滤条件、尚未排序分页的实体查询
+    - keys：排序键，最后一项需唯一
+    - 传入 cursor 时使用键集分页并忽略 page；默认不统计总数
+    - 未传 cursor 时使用页码分页；默认精确统计总数
+
+    返回 {"items", "total", "next_cursor", "prev_cursor"}。
+    """
+    if total_mode is None:
+        total_mode = "none" if cursor else "exact"
+    if total_mode not in TOTAL_MODES:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"total_mode 可选值: {', '.join(TOTAL_MODES)}")
+
+    backward = False
+    if cursor:
+        values, direction = decode_cursor(cursor, len(keys))
+        backward = direction == "prev"
+        stmt = stmt.where(_keyset_condition(keys, values, backward))
+    else:
+        stmt = stmt.offset((page - 1) * page_size)
+
+    # 多取一条用于判断是否还有更多数据
+    stmt = stmt.order_by(*_order_by(keys, backward)).limit(page_size + 1)
+    rows = (await session.execute(stmt)).unique().scalars().all()
+    has_more = len(rows) > page_size
+    rows = list(rows[:page_size])
+    if backward:
+        rows.reverse()
+
+    total = await count_total(session, count_stmt, total_mode)
+
+    next_cursor = prev_cursor = None
+    if rows:
+        has_next = has_more if not backward else True
+        has_prev = has_more if backward else bool(cursor) or page > 1
+        if has_next:
+            next_cursor = encode_cursor(_key_values(rows[-1], keys), "next")
+        if has_prev:
+            prev_cursor = encode_cursor(_key_values(rows[0], keys), "prev")
+
+    return {"items": rows, "total": total, "next_cursor": next_cursor, "prev_cursor": prev_cursor}
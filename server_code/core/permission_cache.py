@@ -0,0 +1,50 @@
+"""权限缓存（中文注释）。
+
+认证热点路径上的权限解析缓存：
+- 进程级 LRU + TTL 缓存，键为 (用户ID, 主角色ID, 角色权限版本号)
+- 角色权限变更时递增版本号使全部条目失效；用户角色变更时按用户失效
+- 调用方在查库之前读取 version 并传给 set()，查库期间版本变化则不写入，避免旧权限落到新版本下
+- 请求内的记忆化由 api.deps.auth.get_user_permissions 通过 session.info 完成
+"""
+
+from core.cache import TTLCache
+from core.config import settings
+
+
+class PermissionCache:
+    """用户权限码集合的进程级缓存。"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        # 角色权限版本号：任一角色的权限配置变化时递增
+        self.version = 0
+
+    def _key(self, user_id: int, role_id: int | None) -> tuple:
+        return (user_id, role_id, self.version)
+
+    def get(self, user_id: int, role_id: int | None) -> frozenset[str] | None:
+        return self._cache.get(self._key(user_id, role_id))
+
+    def set(self, user_id: int, role_id: int | None, perms: frozenset[str], version: int) -> None:
+        """写入缓存；version 为查库之前读取的版本号，已失效时跳过。"""
+        if version != self.version:
+            return
+        self._cache.set((user_id, role_id, version), perms)
+
+    def invalidate_user(self, user_id: int) -> None:
+        """用户的角色分配变化时调用。"""
+        self._cache.pop_where(lambda k: k[0] == user_id)
+
+    def invalidate_all(self) -> None:
+        """角色权限配置变化时调用。"""
+        self.version += 1
+        self._cache.clear()
+
+    def stats(self) -> dict:
+        return {**self._cache.stats(), "version": self.version}
+
+
+permission_cache = PermissionCache(
+    maxsize=settings.PERMISSION_CACHE_MAX_ENTRIES,
+    ttl=settings.PERMISSION_CACHE_TTL_SECONDS,
+)
@@ -0,0 +1,210 @@
+"""在线状态服务（中文注释）。
+
+WebSocket 连接/断开不再逐次提交 users 表，而是：
+- 在内存中记录本 worker 持有连接的用户，把变化暂存起来，按固定间隔批量写入
+  presence_connections（本 worker 的登记），同时刷新本 worker 的心跳
+- users.online 由“心跳未过期的 worker 上是否还有该用户的连接”推导：
+  用户在 A、B 两个 worker 上都有连接时，关闭 A 上的连接不会让用户离线
+- 心跳超过 PRESENCE_WORKER_TTL_SECONDS 的 worker 视为已退出，由任一 worker 清理其登记；
+  启动时只清理这些过期登记，不影响其他存活 worker 的在线状态
+- users.online 实际发生变化时回调监听者（WebSocket 模块据此广播上线/下线）
+
+多个 worker 并发写回同一用户时，以 users.online 与存活登记不一致的记录为准逐一修正，
+定期清理时会对全部用户再校准一次。
+"""
+
+import asyncio
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Iterable
+
+from sqlalchemy import case, delete, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import settings
+from db.session import AsyncSessionLocal
+from db.models.presence import PresenceConnection, PresenceWorker
+from db.models.user import User
+
+StatusListener = Callable[[int, bool], Awaitable[None]]
+
+
+class PresenceService:
+    """在线状态的本地登记、心跳与批量写回。"""
+
+    def __init__(self):
+        self.worker_id = uuid.uuid4().hex
+        self._local: set[int] = set()  # 本 worker 持有连接的用户
+        self._pending: dict[int, tuple[bool, datetime]] = {}  # 待写回的状态变化
+        self._listener: StatusListener | None = None
+        self._task: asyncio.Task | None = None
+        self._last_reap = 0.0
+
+    def set_listener(self, listener: StatusListener) -> None:
+        """注册 users.online 变化时的回调 (user_id, online)。"""
+        self._listener = listener
+
+    def mark_online(self, user_id: int) -> None:
+        """本 worker 上用户的第一个连接建立。"""
+        self._local.add(user_id)
+        self._pending[user_id] = (True, datetime.utcnow())
+
+    def mark_offline(self, user_id: int) -> None:
+        """本 worker 上用户的最后一个连接关闭。"""
+        self._local.discard(user_id)
+        self._pending[user_id] = (False, datetime.utcnow())
+
+    def _cutoff(self) -> datetime:
+        return datetime.utcnow() - timedelta(seconds=settings.PRESENCE_WORKER_TTL_SECONDS)
+
+    async def _heartbeat(self, session: AsyncSession) -> bool:
+        """刷新本 worker 心跳；返回 False 表示登记已不存在（首次启动或已被当作过期清理）。"""
+        now = datetime.utcnow()
+        result = await session.execute(
+            update(PresenceWorker).where(PresenceWorker.id == self.worker_id).values(heartbeat_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount:
+            return True
+        await session.execute(insert(PresenceWorker).values(id=self.worker_id, heartbeat_at=now, started_at=now))
+        return False
+
+    async def _sync(self, session: AsyncSession, user_ids: Iterable[int] | None = None) -> list[tuple[int, bool]]:
+        """按存活登记修正 users.online（user_ids 为空表示全部用户），返回实际变化。"""
+        live = (
+            select(PresenceConnection.user_id)
+            .join(PresenceWorker, PresenceWorker.id == PresenceConnection.worker_id)
+            .where(PresenceWorker.heartbeat_at >= self._cutoff())
+        )
+        scope = [] if user_ids is None else [User.id.in_(list(user_ids))]
+        went_online = (await session.execute(
+            select(User.id).where(*scope, User.online == False, User.id.in_(live))
+        )).scalars().all()
+        went_offline = (await session.execute(
+            select(User.id).where(*scope, User.online == True, User.id.not_in(live))
+        )).scalars().all()
+        if went_online:
+            await session.execute(
+                update(User).where(User.id.in_(went_online)).values(online=True)
+                .execution_options(synchronize_session=False)
+            )
+        if went_offline:
+            await session.execute(
+                update(User).where(User.id.in_(went_offline)).values(online=False)
+                .execution_options(synchronize_session=False)
+            )
+        return [(uid, True) for uid in went_online] + [(uid, False) for uid in went_offline]
+
+    async def _notify(self, changes: list[tuple[int, bool]]) -> None:
+        if self._listener is None:
+            return
+        for user_id, online in changes:
+            try:
+                await self._listener(user_id, online)
+            except Exception as e:
+                print(f"广播在线状态失败: {e}")
+
+    async def flush(self) -> None:
+        """刷新心跳，把暂存的状态变化写入本 worker 的登记并修正 users.online。"""
+        pending, self._pending = self._pending, {}
+        local = set(self._local)
+        try:
+            async with AsyncSessionLocal() as session:
+                registered = await self._heartbeat(session)
+                # 登记不存在时重新写入全部本地连接
+                changed = set(pending) if registered else set(pending) | local
+                if changed:
+                    await session.execute(
+                        delete(PresenceConnection).where(
+                            PresenceConnection.worker_id == self.worker_id,
+                            PresenceConnection.user_id.in_(list(changed)),
+                        )
+                    )
+                    now = datetime.utcnow()
+                    rows = [
+                        {"worker_id": self.worker_id, "user_id": uid, "connected_at": pending.get(uid, (True, now))[1]}
+                        for uid in changed
+                        if pending.get(uid, (True, now))[0]
+                    ]
+                    if rows:
+                        await session.execute(insert(PresenceConnection), rows)
+                    came_online = {uid: ts for uid, (online, ts) in pending.items() if online}
+                    if came_online:
+                        await session.execute(
+                            update(User)
+                            .where(User.id.in_(list(came_online)))
+                            .values(last_login=case(came_online, value=User.id))
+                            .execution_options(synchronize_session=False)
+                        )
+                changes = await self._sync(session, changed) if changed else []
+                await session.commit()
+        except Exception as e:
+            # 写回失败时放回队列，较新的变化优先
+            for uid, item in pending.items():
+                self._pending.setdefault(uid, item)
+            print(f"写回在线状态失败: {e}")
+            return
+        await self._notify(changes)
+
+    async def reap(self) -> None:
+        """清理心跳过期的 worker 及其登记，并按存活登记校准全部用户的在线状态。"""
+        self._last_reap = time.monotonic()
+        cutoff = self._cutoff()
+        async with AsyncSessionLocal() as session:
+            dead = select(PresenceWorker.id).where(PresenceWorker.heartbeat_at < cutoff)
+            await session.execute(delete(PresenceConnection).where(PresenceConnection.worker_id.in_(dead)))
+            await session.execute(
+                delete(PresenceWorker).where(PresenceWorker.heartbeat_at < cutoff)
+                .execution_options(synchronize_session=False)
+            )
+            changes = await self._sync(session)
+            await session.commit()
+        await self._notify(changes)
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(settings.PRESENCE_FLUSH_INTERVAL_SECONDS)
+            await self.flush()
+            if time.monotonic() - self._last_reap >= settings.PRESENCE_REAP_INTERVAL_SECONDS:
+                try:
+                    await self.reap()
+                except Exception as e:
+                    print(f"清理过期在线登记失败: {e}")
+
+    async def start(self) -> None:
+        await self.flush()  # 登记本 worker
+        if settings.PRESENCE_RECONCILE_ON_STARTUP:
+            await self.reap()
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # 本 worker 退出后其持有的连接都会断开：删除本 worker 的全部登记
+        users = set(self._local) | set(self._pending)
+        self._local.clear()
+        self._pending.clear()
+        try:
+            async with AsyncSessionLocal() as session:
+                await session.execute(
+                    delete(PresenceConnection).where(PresenceConnection.worker_id == self.worker_id)
+                )
+                await session.execute(
+                    delete(PresenceWorker).where(PresenceWorker.id == self.worker_id)
+                    .execution_options(synchronize_session=False)
+                )
+                changes = await self._sync(session, users) if users else []
+                await session.commit()
+        except Exception as e:
+            print(f"注销在线登记失败: {e}")
+            return
+        await self._notify(changes)
+
+
+presence = PresenceService()
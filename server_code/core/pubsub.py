@@ -0,0 +1,135 @@
+"""WebSocket 消息总线（中文注释）。
+
+多 worker 部署时，每个 worker 只持有部分 WebSocket 连接。
+ConnectionManager 把定向消息和广播发布到总线，各 worker 订阅后只投递给
+自己持有的连接，从而让消息到达持有该连接的 worker。
+
+- InProcessPubSub：单进程实现，发布即直接回调（默认）
+- RedisPubSub：基于 Redis PUBLISH/SUBSCRIBE 的跨进程实现（需安装 redis）；
+  连接断开后按指数退避重新订阅，断开期间发布的消息会丢失
+"""
+
+import asyncio
+import json
+from typing import Awaitable, Callable
+
+from core.config import settings
+
+MessageHandler = Callable[[dict], Awaitable[None]]
+
+
+class PubSubBackend:
+    """总线后端接口。"""
+
+    async def start(self, handler: MessageHandler) -> None:
+        """开始订阅，收到的每条消息都会交给 handler。"""
+        raise NotImplementedError
+
+    async def publish(self, message: dict) -> None:
+        """发布消息给所有订阅者（包括自己）。"""
+        raise NotImplementedError
+
+    async def stop(self) -> None:
+        """停止订阅并释放资源。"""
+
+
+class InProcessPubSub(PubSubBackend):
+    """进程内总线：只有一个订阅者，发布时直接调用。"""
+
+    def __init__(self):
+        self._handler: MessageHandler | None = None
+
+    async def start(self, handler: MessageHandler) -> None:
+        self._handler = handler
+
+    async def publish(self, message: dict) -> None:
+        if self._handler is not None:
+            await self._handler(message)
+
+    async def stop(self) -> None:
+        self._handler = None
+
+
+class RedisPubSub(PubSubBackend):
+    """Redis 总线：所有 worker 订阅同一频道。"""
+
+    def __init__(self, url: str, channel: str):
+        self.url = url
+        self.channel = channel
+        self._redis = None
+        self._pubsub = None
+        self._task: asyncio.Task | None = None
+
+    async def start(self, handler: MessageHandler) -> None:
+        # 可选依赖，仅在启用 Redis 总线时需要
+        import redis.asyncio as aioredis
+
+        self._redis = aioredis.from_url(self.url)
+        await self._subscribe()
+        self._task = asyncio.create_task(self._listen(handler))
+
+    async def _subscribe(self) -> None:
+        self._pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        await self._pubsub.subscribe(self.channel)
+
+    async def _close_pubsub(self) -> None:
+        if self._pubsub is not None:
+            try:
+                await self._pubsub.aclose()
+            except Exception:
+                pass
+            self._pubsub = None
+
+    async def _listen(self, handler: MessageHandler) -> None:
+        """接收消息；连接断开时按指数退避重新订阅。"""
+        delay = settings.WS_PUBSUB_RECONNECT_BASE_SECONDS
+        while True:
+            try:
+                if self._pubsub is None:
+                    await self._subscribe()
+                    print("消息总线已重新订阅")
+                delay = settings.WS_PUBSUB_RECONNECT_BASE_SECONDS
+                async for item in self._pubsub.listen():
+                    if item.get("type") != "message":
+                        continue
+                    try:
+                        await handler(json.loads(item["data"]))
+                    except Exception as e:
+                        print(f"处理总线消息失败: {e}")
+                error = "订阅已结束"
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                error = e
+            print(f"消息总线连接断开，{delay:g} 秒后重连: {error}")
+            await self._close_pubsub()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, settings.WS_PUBSUB_RECONNECT_MAX_SECONDS)
+
+    async def publish(self, message: dict) -> None:
+        await self._redis.publish(self.channel, json.dumps(message, ensure_ascii=False, default=str))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._pubsub is not None:
+            try:
+                await self._pubsub.unsubscribe(self.channel)
+            except Exception:
+                pass  # 连接已断开
+            await self._close_pubsub()
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+
+
+def create_pubsub_backend() -> PubSubBackend:
+    """按配置创建总线后端。"""
+    if settings.WS_PUBSUB_BACKEND == "redis":
+        return RedisPubSub(settings.REDIS_URL, settings.WS_PUBSUB_CHANNEL)
+    return InProcessPubSub()
@@ -0,0 +1,59 @@
+"""并发只读查询（中文注释）。
+
+同一个 AsyncSession 上的查询只能串行执行。仪表盘、图表分析这类接口包含多条互不依赖的聚合查询，
+这里让每条查询从连接池取一个独立会话并发执行（asyncio.gather），接口耗时约等于最慢的一条。
+
+全局信号量限制同时占用的连接数，避免高并发时挤占连接池：
+上限取 QUERY_FANOUT_MAX_CONCURRENCY 与连接池容量（pool_size + max_overflow）一半中的较小值，
+其余连接留给普通请求。调用方应先归还请求会话的连接（api.deps.session.release_session），
+否则等待并发连接时请求自身仍占着一个连接，连接池满时会互相等待直到超时。
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.sql import Select
+
+from core.config import settings
+from db.session import AsyncSessionLocal, engine
+
+Query = Callable[[AsyncSession], Awaitable[Any]]
+
+
+def max_concurrency() -> int:
+    """同时占用的连接上限：配置值，且不超过连接池容量的一半。"""
+    limit = settings.QUERY_FANOUT_MAX_CONCURRENCY
+    pool = engine.pool
+    if isinstance(pool, QueuePool) and pool._max_overflow >= 0:  # max_overflow=-1 表示不限
+        limit = min(limit, (pool.size() + pool._max_overflow) // 2)
+    return max(1, limit)
+
+
+_semaphore = asyncio.Semaphore(max_concurrency())
+
+
+async def _run(query: Query) -> Any:
+    async with _semaphore:
+        async with AsyncSessionLocal() as session:
+            return await query(session)
+
+
+async def fanout(*queries: Query) -> list[Any]:
+    """并发执行只读查询，结果顺序与参数一致。"""
+    return list(await asyncio.gather(*(_run(q) for q in queries)))
+
+
+def scalar(stmt: Select) -> Query:
+    """返回单个值的查询。"""
+    async def query(session: AsyncSession) -> Any:
+        return (await session.execute(stmt)).scalar()
+    return query
+
+
+def rows(stmt: Select) -> Query:
+    """返回全部行的查询。"""
+    async def query(session: AsyncSession) -> list:
+        return (await session.execute(stmt)).all()
+    return query
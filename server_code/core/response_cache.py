@@ -0,0 +1,306 @@
+"""接口响应缓存（中文注释）。
+
+仪表盘与图表分析的数据是全局的（与当前用户无关），按 命名空间 + 接口 + 参数 缓存计算结果：
+- TTL 内直接返回；过期后的 stale 窗口内先返回旧数据，同时在后台刷新（stale-while-revalidate）
+- 同一个键并发未命中时只计算一次（single-flight）
+- 任务、项目等数据提交后按命名空间失效（见 register_invalidation）
+- 后端可选：memory（进程内）或 sqlite（文件，多 worker 共享）
+- 命名空间的失效代数保存在后端中：计算开始前读取代数，写入时代数已变化（期间有失效，
+  包括其他 worker 发起的失效）则不写入，避免旧数据回填
+- 记录命中、过期命中、未命中次数
+
+计算函数在后台刷新时请求已经结束，因此需自行打开数据库会话，不能使用请求的会话。
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Awaitable, Callable, Hashable
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from core.cache import TTLCache
+from core.config import settings
+
+
+class MemoryBackend:
+    """进程内后端（LRU + TTL）。"""
+
+    def __init__(self, maxsize: int):
+        self._cache = TTLCache(maxsize=maxsize, ttl=0)
+        self._generations: dict[str, int] = {}  # 命名空间失效次数
+
+    async def get(self, key: str) -> tuple[Any, bool] | None:
+        item = self._cache.get(key)
+        if item is None:
+            return None
+        fresh_until, value = item
+        return value, time.monotonic() < fresh_until
+
+    async def generation(self, namespace: str) -> int:
+        return self._generations.get(namespace, 0)
+
+    async def set(self, key: str, value: Any, ttl: float, stale_ttl: float, namespace: str, generation: int) -> bool:
+        """命名空间代数仍为 generation 时写入，返回是否写入。"""
+        if self._generations.get(namespace, 0) != generation:
+            return False
+        self._cache.set(key, (time.monotonic() + ttl, value), ttl=ttl + stale_ttl)
+        return True
+
+    async def invalidate(self, namespace: str) -> None:
+        self._generations[namespace] = self._generations.get(namespace, 0) + 1
+        self._cache.pop_where(lambda k: k.startswith(f"{namespace}:"))
+
+    async def size(self) -> int:
+        return self._cache.stats()["size"]
+
+
+class SQLiteBackend:
+    """SQLite 文件后端：多个 worker 进程共享同一份缓存。数据库操作在线程池中执行。"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # 自动提交模式，写操作显式 BEGIN IMMEDIATE，读代数与写入在同一个写事务中
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS response_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, fresh_until REAL NOT NULL, expires_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS response_cache_generations ("
+                "namespace TEXT PRIMARY KEY, generation INTEGER NOT NULL)"
+            )
+            self._local.conn = conn
+        return conn
+
+    def _write(self, fn):
+        """在写事务中执行 fn(conn)：多个进程的写入与失效按顺序进行。"""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn(conn)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return result
+
+    @staticmethod
+    def _read_generation(conn: sqlite3.Connection, namespace: str) -> int:
+        row = conn.execute(
+            "SELECT generation FROM response_cache_generations WHERE namespace = ?", (namespace,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def _get(self, key: str):
+        return self._conn().execute(
+            "SELECT value, fresh_until FROM response_cache WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+
+    def _set(self, key: str, value: str, ttl: float, stale_ttl: float, namespace: str, generation: int) -> bool:
+        def write(conn: sqlite3.Connection) -> bool:
+            if self._read_generation(conn, namespace) != generation:
+                return False
+            now = time.time()
+            conn.execute(
+                "INSERT OR REPLACE INTO response_cache (key, value, fresh_until, expires_at) VALUES (?, ?, ?, ?)",
+                (key, value, now + ttl, now + ttl + stale_ttl),
+            )
+            # 顺带清理过期条目
+            conn.execute("DELETE FROM response_cache WHERE expires_at <= ?", (now,))
+            return True
+        return self._write(write)
+
+    def _invalidate(self, namespace: str) -> None:
+        prefix = f"{namespace}:"
+
+        def write(conn: sqlite3.Connection) -> None:
+            conn.execute(
+                "INSERT INTO response_cache_generations (namespace, generation) VALUES (?, 1) "
+                "ON CONFLICT(namespace) DO UPDATE SET generation = generation + 1",
+                (namespace,),
+            )
+            conn.execute("DELETE FROM response_cache WHERE substr(key, 1, ?) = ?", (len(prefix), prefix))
+        self._write(write)
+
+    def _size(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM response_cache").fetchone()[0]
+
+    async def get(self, key: str) -> tuple[Any, bool] | None:
+        row = await asyncio.to_thread(self._get, key)
+        if row is None:
+            return None
+        return json.loads(row[0]), time.time() < row[1]
+
+    async def generation(self, namespace: str) -> int:
+        return await asyncio.to_thread(lambda: self._read_generation(self._conn(), namespace))
+
+    async def set(self, key: str, value: Any, ttl: float, stale_ttl: float, namespace: str, generation: int) -> bool:
+        """命名空间代数仍为 generation 时写入，返回是否写入。"""
+        data = json.dumps(value, ensure_ascii=False)
+        return await asyncio.to_thread(self._set, key, data, ttl, stale_ttl, namespace, generation)
+
+    async def invalidate(self, namespace: str) -> None:
+        await asyncio.to_thread(self._invalidate, namespace)
+
+    async def size(self) -> int:
+        return await asyncio.to_thread(self._size)
+
+
+def create_backend():
+    if settings.RESPONSE_CACHE_BACKEND == "sqlite":
+        return SQLiteBackend(settings.RESPONSE_CACHE_SQLITE_PATH)
+    return MemoryBackend(settings.RESPONSE_CACHE_MAX_ENTRIES)
+
+
+class ResponseCache:
+    """带 stale-while-revalidate 与 single-flight 的响应缓存。"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._inflight: dict[str, asyncio.Task] = {}
+        self._background: set[asyncio.Task] = set()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(namespace: str, name: str, params: dict[str, Hashable] | None = None) -> str:
+        suffix = "&".join(f"{k}={params[k]}" for k in sorted(params)) if params else ""
+        return f"{namespace}:{name}?{suffix}"
+
+    def _compute(
+        self, namespace: str, key: str, compute: Callable[[], Awaitable[Any]], ttl: float, stale_ttl: float
+    ) -> asyncio.Task:
+        """同一个键只保留一个进行中的计算。"""
+        task = self._inflight.get(key)
+        if task is None:
+            async def run():
+                try:
+                    generation = await self.backend.generation(namespace)
+                    value = jsonable_encoder(await compute())
+                    # 计算期间发生了失效（本 worker 或其他 worker）则后端不写入，避免旧数据回填
+                    await self.backend.set(key, value, ttl, stale_ttl, namespace, generation)
+                    return value
+                finally:
+                    if self._inflight.get(key) is task:
+                        del self._inflight[key]
+            task = asyncio.create_task(run())
+            self._inflight[key] = task
+        return task
+
+    async def get_or_compute(
+        self,
+        namespace: str,
+        name: str,
+        compute: Callable[[], Awaitable[Any]],
+        params: dict[str, Hashable] | None = None,
+        ttl: float | None = None,
+        stale_ttl: float | None = None,
+    ) -> Any:
+        """读取缓存，未命中时计算；过期但仍在 stale 窗口内时返回旧值并后台刷新。"""
+        ttl = settings.RESPONSE_CACHE_TTL_SECONDS if ttl is None else ttl
+        stale_ttl = settings.RESPONSE_CACHE_STALE_SECONDS if stale_ttl is None else stale_ttl
+        key = self.make_key(namespace, name, params)
+        try:
+            cached = await self.backend.get(key)
+        except Exception as e:
+            print(f"读取响应缓存失败: {e}")
+            cached = None
+        if cached is not None:
+            value, fresh = cached
+            if fresh:
+                self.hits += 1
+            else:
+                self.stale_hits += 1
+                refresh = self._compute(namespace, key, compute, ttl, stale_ttl)
+                self._background.add(refresh)
+                refresh.add_done_callback(self._on_refresh_done)
+            return value
+        self.misses += 1
+        # shield：请求被取消时不打断其他等待者共享的计算
+        return await asyncio.shield(self._compute(namespace, key, compute, ttl, stale_ttl))
+
+    def _on_refresh_done(self, task: asyncio.Task) -> None:
+        self._background.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"后台刷新响应缓存失败: {task.exception()}")
+
+    async def invalidate(self, *namespaces: str) -> None:
+        for namespace in namespaces:
+            # 进行中的计算可能读到旧数据，后续请求重新计算
+            for key in [k for k in self._inflight if k.startswith(f"{namespace}:")]:
+                del self._inflight[key]
+            try:
+                await self.backend.invalidate(namespace)
+            except Exception as e:
+                print(f"清除响应缓存失败: {e}")
+
+    async def stats(self) -> dict:
+        total = self.hits + self.stale_hits + self.misses
+        try:
+            size = await self.backend.size()
+        except Exception as e:
+            print(f"读取响应缓存大小失败: {e}")
+            size = 0
+        return {
+            "backend": settings.RESPONSE_CACHE_BACKEND,
+            "size": size,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "hit_ratio": round((self.hits + self.stale_hits) / total, 4) if total else 0.0,
+        }
+
+
+response_cache = ResponseCache(create_backend())
+
+# 模型 -> 其变更需要失效的命名空间
+_invalidations: dict[type, set[str]] = {}
+
+# session.info 标记：本事务中需要失效的命名空间
+_PENDING_KEY = "response_cache_invalidate"
+
+
+def register_invalidation(model: type, *namespaces: str) -> None:
+    """注册：该模型的数据提交后清除这些命名空间下的缓存。"""
+    _invalidations.setdefault(model, set()).update(namespaces)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_invalidations(session: Session, flush_context) -> None:
+    if not _invalidations:
+        return
+    pending: set[str] = session.info.setdefault(_PENDING_KEY, set())
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        namespaces = _invalidations.get(type(obj))
+        if namespaces:
+            pending.update(namespaces)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session: Session) -> None:
+    namespaces = session.info.pop(_PENDING_KEY, None)
+    if namespaces:
+        task = asyncio.get_running_loop().create_task(response_cache.invalidate(*namespaces))
+        response_cache._background.add(task)
+        task.add_done_callback(response_cache._background.discard)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session: Session) -> None:
+    session.info.pop(_PENDING_KEY, None)
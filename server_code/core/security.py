@@ -2,19 +2,29 @@
 
 包含：
 - 密码哈希与校验（PBKDF2-SHA256，避免 bcrypt 在部分环境的兼容问题及 72 字节限制）
+- 异步版本的哈希与校验：在有界工作池中执行，避免阻塞事件循环
 - JWT 令牌的创建与解析
 """
 
+import asyncio
+import hashlib
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from typing import Optional
 
+from fastapi import HTTPException, status
 from jose import jwt, JWTError
 from passlib.context import CryptContext
 from core.config import settings
+from core.cache import TTLCache
 
 # 密码哈希上下文：使用 PBKDF2-SHA256 算法（纯 Python 实现，稳定可靠）
 pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
 
+# 已解析令牌缓存：键为令牌的 SHA-256，条目有效期截止到令牌 exp
+_token_cache = TTLCache(maxsize=settings.TOKEN_CACHE_MAX_ENTRIES, ttl=0)
+
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """校验明文密码与哈希是否匹配。"""
@@ -26,6 +36,54 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+# 密码哈希工作池（首次使用时创建）与当前占用数（执行中 + 排队中）
+_hash_executor: Executor | None = None
+_hash_inflight = 0
+
+
+def _get_hash_executor() -> Executor:
+    global _hash_executor
+    if _hash_executor is None:
+        if settings.PASSWORD_HASH_EXECUTOR == "process":
+            _hash_executor = ProcessPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS)
+        else:
+            _hash_executor = ThreadPoolExecutor(
+                max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash"
+            )
+    return _hash_executor
+
+
+async def _run_in_hash_pool(func, *args):
+    """在密码哈希工作池中执行；池满（含排队上限）时返回 503。"""
+    global _hash_inflight
+    if _hash_inflight >= settings.PASSWORD_HASH_WORKERS + settings.PASSWORD_HASH_QUEUE_LIMIT:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="服务繁忙，请稍后重试")
+    _hash_inflight += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_get_hash_executor(), func, *args)
+    finally:
+        _hash_inflight -= 1
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """异步校验密码（在工作池中执行）。"""
+    return await _run_in_hash_pool(verify_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    """异步生成密码哈希（在工作池中执行）。"""
+    return await _run_in_hash_pool(get_password_hash, password)
+
+
+def shutdown_password_hasher() -> None:
+    """关闭密码哈希工作池（应用退出时调用）。"""
+    global _hash_executor
+    if _hash_executor is not None:
+        _hash_executor.shutdown(wait=False, cancel_futures=True)
+        _hash_executor = None
+
+
 def create_access_token(subject: str, expires_minutes: Optional[int] = None) -> str:
     """创建访问令牌（JWT）。
 
@@ -42,9 +100,19 @@ def create_access_token(subject: str, expires_minutes: Optional[int] = None) ->
 
 
 def decode_token(token: str) -> Optional[dict]:
-    """解码并校验 JWT，返回 payload；失败则返回 None。"""
+    """解码并校验 JWT，返回 payload；失败则返回 None。
+
+    校验通过的令牌会缓存到过期时间为止，重复请求无需再次验签。
+    """
+    key = hashlib.sha256(token.encode()).digest()
+    payload = _token_cache.get(key)
+    if payload is not None:
+        return payload
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        return payload
     except JWTError:
         return None
+    exp = payload.get("exp")
+    if isinstance(exp, (int, float)):
+        _token_cache.set(key, payload, ttl=exp - time.time())
+    return payload
@@ -0,0 +1,249 @@
+"""附件缩略图（中文注释）。
+
+- 上传图片或 PDF 附件时随附件一起写入外发箱事件 attachment.thumbnail
+- 外发箱 worker 把生成工作交给进程池（Pillow 解码/缩放是 CPU 密集型，不占用事件循环）
+- 缩略图按内容摘要存放在内容存储中原文件旁边：<sha256>.thumb.<格式>，相同内容只生成一次；
+  文件名随内容变化，静态访问时按不可变资源长期缓存
+- 生成结果记录在 blobs.thumbnail（ready / unsupported），已生成的事件重复执行直接跳过；
+  写入先到临时文件再原子替换，重新生成不会暴露写了一半的文件；
+  损坏的图片或 PDF 同样记为 unsupported，不会让事件反复重试直至失败
+- PDF 首页预览需要 pypdfium2（requirements.txt）；未安装时不记录结果，安装后用 backfill 补生成
+
+补生成缺少缩略图的内容：python -m core.thumbnails backfill
+重新尝试此前记为不支持的内容：python -m core.thumbnails backfill --retry-unsupported
+测试进程池吞吐：python -m core.thumbnails bench [图片数量]
+"""
+
+import asyncio
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core import outbox
+from core.blobs import blob_path
+from core.config import settings, UPLOAD_DIR
+from db.session import AsyncSessionLocal
+from db.models.blob import Blob
+
+READY = "ready"
+UNSUPPORTED = "unsupported"
+MISSING_DEPENDENCY = "missing_dependency"  # 仅作为生成结果，不写入数据库
+
+# 上传时按扩展名判断是否需要生成（其余类型不入队）
+PREVIEW_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".webp", ".bmp", ".tif", ".tiff", ".pdf"}
+
+_executor: ProcessPoolExecutor | None = None
+
+
+def thumbnail_path(sha256: str) -> str:
+    return f"{blob_path(sha256)}.thumb.{settings.THUMBNAIL_FORMAT}"
+
+
+def thumbnail_url(sha256: str) -> str | None:
+    """缩略图的 /uploads 静态地址；BLOB_DIR 不在上传目录下时无法对外提供，返回 None。"""
+    relative = os.path.relpath(os.path.abspath(thumbnail_path(sha256)), UPLOAD_DIR)
+    if relative.startswith(os.pardir):
+        return None
+    return "/uploads/" + relative.replace(os.sep, "/")
+
+
+class _MissingDependency(Exception):
+    pass
+
+
+def _open_preview(source: str, max_size: int):
+    """打开图片或 PDF 首页，返回 PIL 图像。
+
+    不支持或已损坏的内容（截断的图片、无法解析或没有页面的 PDF）返回 None，
+    缺少 pypdfium2 时抛出 _MissingDependency。
+    """
+    from PIL import Image, ImageOps, UnidentifiedImageError
+
+    with open(source, "rb") as f:
+        is_pdf = f.read(5) == b"%PDF-"
+    if is_pdf:
+        try:
+            import pypdfium2 as pdfium
+        except ImportError:
+            raise _MissingDependency()
+        try:
+            pdf = pdfium.PdfDocument(source)
+        except pdfium.PdfiumError:
+            return None
+        try:
+            if len(pdf) == 0:
+                return None
+            page = pdf[0]
+            width, height = page.get_size()
+            if width <= 0 or height <= 0:
+                return None
+            scale = max_size / max(width, height)
+            return page.render(scale=min(scale, 2.0)).to_pil()
+        except pdfium.PdfiumError:
+            return None
+        finally:
+            pdf.close()
+    try:
+        image = Image.open(source)
+        # JPEG 可以直接按目标尺寸降采样解码，减少内存与耗时
+        image.draft("RGB", (max_size, max_size))
+        image.load()
+        return ImageOps.exif_transpose(image)
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError):
+        # OSError：截断或损坏的图片在解码时才报错
+        return None
+
+
+def render_thumbnail(source: str, destination: str, max_size: int, fmt: str, quality: int) -> str:
+    """在工作进程中执行：生成缩略图，返回 ready、unsupported 或 missing_dependency。"""
+    try:
+        image = _open_preview(source, max_size)
+    except _MissingDependency:
+        return MISSING_DEPENDENCY
+    if image is None:
+        return UNSUPPORTED
+    image.thumbnail((max_size, max_size))
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "transparency" in image.info or image.mode in ("LA", "P") else "RGB")
+    if fmt in ("jpeg", "jpg") and image.mode == "RGBA":
+        image = image.convert("RGB")
+    temp = f"{destination}.{os.getpid()}.tmp"
+    try:
+        image.save(temp, format=fmt.upper(), quality=quality)
+        os.replace(temp, destination)
+    finally:
+        if os.path.exists(temp):
+            os.remove(temp)
+    return READY
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=settings.THUMBNAIL_WORKERS)
+    return _executor
+
+
+def shutdown_thumbnail_pool() -> None:
+    """关闭缩略图进程池（应用退出时调用）。"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+async def _render(sha256: str) -> str:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _get_executor(),
+        render_thumbnail,
+        blob_path(sha256),
+        thumbnail_path(sha256),
+        settings.THUMBNAIL_MAX_SIZE,
+        settings.THUMBNAIL_FORMAT,
+        settings.THUMBNAIL_QUALITY,
+    )
+
+
+def schedule(session: AsyncSession, sha256: str, filename: str) -> None:
+    """附件为图片或 PDF 时，在当前事务中登记缩略图生成事件。"""
+    if settings.THUMBNAIL_ENABLED and os.path.splitext(filename)[1].lower() in PREVIEW_EXTENSIONS:
+        outbox.enqueue(session, "attachment.thumbnail", {"sha256": sha256})
+
+
+@outbox.handler("attachment.thumbnail")
+async def _generate(session: AsyncSession, payload: dict) -> None:
+    """生成缩略图（payload: sha256，force 为真时重新生成）。"""
+    sha256 = payload["sha256"]
+    blob = await session.get(Blob, sha256)
+    if blob is None:
+        return  # 内容已被清理
+    if blob.thumbnail and not payload.get("force"):
+        if blob.thumbnail != READY or await asyncio.to_thread(os.path.exists, thumbnail_path(sha256)):
+            return
+    if blob.size > settings.THUMBNAIL_MAX_SOURCE_BYTES:
+        result = UNSUPPORTED
+    else:
+        result = await _render(sha256)
+    if result == MISSING_DEPENDENCY:
+        # 不记录结果：安装 pypdfium2 后 backfill 会重新登记
+        print(f"未安装 pypdfium2，跳过 PDF 缩略图: {sha256}")
+        return
+    await session.execute(
+        update(Blob).where(Blob.sha256 == sha256).values(thumbnail=result)
+        .execution_options(synchronize_session=False)
+    )
+    await session.commit()
+
+
+async def thumbnail_urls(session: AsyncSession, sha256s) -> dict[str, str]:
+    """批量查询已生成的缩略图地址：{sha256: url}。"""
+    sha256s = {s for s in sha256s if s}
+    if not sha256s:
+        return {}
+    ready = (await session.execute(
+        select(Blob.sha256).where(Blob.sha256.in_(sha256s), Blob.thumbnail == READY)
+    )).scalars().all()
+    urls = {s: thumbnail_url(s) for s in ready}
+    return {s: url for s, url in urls.items() if url}
+
+
+async def backfill(retry_unsupported: bool = False) -> int:
+    """为尚未处理的内容登记生成事件（可选包括此前记为不支持的内容），返回登记数量。"""
+    condition = Blob.thumbnail.is_(None)
+    if retry_unsupported:
+        condition = condition | (Blob.thumbnail == UNSUPPORTED)
+    async with AsyncSessionLocal() as session:
+        pending = (await session.execute(select(Blob.sha256).where(condition))).scalars().all()
+        for sha256 in pending:
+            outbox.enqueue(session, "attachment.thumbnail", {"sha256": sha256, "force": retry_unsupported})
+        await session.commit()
+    return len(pending)
+
+
+def _bench(count: int) -> None:
+    """用随机图片测量进程池吞吐（不访问数据库）。"""
+    import tempfile
+    from PIL import Image
+
+    with tempfile.TemporaryDirectory() as directory:
+        sources = []
+        for i in range(count):
+            path = os.path.join(directory, f"{i}.jpg")
+            Image.effect_noise((3000, 2000), 64).convert("RGB").save(path, quality=90)
+            sources.append(path)
+        with ProcessPoolExecutor(max_workers=settings.THUMBNAIL_WORKERS) as pool:
+            start = time.perf_counter()
+            list(pool.map(
+                render_thumbnail,
+                sources,
+                [f"{p}.thumb" for p in sources],
+                [settings.THUMBNAIL_MAX_SIZE] * count,
+                [settings.THUMBNAIL_FORMAT] * count,
+                [settings.THUMBNAIL_QUALITY] * count,
+            ))
+            elapsed = time.perf_counter() - start
+    print(f"workers: {settings.THUMBNAIL_WORKERS}")
+    print(f"images: {count} (3000x2000 JPEG)")
+    print(f"seconds: {elapsed:.2f}")
+    print(f"images_per_second: {count / elapsed:.1f}")
+
+
+async def _run_backfill(retry_unsupported: bool) -> None:
+    from db.session import engine
+
+    count = await backfill(retry_unsupported)
+    await engine.dispose()
+    print(f"已登记 {count} 个缩略图生成事件")
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "backfill"
+    if command == "bench":
+        _bench(int(sys.argv[2]) if len(sys.argv) > 2 else 40)
+    else:
+        asyncio.run(_run_backfill("--retry-unsupported" in sys.argv))
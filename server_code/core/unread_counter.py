@@ -0,0 +1,86 @@
+"""通知未读数计数器（中文注释）。
+
+每个用户的未读数缓存在进程内，按增量维护：
+- 创建通知时增加；标记已读、全部已读、删除未读通知时减少
+- 未命中缓存时回退到数据库 COUNT（走 (user_id, is_read, created_at) 复合索引）
+- 已读/删除等变化通过 WebSocket 推送 {"type": "unread_count", "delta", "unread_count"}；
+  新通知本身的推送已让前端加一，不再额外推送
+
+多 worker 部署时各进程缓存独立：未读数变化后经消息总线通知所有 worker 丢弃该用户的缓存，
+下次读取时重新计数（外发箱事件在哪个 worker 执行都不影响其他 worker 的读取接口）；
+TTL 只兜底总线断开期间丢失的失效消息。推送的 unread_count 会覆盖前端角标，
+因此推送前总是从数据库重新计数，不使用可能过期的本进程缓存。
+"""
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.cache import TTLCache
+from core.config import settings
+from db.models.notification import Notification
+from api.routes.ws import manager
+
+
+class UnreadCounter:
+    """按用户缓存的未读通知数。"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        manager.on_invalidate("unread_count", self._drop)
+
+    def _drop(self, user_ids: list) -> None:
+        for user_id in user_ids:
+            self._cache.pop(user_id)
+
+    async def get(self, session: AsyncSession, user_id: int) -> int:
+        """读取未读数，未命中时查询数据库并缓存。"""
+        value = self._cache.get(user_id)
+        if value is None:
+            value = await self.refresh(session, user_id)
+        return value
+
+    async def refresh(self, session: AsyncSession, user_id: int) -> int:
+        """从数据库重新计数并写入缓存。"""
+        value = (await session.execute(
+            select(func.count()).where(
+                Notification.user_id == user_id,
+                Notification.is_read == False
+            )
+        )).scalar_one()
+        self._cache.set(user_id, value)
+        return value
+
+    async def invalidate(self, user_ids) -> None:
+        """提交后调用：让所有 worker 丢弃这些用户的缓存（下次读取时从数据库加载）。"""
+        user_ids = list(user_ids)
+        if not user_ids:
+            return
+        try:
+            await manager.invalidate("unread_count", user_ids)
+        except Exception as e:
+            # 总线不可用时至少保证本进程读取到新值，其他 worker 依靠 TTL 收敛
+            self._drop(user_ids)
+            print(f"发布未读数失效失败: {e}")
+
+    async def push(self, user_id: int, delta: int, value: int) -> None:
+        """向用户的所有连接推送未读数变化。"""
+        try:
+            await manager.send_to_user(user_id, {"type": "unread_count", "delta": delta, "unread_count": value})
+        except Exception as e:
+            print(f"推送未读数失败: {e}")
+
+    async def apply(self, session: AsyncSession, user_id: int, delta: int) -> int:
+        """提交后调用：失效所有 worker 的缓存，从数据库重新计数（其他 worker 可能已改变未读数），更新缓存并推送。"""
+        await self.invalidate([user_id])
+        value = await self.refresh(session, user_id)
+        await self.push(user_id, delta, value)
+        return value
+
+    def stats(self) -> dict:
+        return self._cache.stats()
+
+
+unread_counter = UnreadCounter(
+    maxsize=settings.UNREAD_COUNT_CACHE_MAX_ENTRIES,
+    ttl=settings.UNREAD_COUNT_CACHE_TTL_SECONDS,
+)
@@ -0,0 +1,128 @@
+"""断点续传上传（中文注释）。
+
+- 创建会话时在 UPLOAD_SESSION_DIR 下预分配一个与文件等长的临时文件
+- 每个分块按 序号 × 分块大小 的偏移用 os.pwrite 写入，分块之间互不影响，可并发上传；
+  同一分块重复上传只会覆盖同一段数据，因此重试是幂等的
+- 全部分块收到后计算整体 SHA-256，存入内容存储（core.blobs）并在附件目录生成文件
+- 后台任务定期清理过期未完成的会话及其临时文件
+"""
+
+import asyncio
+import hashlib
+import os
+from datetime import datetime
+
+from sqlalchemy import delete, select
+
+from core.config import settings
+from db.session import AsyncSessionLocal
+from db.models.upload import UploadChunk, UploadReservation, UploadSession
+
+
+def chunk_count(total_size: int, chunk_size: int) -> int:
+    return (total_size + chunk_size - 1) // chunk_size
+
+
+def chunk_length(upload: UploadSession, index: int) -> int:
+    """分块应有的字节数（最后一块可能较短）。"""
+    return min(upload.chunk_size, upload.total_size - index * upload.chunk_size)
+
+
+def temp_path(session_id: str) -> str:
+    return os.path.join(settings.UPLOAD_SESSION_DIR, f"{session_id}.part")
+
+
+def allocate(path: str, size: int) -> None:
+    """创建临时文件并扩展到目标大小（稀疏文件，不实际占满磁盘）。"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "wb") as f:
+        f.truncate(size)
+
+
+def open_for_write(path: str) -> int:
+    return os.open(path, os.O_WRONLY)
+
+
+def write_at(fd: int, data: bytes, offset: int) -> None:
+    """在指定偏移写入全部数据。"""
+    view = memoryview(data)
+    while view:
+        written = os.pwrite(fd, view, offset)
+        view = view[written:]
+        offset += written
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(settings.UPLOAD_CHUNK_SIZE)
+            if not block:
+                break
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def remove_file(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+async def collect_expired() -> int:
+    """删除过期会话及其临时文件（已完成的会话临时文件通常已删除）与过期的配额预留，返回删除的会话数。"""
+    now = datetime.utcnow()
+    async with AsyncSessionLocal() as session:
+        await session.execute(
+            delete(UploadReservation).where(UploadReservation.expires_at < now)
+            .execution_options(synchronize_session=False)
+        )
+        await session.commit()
+        expired = (await session.execute(
+            select(UploadSession.id, UploadSession.temp_path)
+            .where(UploadSession.expires_at < now)
+            .limit(settings.UPLOAD_SESSION_GC_BATCH_SIZE)
+        )).all()
+        if not expired:
+            return 0
+        for _, path in expired:
+            await asyncio.to_thread(remove_file, path)
+        ids = [row[0] for row in expired]
+        await session.execute(delete(UploadChunk).where(UploadChunk.session_id.in_(ids)))
+        await session.execute(
+            delete(UploadSession).where(UploadSession.id.in_(ids)).execution_options(synchronize_session=False)
+        )
+        await session.commit()
+        return len(ids)
+
+
+class UploadSessionCollector:
+    """定时清理过期的上传会话。"""
+
+    def __init__(self):
+        self._task: asyncio.Task | None = None
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                while await collect_expired() >= settings.UPLOAD_SESSION_GC_BATCH_SIZE:
+                    await asyncio.sleep(0)
+            except Exception as e:
+                print(f"清理上传会话失败: {e}")
+            await asyncio.sleep(settings.UPLOAD_SESSION_GC_INTERVAL_SECONDS)
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+upload_session_collector = UploadSessionCollector()
@@ -0,0 +1,241 @@
+"""附件上传保存（中文注释）。
+
+项目附件与任务附件共用的保存流程：
+- Starlette 在进入路由之前就会把 multipart 请求体完整写入临时文件，因此由 UploadSizeLimitMiddleware
+  在解析之前按 Content-Length 拒绝超过单文件上限的请求，没有 Content-Length 时边接收边计数，超限立即中止（413）
+- 上传内容按块从 UploadFile 读出，写入内容存储的临时目录，整个复制过程在线程池中执行，不阻塞事件循环
+- 边写边计算大小和 SHA-256；超过单文件上限或项目配额时立即停止并删除临时文件（413）
+- 项目配额先预留再检查（预留与进行中的上传会话都计入已用空间），并发上传合计不会超过配额；
+  预留随附件记录一起提交删除
+- 写完后交给内容存储（core.blobs）：相同内容只存一份，附件目录下的文件是指向它的链接，
+  其他请求不会看到写了一半的文件
+"""
+
+import asyncio
+import hashlib
+import os
+import uuid
+from datetime import datetime, timedelta
+
+from fastapi import HTTPException, UploadFile, status
+from fastapi.responses import JSONResponse
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core import blobs
+from core.config import settings
+from db.session import AsyncSessionLocal
+from db.models.project import ProjectAttachment
+from db.models.task import Task, TaskAttachment
+from db.models.upload import UploadReservation, UploadSession, UploadSessionStatus
+
+
+class StoredFile:
+    """保存结果。"""
+
+    __slots__ = ("path", "filename", "size", "sha256")
+
+    def __init__(self, path: str, filename: str, size: int, sha256: str):
+        self.path = path  # 完整路径
+        self.filename = filename  # 目录下的唯一文件名
+        self.size = size
+        self.sha256 = sha256
+
+
+class _TooLarge(Exception):
+    pass
+
+
+def too_large(limit: int, quota_limited: bool) -> HTTPException:
+    """超出大小上限或项目配额时返回的 413 错误。"""
+    if quota_limited:
+        detail = f"超出项目附件空间配额（剩余 {max(limit, 0) // (1024 * 1024)} MB）"
+    else:
+        detail = f"文件过大，单个文件不能超过 {settings.UPLOAD_MAX_FILE_BYTES // (1024 * 1024)} MB"
+    return HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=detail)
+
+
+def _copy(source, temp_path: str, limit: int) -> tuple[int, str]:
+    """在线程中执行：分块复制到临时文件，返回 (大小, sha256)。"""
+    os.makedirs(os.path.dirname(temp_path), exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(temp_path, "wb") as out:
+            while True:
+                chunk = source.read(settings.UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > limit:
+                    raise _TooLarge()
+                digest.update(chunk)
+                out.write(chunk)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+    return size, digest.hexdigest()
+
+
+async def project_usage(session: AsyncSession, project_id: int) -> int:
+    """项目已用附件空间（项目附件 + 该项目下任务的附件，字节）。"""
+    project_bytes = (await session.execute(
+        select(func.coalesce(func.sum(ProjectAttachment.file_size), 0))
+        .where(ProjectAttachment.project_id == project_id)
+    )).scalar_one()
+    task_bytes = (await session.execute(
+        select(func.coalesce(func.sum(TaskAttachment.file_size), 0))
+        .join(Task, Task.id == TaskAttachment.task_id)
+        .where(Task.project_id == project_id)
+    )).scalar_one()
+    return int(project_bytes) + int(task_bytes)
+
+
+async def pending_usage(
+    session: AsyncSession,
+    project_id: int,
+    exclude_reservation: int | None = None,
+    exclude_session: str | None = None,
+) -> int:
+    """进行中的上传占用的配额：未过期的预留 + 未完成的上传会话（字节）。"""
+    now = datetime.utcnow()
+    reserved = select(func.coalesce(func.sum(UploadReservation.size), 0)).where(
+        UploadReservation.project_id == project_id, UploadReservation.expires_at > now
+    )
+    if exclude_reservation is not None:
+        reserved = reserved.where(UploadReservation.id != exclude_reservation)
+    sessions = select(func.coalesce(func.sum(UploadSession.total_size), 0)).where(
+        UploadSession.project_id == project_id,
+        UploadSession.status.in_([UploadSessionStatus.UPLOADING, UploadSessionStatus.FINALIZING]),
+        UploadSession.expires_at > now,
+    )
+    if exclude_session is not None:
+        sessions = sessions.where(UploadSession.id != exclude_session)
+    return int((await session.execute(reserved)).scalar_one()) + int((await session.execute(sessions)).scalar_one())
+
+
+async def upload_limit(
+    session: AsyncSession,
+    project_id: int | None,
+    exclude_reservation: int | None = None,
+    exclude_session: str | None = None,
+) -> tuple[int, bool]:
+    """本次上传允许的最大字节数，以及该上限是否来自项目配额。
+
+    exclude_* 为本次上传自己的预留或会话，不计入已用空间。
+    """
+    limit = settings.UPLOAD_MAX_FILE_BYTES
+    if project_id is not None and settings.UPLOAD_PROJECT_QUOTA_BYTES > 0:
+        used = await project_usage(session, project_id)
+        used += await pending_usage(session, project_id, exclude_reservation, exclude_session)
+        remaining = settings.UPLOAD_PROJECT_QUOTA_BYTES - used
+        if remaining < limit:
+            return remaining, True
+    return limit, False
+
+
+async def reserve_quota(project_id: int, size: int) -> int:
+    """预留项目配额，返回预留 ID；超出配额时 413。
+
+    先提交预留再检查：并发的两个上传至少有一个能看到对方的预留，合计不会超过配额。
+    """
+    async with AsyncSessionLocal() as session:
+        reservation = UploadReservation(
+            project_id=project_id,
+            size=size,
+            expires_at=datetime.utcnow() + timedelta(seconds=settings.UPLOAD_RESERVATION_TTL_SECONDS),
+        )
+        session.add(reservation)
+        await session.commit()
+        limit, quota_limited = await upload_limit(session, project_id, exclude_reservation=reservation.id)
+        if size > limit:
+            await session.execute(delete(UploadReservation).where(UploadReservation.id == reservation.id))
+            await session.commit()
+            raise too_large(limit, quota_limited)
+        return reservation.id
+
+
+async def release_quota(reservation_id: int) -> None:
+    async with AsyncSessionLocal() as session:
+        await session.execute(delete(UploadReservation).where(UploadReservation.id == reservation_id))
+        await session.commit()
+
+
+async def save_upload(
+    session: AsyncSession,
+    file: UploadFile,
+    directory: str,
+    project_id: int | None = None,
+) -> StoredFile:
+    """保存上传文件到 directory；传入 project_id 时同时预留并检查项目配额。
+
+    预留的释放加入 session 的当前事务，调用方提交附件记录时一并生效。
+    """
+    limit, quota_limited = await upload_limit(session, project_id)
+
+    # 已知大小时提前拒绝，不必先写盘
+    if file.size is not None and file.size > limit:
+        raise too_large(limit, quota_limited)
+
+    reservation_id = None
+    if project_id is not None and settings.UPLOAD_PROJECT_QUOTA_BYTES > 0:
+        reservation_id = await reserve_quota(project_id, file.size if file.size is not None else limit)
+
+    filename = f"{uuid.uuid4()}{os.path.splitext(file.filename or '')[1]}"
+    temp_path = os.path.join(blobs.temp_dir(), f"{uuid.uuid4().hex}.part")
+    try:
+        try:
+            size, sha256 = await asyncio.to_thread(_copy, file.file, temp_path, limit)
+            path = await blobs.store(temp_path, sha256, size, directory, filename)
+        except _TooLarge:
+            raise too_large(limit, quota_limited)
+        except OSError as e:
+            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"文件保存失败: {str(e)}")
+    except Exception:
+        if reservation_id is not None:
+            await release_quota(reservation_id)
+        raise
+    if reservation_id is not None:
+        await session.execute(delete(UploadReservation).where(UploadReservation.id == reservation_id))
+    return StoredFile(path, filename, size, sha256)
+
+
+class UploadSizeLimitMiddleware:
+    """ASGI 中间件：multipart 请求体超过单文件上限时在解析之前拒绝（413）。"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope["headers"])
+        if not headers.get(b"content-type", b"").startswith(b"multipart/form-data"):
+            await self.app(scope, receive, send)
+            return
+
+        limit = settings.UPLOAD_MAX_FILE_BYTES + settings.UPLOAD_MULTIPART_OVERHEAD_BYTES
+        content_length = headers.get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > limit:
+            error = too_large(settings.UPLOAD_MAX_FILE_BYTES, False)
+            response = JSONResponse({"detail": error.detail}, status_code=error.status_code)
+            await response(scope, receive, send)
+            return
+
+        # 没有 Content-Length（分块传输）时边接收边计数
+        received = 0
+
+        async def receive_limited():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    raise too_large(settings.UPLOAD_MAX_FILE_BYTES, False)
+            return message
+
+        await self.app(scope, receive_limited, send)
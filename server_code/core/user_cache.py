@@ -0,0 +1,50 @@
+"""已认证用户快照缓存（中文注释）。
+
+get_current_user 每个请求都会按 ID 查询 users 表，这是系统中最频繁的查询。
+这里缓存用户的列快照（不含密码哈希），命中时在当前会话中重建一个
+“已持久化”的 User 实例（不发 SQL），路由对它的修改照常以 UPDATE 提交。
+
+用户被禁用、重置密码或修改资料时必须调用 evict() 立即失效。
+"""
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
+
+from core.cache import TTLCache
+from core.config import settings
+from db.models.user import User
+
+# 不进入缓存的敏感列
+_EXCLUDED_COLUMNS = {"password_hash"}
+
+_cache = TTLCache(maxsize=settings.USER_CACHE_MAX_ENTRIES, ttl=settings.USER_CACHE_TTL_SECONDS)
+
+
+def remember(user: User) -> None:
+    """缓存用户快照。"""
+    snapshot = {
+        attr.key: getattr(user, attr.key)
+        for attr in User.__mapper__.column_attrs
+        if attr.key not in _EXCLUDED_COLUMNS
+    }
+    _cache.set(user.id, snapshot)
+
+
+async def restore(session: AsyncSession, user_id: int) -> User | None:
+    """从快照重建用户对象并挂到当前会话；未命中返回 None。"""
+    snapshot = _cache.get(user_id)
+    if snapshot is None:
+        return None
+    user = User(**snapshot)
+    # 标记为已持久化对象，后续修改会生成 UPDATE 而不是 INSERT
+    make_transient_to_detached(user)
+    return await session.merge(user, load=False)
+
+
+def evict(user_id: int) -> None:
+    """立即移除用户快照。"""
+    _cache.pop(user_id)
+
+
+def stats() -> dict:
+    return _cache.stats()
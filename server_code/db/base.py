@@ -21,3 +21,11 @@ from db.models import project  # noqa: F401
 from db.models import team  # noqa: F401
 from db.models import user_role  # noqa: F401
 from db.models import notification  # noqa: F401
+from db.models import outbox  # noqa: F401
+from db.models import analytics  # noqa: F401
+from db.models import activity  # noqa: F401
+from db.models import upload  # noqa: F401
+from db.models import blob  # noqa: F401
+from db.models import presence  # noqa: F401
+from db.models import export  # noqa: F401
+from db.models import lease  # noqa: F401
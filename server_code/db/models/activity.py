@@ -0,0 +1,37 @@
+"""活动记录模型（中文注释）。
+
+项目、任务、评论、附件的变更以追加方式写入 activity_events，
+仪表盘“最近活动”直接按索引范围扫描读取。
+"""
+
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index
+from sqlalchemy.orm import relationship
+
+from db.base import Base
+
+
+class ActivityEvent(Base):
+    """活动记录（只追加）"""
+    __tablename__ = "activity_events"
+    __table_args__ = (
+        Index("ix_activity_events_created", "created_at", "id"),
+        Index("ix_activity_events_project_created", "project_id", "created_at", "id"),
+        Index("ix_activity_events_actor_created", "actor_id", "created_at", "id"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    type = Column(String(50), nullable=False)  # 如 project_created、task_updated、comment_created
+    title = Column(String(500), nullable=False)  # 展示文本，如“创建了任务 'xxx'”
+    actor_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
+    # 不设外键：项目、任务删除后活动记录仍保留
+    project_id = Column(Integer, nullable=True)
+    project_name = Column(String(200), nullable=True)  # 记录时的项目名称快照
+    task_id = Column(Integer, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    # 关联
+    actor = relationship("User")
+
+    def __repr__(self):
+        return f"<ActivityEvent(id={self.id}, type={self.type}, actor_id={self.actor_id})>"
@@ -0,0 +1,25 @@
+"""统计汇总模型（中文注释）。
+
+图表分析使用的预聚合计数，由 core.analytics_rollup 增量维护并定期校准。
+"""
+
+from sqlalchemy import Column, Integer, String, UniqueConstraint
+
+from db.base import Base
+
+
+class AnalyticsRollup(Base):
+    """统计汇总：按 (指标, 时间桶, 维度) 计数"""
+    __tablename__ = "analytics_rollups"
+    __table_args__ = (
+        UniqueConstraint("metric", "bucket", "dim", name="uq_analytics_rollups_key"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    metric = Column(String(50), nullable=False)  # 如 task.status、project.created_month
+    bucket = Column(String(20), nullable=False, default="")  # 时间桶：空串（全量）、YYYY-MM、YYYY-MM-DD
+    dim = Column(String(100), nullable=False, default="")  # 维度值：状态、优先级、负责人ID、团队ID
+    value = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<AnalyticsRollup(metric={self.metric}, bucket={self.bucket}, dim={self.dim}, value={self.value})>"
@@ -0,0 +1,28 @@
+"""附件内容存储模型（中文注释）。
+
+附件内容按 SHA-256 只存一份（uploads/blobs/ab/cd/<sha256>），
+项目附件、任务附件通过 sha256 列引用；ref_count 为引用计数。
+"""
+
+from datetime import datetime
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, Index
+
+from db.base import Base
+
+
+class Blob(Base):
+    """按内容寻址的文件"""
+    __tablename__ = "blobs"
+    __table_args__ = (
+        Index("ix_blobs_ref_count_last_used", "ref_count", "last_used_at"),
+    )
+
+    sha256 = Column(String(64), primary_key=True)
+    size = Column(BigInteger, nullable=False)
+    ref_count = Column(Integer, nullable=False, default=0)  # 引用该内容的附件数
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    last_used_at = Column(DateTime, nullable=False, default=datetime.utcnow)  # 最近一次被上传引用的时间
+    thumbnail = Column(String(20), nullable=True)  # 缩略图：ready 已生成，unsupported 不支持，空为未处理
+
+    def __repr__(self):
+        return f"<Blob(sha256={self.sha256}, size={self.size}, ref_count={self.ref_count})>"
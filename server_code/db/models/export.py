@@ -0,0 +1,30 @@
+"""后台导出文件模型（中文注释）。
+
+后台导出写入 EXPORT_DIR（不在 /uploads 静态目录下），只能通过鉴权接口由发起人下载，
+过期后由清理任务删除文件与记录。
+"""
+
+from datetime import datetime
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, ForeignKey, Index
+
+from db.base import Base
+
+
+class ExportFile(Base):
+    """后台导出生成的文件"""
+    __tablename__ = "export_files"
+    __table_args__ = (
+        Index("ix_export_files_expires", "expires_at"),
+    )
+
+    id = Column(String(32), primary_key=True)  # uuid4 hex，下载地址中使用
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)  # 发起人
+    dataset = Column(String(50), nullable=False)
+    filename = Column(String(255), nullable=False)  # 下载时的文件名
+    path = Column(String(500), nullable=False)  # 磁盘路径
+    size = Column(BigInteger, nullable=False, default=0)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False)
+
+    def __repr__(self):
+        return f"<ExportFile(id={self.id}, user_id={self.user_id}, dataset={self.dataset})>"
@@ -0,0 +1,21 @@
+"""后台任务租约模型（中文注释）。
+
+多 worker 部署时，只需一个进程执行的后台任务（如统计汇总校准）先获取租约，
+租约过期前其他 worker 跳过本轮。
+"""
+
+from sqlalchemy import Column, String, DateTime
+
+from db.base import Base
+
+
+class BackgroundLease(Base):
+    """后台任务租约"""
+    __tablename__ = "background_leases"
+
+    name = Column(String(50), primary_key=True)  # 任务名
+    holder = Column(String(32), nullable=False)  # 持有者（进程内随机 ID）
+    expires_at = Column(DateTime, nullable=False)
+
+    def __repr__(self):
+        return f"<BackgroundLease(name={self.name}, holder={self.holder}, expires_at={self.expires_at})>"
@@ -4,7 +4,7 @@
 """
 
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Enum
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Enum, Index
 from sqlalchemy.orm import relationship
 import enum
 
@@ -19,11 +19,18 @@ class NotificationType(str, enum.Enum):
     PROJECT_UPDATE = "project_update"  # 项目更新
     TEAM_INVITE = "team_invite"  # 团队邀请
     PROJECT_ASSIGNED = "project_assigned"  # 项目分配
+    EXPORT_READY = "export_ready"  # 后台导出完成
 
 
 class Notification(Base):
     """通知模型"""
     __tablename__ = "notifications"
+    __table_args__ = (
+        # 未读数统计与列表排序（未读在前、时间倒序、id 倒序）
+        Index("ix_notifications_user_read_created", "user_id", "is_read", "created_at", "id"),
+        # 归档任务按类型扫描早于截止时间的已读通知
+        Index("ix_notifications_type_read_created", "type", "is_read", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
@@ -39,4 +46,26 @@ class Notification(Base):
     user = relationship("User", back_populates="notifications")
 
     def __repr__(self):
-        return f"<Notification(id={self.id}, user_id={self.user_id}, type={self.type}, is_read={self.is_read})>"
\ No newline at end of file
+        return f"<Notification(id={self.id}, user_id={self.user_id}, type={self.type}, is_read={self.is_read})>"
+
+
+class NotificationArchive(Base):
+    """归档通知：保留期已过的已读通知移到这里，主表只保留近期数据"""
+    __tablename__ = "notifications_archive"
+    __table_args__ = (
+        Index("ix_notifications_archive_user_created", "user_id", "created_at", "id"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=False)  # 沿用原通知 ID
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)  # 删除用户时由数据库级联删除
+    type = Column(Enum(NotificationType), nullable=False)
+    title = Column(String(200), nullable=False)
+    content = Column(Text, nullable=False)
+    related_id = Column(Integer, nullable=True)
+    related_type = Column(String(50), nullable=True)
+    is_read = Column(Boolean, default=True)
+    created_at = Column(DateTime, nullable=False)
+    archived_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f"<NotificationArchive(id={self.id}, user_id={self.user_id}, type={self.type})>"
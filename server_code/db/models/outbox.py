@@ -0,0 +1,42 @@
+"""事务外发箱模型（中文注释）。
+
+业务数据与待执行的副作用（通知、目录创建等）在同一事务中写入，
+由后台 worker 认领执行，保证至少执行一次。
+"""
+
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, Text, DateTime, Index
+
+from db.base import Base
+
+
+class OutboxStatus:
+    """事件状态"""
+    PENDING = "pending"  # 等待执行（含退避中的重试）
+    PROCESSING = "processing"  # 已被 worker 认领
+    DONE = "done"  # 执行成功
+    FAILED = "failed"  # 超过最大重试次数
+
+
+class OutboxEvent(Base):
+    """外发箱事件"""
+    __tablename__ = "outbox_events"
+    __table_args__ = (
+        Index("ix_outbox_events_status_available", "status", "available_at"),
+        Index("ix_outbox_events_status_processed", "status", "processed_at"),  # 清理已完成事件
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    topic = Column(String(100), nullable=False)
+    payload = Column(Text, nullable=False)  # JSON
+    status = Column(String(20), nullable=False, default=OutboxStatus.PENDING)
+    attempts = Column(Integer, nullable=False, default=0)
+    available_at = Column(DateTime, nullable=False, default=datetime.utcnow)  # 可被认领的时间
+    locked_by = Column(String(64), nullable=True)  # 认领令牌
+    locked_at = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    processed_at = Column(DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<OutboxEvent(id={self.id}, topic={self.topic}, status={self.status}, attempts={self.attempts})>"
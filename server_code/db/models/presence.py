@@ -0,0 +1,29 @@
+"""在线状态模型（中文注释）。
+
+每个 worker 进程启动时生成一个 ID，定期刷新心跳，并登记自己持有连接的用户；
+users.online 由“心跳未过期的 worker 上是否还有该用户的连接”推导，
+心跳过期的 worker 及其登记由其他 worker 清理。
+"""
+
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+
+from db.base import Base
+
+
+class PresenceWorker(Base):
+    """持有 WebSocket 连接的 worker 进程"""
+    __tablename__ = "presence_workers"
+
+    id = Column(String(32), primary_key=True)  # uuid4 hex，进程启动时生成
+    heartbeat_at = Column(DateTime, nullable=False, default=datetime.utcnow, index=True)
+    started_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+
+class PresenceConnection(Base):
+    """worker 上至少有一个连接的用户"""
+    __tablename__ = "presence_connections"
+
+    worker_id = Column(String(32), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True, index=True)
+    connected_at = Column(DateTime, nullable=False, default=datetime.utcnow)
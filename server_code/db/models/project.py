@@ -40,7 +40,7 @@ class Project(Base):
     team_id: Mapped[int | None] = mapped_column(ForeignKey("teams.id"), default=None)  # 所属团队
     development_days: Mapped[int | None] = mapped_column(Integer, default=None)  # 开发周期（天数）
     start_date: Mapped[date | None] = mapped_column(Date, default=None)
-    end_date: Mapped[date | None] = mapped_column(Date, default=None)
+    end_date: Mapped[date | None] = mapped_column(Date, default=None, index=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     updated_at: Mapped[datetime] = mapped_column(
         DateTime, default=datetime.utcnow, onupdate=datetime.utcnow
@@ -85,6 +85,7 @@ class ProjectAttachment(Base):
     filename: Mapped[str] = mapped_column(String(255))
     url: Mapped[str] = mapped_column(String(500))
     file_size: Mapped[int | None] = mapped_column(Integer, default=None)  # 文件大小（字节）
+    sha256: Mapped[str | None] = mapped_column(String(64), default=None, index=True)  # 文件内容摘要
     uploaded_by: Mapped[int | None] = mapped_column(ForeignKey("users.id"), default=None)
     uploaded_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
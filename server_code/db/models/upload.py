@@ -0,0 +1,79 @@
+"""断点续传上传会话模型（中文注释）。
+
+客户端先创建会话，再按分块序号上传（可并发、可重试），全部收到后完成会话，
+生成与普通上传相同的项目附件或任务附件记录。
+普通上传在保存期间写入配额预留，与进行中的会话一起计入项目已用空间。
+"""
+
+from datetime import datetime
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, ForeignKey, Index, UniqueConstraint
+
+from db.base import Base
+
+
+class UploadSessionStatus:
+    """会话状态"""
+    UPLOADING = "uploading"  # 接收分块中
+    FINALIZING = "finalizing"  # 正在合并为附件
+    COMPLETED = "completed"  # 已生成附件
+
+
+class UploadSession(Base):
+    """上传会话"""
+    __tablename__ = "upload_sessions"
+    __table_args__ = (
+        Index("ix_upload_sessions_expires", "expires_at"),
+    )
+
+    id = Column(String(32), primary_key=True)  # uuid4 hex
+    target_type = Column(String(20), nullable=False)  # project 或 task
+    target_id = Column(Integer, nullable=False)
+    project_id = Column(Integer, nullable=False)  # 配额归属项目
+    filename = Column(String(255), nullable=False)  # 原始文件名
+    total_size = Column(BigInteger, nullable=False)
+    chunk_size = Column(Integer, nullable=False)
+    temp_path = Column(String(500), nullable=False)  # 分块写入的临时文件
+    status = Column(String(20), nullable=False, default=UploadSessionStatus.UPLOADING)
+    attachment_id = Column(Integer, nullable=True)  # 完成后生成的附件 ID
+    finalizing_at = Column(DateTime, nullable=True)  # 开始合并的时间；超时未完成（如进程退出）可重新完成或放弃
+    created_by = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False)  # 每收到一个分块顺延
+
+    def __repr__(self):
+        return f"<UploadSession(id={self.id}, target={self.target_type}:{self.target_id}, status={self.status})>"
+
+
+class UploadChunk(Base):
+    """已收到的分块"""
+    __tablename__ = "upload_chunks"
+    __table_args__ = (
+        UniqueConstraint("session_id", "chunk_index", name="uq_upload_chunks_session_index"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    session_id = Column(String(32), ForeignKey("upload_sessions.id", ondelete="CASCADE"), nullable=False)
+    chunk_index = Column(Integer, nullable=False)
+    size = Column(Integer, nullable=False)
+    sha256 = Column(String(64), nullable=False)
+    received_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<UploadChunk(session_id={self.session_id}, chunk_index={self.chunk_index})>"
+
+
+class UploadReservation(Base):
+    """上传中预留的项目配额（附件记录提交时删除，异常中断的预留过期后不再计入）"""
+    __tablename__ = "upload_reservations"
+    __table_args__ = (
+        Index("ix_upload_reservations_project_expires", "project_id", "expires_at"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    project_id = Column(Integer, nullable=False)
+    size = Column(BigInteger, nullable=False)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False)
+
+    def __repr__(self):
+        return f"<UploadReservation(id={self.id}, project_id={self.project_id}, size={self.size})>"
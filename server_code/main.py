@@ -6,31 +6,45 @@
 
 from fastapi import FastAPI  # FastAPI应用框架
 from fastapi.middleware.cors import CORSMiddleware  # CORS跨域中间件
-from fastapi.staticfiles import StaticFiles  # 静态文件服务
 from sqlalchemy import select,inspect  # SQLAlchemy查询和函数
 
 from contextlib import asynccontextmanager  # 异步上下文管理器
 import os  # 系统操作
 
-from core.config import settings  # 应用配置
+from core.config import settings, UPLOAD_DIR  # 应用配置、上传目录
 from core.seed_data import BASE_PERMISSIONS, BUILTIN_ROLES, DEFAULT_ADMIN  # 系统种子数据
 from db.base import Base  # 数据库基类
 from db.session import engine, get_session  # 数据库引擎和会话管理
 from db.models.user import User  # 用户模型
 from db.models.role import Role  # 角色模型
 from db.models.permission import Permission  # 权限模型
-from core.security import get_password_hash  # 密码加密
+from core.security import get_password_hash, shutdown_password_hasher  # 密码加密
+from core.presence import presence  # 在线状态服务
+from core.outbox import outbox_worker  # 外发箱后台 worker
+from core.notification_retention import notification_retention  # 通知归档任务
+from core.downloads import CachedStaticFiles  # 静态文件服务（uuid 命名的文件长期缓存）
+from core.metrics import MetricsMiddleware  # 请求耗时与 SQL 统计中间件
+from core.uploads import UploadSizeLimitMiddleware  # 解析 multipart 之前拒绝超大上传
+from core.upload_sessions import upload_session_collector  # 过期上传会话清理任务
+from core.blobs import blob_collector  # 附件内容引用计数校准与清理任务（导入时注册引用计数事件）
+from core.analytics_rollup import rollup_reconciler  # 统计汇总校准任务（导入时注册增量维护事件）
+from core.export import export_collector  # 过期导出文件清理任务（导入时注册外发箱处理函数）
+import core.notification_service  # noqa: F401  注册外发箱通知处理函数
+from core.thumbnails import shutdown_thumbnail_pool  # 缩略图进程池（导入时注册外发箱处理函数）
 from api.routes.auth import router as auth_router  # 认证路由
 from api.routes.projects import router as projects_router  # 项目路由
 from api.routes.users import router as users_router  # 用户路由
 from api.routes.roles import router as roles_router  # 角色路由
 from api.routes.permissions import router as permissions_router  # 权限路由
-from api.routes.ws import router as ws_router  # WebSocket路由
+from api.routes.ws import router as ws_router, manager as ws_manager  # WebSocket路由
 from api.routes.teams import router as teams_router  # 团队路由
 from api.routes.tasks import router as tasks_router  # 任务路由
 from api.routes.dashboard import router as dashboard_router  # 仪表盘路由
 from api.routes.analytics import router as analytics_router  # 图表分析路由
 from api.routes.notifications import router as notifications_router  # 通知路由
+from api.routes.exports import router as exports_router  # 数据导出路由
+from api.routes.metrics import router as metrics_router  # Prometheus 指标路由
+from api.routes.uploads import router as uploads_router  # 断点续传上传路由
 
 
 @asynccontextmanager
@@ -108,8 +122,27 @@ async def lifespan(app: FastAPI):
 
             await session.commit()
         break
+    # 启动在线状态写回、WebSocket 消息总线订阅、外发箱 worker、通知归档、统计汇总校准、上传会话、附件内容与导出文件清理任务
+    await ws_manager.start()
+    await presence.start()
+    await outbox_worker.start()
+    await notification_retention.start()
+    await rollup_reconciler.start()
+    await upload_session_collector.start()
+    await blob_collector.start()
+    await export_collector.start()
     print("应用启动完成")
     yield
+    await export_collector.stop()
+    await blob_collector.stop()
+    await upload_session_collector.stop()
+    await rollup_reconciler.stop()
+    await notification_retention.stop()
+    await outbox_worker.stop()
+    await presence.stop()
+    await ws_manager.stop()
+    shutdown_password_hasher()
+    shutdown_thumbnail_pool()
     print("应用关闭")
 
 
@@ -117,23 +150,29 @@ async def lifespan(app: FastAPI):
 app = FastAPI(title=settings.PROJECT_NAME, lifespan=lifespan)
 
 # 创建uploads目录（如果不存在）用于存储上传的文件
-UPLOAD_DIR = "uploads"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 os.makedirs(os.path.join(UPLOAD_DIR, "projects"), exist_ok=True)
 
 # 挂载静态文件目录
-app.mount("/uploads", StaticFiles(directory=UPLOAD_DIR), name="uploads")
+app.mount("/uploads", CachedStaticFiles(directory=UPLOAD_DIR), name="uploads")
 
+# 最先添加的中间件最后执行：413 响应仍带 CORS 头
+app.add_middleware(UploadSizeLimitMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=['*'],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # 最近活动的下一页游标；附件下载的文件名、续传与校验头
+    expose_headers=["X-Next-Cursor", "Content-Disposition", "Content-Range", "Accept-Ranges", "ETag"],
 )
+# 最后添加的中间件最先执行：耗时包含 CORS 处理
+app.add_middleware(MetricsMiddleware)
 
 # 注册API路由
 app.include_router(ws_router)  # WebSocket实时通信接口（无前缀）
+app.include_router(metrics_router)  # Prometheus 指标接口（无前缀）
 app.include_router(auth_router, prefix=settings.API_PREFIX)  # 用户认证相关接口
 app.include_router(users_router, prefix=settings.API_PREFIX)  # 用户管理相关接口
 app.include_router(roles_router, prefix=settings.API_PREFIX)  # 角色管理相关接口
@@ -144,6 +183,8 @@ app.include_router(dashboard_router, prefix=settings.API_PREFIX)  # 仪表盘相
 app.include_router(analytics_router, prefix=settings.API_PREFIX)  # 图表分析相关接口
 app.include_router(permissions_router, prefix=settings.API_PREFIX)  # 权限管理相关接口
 app.include_router(notifications_router, prefix=settings.API_PREFIX)  # 通知相关接口
+app.include_router(exports_router, prefix=settings.API_PREFIX)  # 数据导出相关接口
+app.include_router(uploads_router, prefix=settings.API_PREFIX)  # 断点续传上传接口
 
 
 if __name__ == "__main__":
@@ -14,6 +14,7 @@ class NotificationType(str, Enum):
     PROJECT_UPDATE = "project_update"  # 项目更新
     TEAM_INVITE = "team_invite"  # 团队邀请
     PROJECT_ASSIGNED = "project_assigned"  # 项目分配
+    EXPORT_READY = "export_ready"  # 后台导出完成
 
 
 class NotificationBase(BaseModel):
@@ -43,6 +44,21 @@ class NotificationOut(NotificationBase):
 
 class NotificationListResponse(BaseModel):
     """通知列表响应"""
-    total: int
+    total: Optional[int] = None  # total_mode=none 时不统计
     items: list[NotificationOut]
-    unread_count: int
\ No newline at end of file
+    unread_count: int
+    next_cursor: Optional[str] = None  # 下一页游标
+    prev_cursor: Optional[str] = None  # 上一页游标
+
+
+class NotificationArchiveOut(NotificationOut):
+    """归档通知输出模式"""
+    archived_at: datetime
+
+
+class NotificationArchiveListResponse(BaseModel):
+    """归档通知列表响应"""
+    total: Optional[int] = None
+    items: list[NotificationArchiveOut]
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
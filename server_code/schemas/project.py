@@ -58,6 +58,7 @@ class AttachmentBrief(BaseModel):
     uploaded_by: int | None = None
     uploaded_at: datetime
     uploader_name: str | None = None  # 上传者姓名
+    thumbnail_url: str | None = None  # 缩略图地址（图片/PDF 生成完成后才有）
 
     class Config:
         from_attributes = True
@@ -41,8 +41,10 @@ class TaskCreate(BaseModel):
 
 # 任务列表响应
 class TaskListResponse(BaseModel):
-    total: int
+    total: Optional[int] = None  # total_mode=none 时不统计
     items: List[TaskOut]
+    next_cursor: Optional[str] = None  # 下一页游标
+    prev_cursor: Optional[str] = None  # 上一页游标
 
 # 任务更新输入
 class TaskUpdate(BaseModel):
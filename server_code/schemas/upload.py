@@ -0,0 +1,33 @@
+"""断点续传上传相关 Pydantic 模式。"""
+
+from datetime import datetime
+from typing import Literal
+from pydantic import BaseModel, Field
+
+
+class UploadSessionCreate(BaseModel):
+    target_type: Literal["project", "task"]  # 附件归属：项目或任务
+    target_id: int
+    filename: str = Field(min_length=1, max_length=255)
+    total_size: int = Field(gt=0)  # 文件总字节数
+    chunk_size: int | None = None  # 分块大小，不传使用服务端默认值
+
+
+class UploadSessionOut(BaseModel):
+    id: str
+    target_type: str
+    target_id: int
+    filename: str
+    total_size: int
+    chunk_size: int
+    chunk_count: int
+    received_chunks: list[int] = []  # 已收到的分块序号，续传时只需上传缺少的分块
+    status: str
+    attachment_id: int | None = None
+    expires_at: datetime
+
+
+class UploadChunkOut(BaseModel):
+    index: int
+    size: int
+    received: int  # 已收到的分块数
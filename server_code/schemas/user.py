@@ -41,8 +41,10 @@ class UserCreate(BaseModel):
 
 # 用户列表响应
 class UserListResponse(BaseModel):
-    total: int
+    total: Optional[int] = None  # total_mode=none 时不统计
     items: List[UserOut]
+    next_cursor: Optional[str] = None  # 下一页游标
+    prev_cursor: Optional[str] = None  # 上一页游标
 
 # 用户查询参数
 class UserQuery(BaseModel):
@@ -0,0 +1,56 @@
+"""测试公共夹具（中文注释）。
+
+- 使用临时目录中的 SQLite（aiosqlite）数据库，需在导入应用模块之前设置 DATABASE_URL
+- query_counter 通过 before_cursor_execute 事件统计实际发送到数据库的 SQL 条数
+"""
+
+import os
+import tempfile
+
+_TMP_DIR = tempfile.mkdtemp(prefix="pm_tests_")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(_TMP_DIR, 'test.sqlite3')}"
+
+import pytest  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+from db.base import Base  # noqa: E402
+from db.session import engine  # noqa: E402
+
+
+async def reset_database() -> None:
+    """重建全部表。"""
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+
+
+@pytest.fixture
+async def db():
+    """每个测试使用一套空表。"""
+    await reset_database()
+    yield engine
+
+
+class QueryCounter:
+    """记录执行的 SQL 语句。"""
+
+    def __init__(self):
+        self.statements: list[str] = []
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def reset(self) -> None:
+        self.statements.clear()
+
+
+@pytest.fixture
+def query_counter():
+    counter = QueryCounter()
+    event.listen(engine.sync_engine, "before_cursor_execute", counter)
+    yield counter
+    event.remove(engine.sync_engine, "before_cursor_execute", counter)
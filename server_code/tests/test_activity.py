@@ -0,0 +1,106 @@
+"""活动记录写入与最近活动分页测试。"""
+
+from io import BytesIO
+
+import pytest
+from fastapi import Response, UploadFile
+from sqlalchemy import select
+
+from api.routes import dashboard, projects, tasks
+from core import activity
+from core.config import settings
+from core.response_cache import MemoryBackend, ResponseCache
+from db.models.activity import ActivityEvent
+from db.models.project import Project
+from db.models.task import Task
+from db.models.user import User
+from db.session import AsyncSessionLocal
+from schemas.project import ProjectCreate, ProjectUpdate
+from schemas.task import TaskCommentCreate, TaskCreate, TaskUpdate
+
+
+@pytest.fixture
+async def users(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "BLOB_DIR", str(tmp_path / "blobs"))
+    monkeypatch.setattr(projects, "UPLOAD_DIR", str(tmp_path / "uploads"))
+    monkeypatch.setattr(tasks, "UPLOAD_DIR", str(tmp_path / "uploads"))
+    # 最近活动走响应缓存：每个测试使用独立的缓存
+    monkeypatch.setattr(dashboard, "response_cache", ResponseCache(MemoryBackend(100)))
+    owner = User(id=1, username="owner", nickname="负责人", password_hash="x")
+    member = User(id=2, username="member", password_hash="x")
+    async with AsyncSessionLocal() as session:
+        session.add_all([owner, member])
+        await session.commit()
+    return owner, member
+
+
+async def _recent(user: User, **params) -> tuple[list[dict], str | None]:
+    response = Response()
+    params = {"limit": 10, "cursor": None, "project_id": None, "actor_id": None, **params}
+    items = await dashboard.get_recent_activity(response=response, current_user=user, **params)
+    return items, response.headers.get("X-Next-Cursor")
+
+
+async def test_mutations_record_activity_and_feed_paginates(users):
+    owner, member = users
+    async with AsyncSessionLocal() as session:
+        await projects.create_project(ProjectCreate(name="甲", leader_ids=[1]), session=session, current_user=owner)
+        await projects.create_project(ProjectCreate(name="乙"), session=session, current_user=owner)
+    async with AsyncSessionLocal() as session:
+        project_id = (await session.execute(select(Project.id).where(Project.name == "甲"))).scalar_one()
+        other_id = (await session.execute(select(Project.id).where(Project.name == "乙"))).scalar_one()
+        await projects.update_project(project_id, ProjectUpdate(description="d"), session=session, current_user=owner)
+    async with AsyncSessionLocal() as session:
+        await tasks.create_task(TaskCreate(title="任务", project_id=project_id), session=session, current_user=member)
+        task_id = (await session.execute(select(Task.id))).scalar_one()
+    async with AsyncSessionLocal() as session:
+        await tasks.update_task(task_id, TaskUpdate(status="进行中"), session=session, current_user=member)
+    async with AsyncSessionLocal() as session:
+        await tasks.create_task_comment(task_id, TaskCommentCreate(content="好"), current_user=member, session=session)
+    async with AsyncSessionLocal() as session:
+        await projects.upload_attachment(
+            project_id, file=UploadFile(BytesIO(b"x"), filename="a.txt", size=1), session=session, current_user=owner
+        )
+
+    async with AsyncSessionLocal() as session:
+        events = (await session.execute(select(ActivityEvent).order_by(ActivityEvent.id))).scalars().all()
+    assert [(e.type, e.actor_id, e.project_id) for e in events] == [
+        ("project_created", 1, project_id),
+        ("project_created", 1, other_id),
+        ("project_updated", 1, project_id),
+        ("task_created", 2, project_id),
+        ("task_updated", 2, project_id),
+        ("comment_created", 2, project_id),
+        ("attachment_uploaded", 1, project_id),
+    ]
+    assert all(e.task_id == task_id for e in events[3:6])
+
+    # 按游标翻页：每页 3 条，最新的在前，最后一页没有 X-Next-Cursor
+    seen, cursor = [], None
+    for _ in range(3):
+        items, cursor = await _recent(owner, limit=3, cursor=cursor)
+        seen += items
+    assert cursor is None
+    assert [item["title"] for item in seen] == [e.title for e in reversed(events)]
+    assert seen[0]["user"] == "负责人" and seen[-1]["project"] == "甲"
+
+    items, cursor = await _recent(owner, actor_id=2)
+    assert [item["title"] for item in items] == [e.title for e in reversed(events) if e.actor_id == 2]
+    assert cursor is None
+    items, _ = await _recent(owner, project_id=other_id)
+    assert [item["title"] for item in items] == ["创建了项目 '乙'"]
+
+
+async def test_backfill_from_existing_projects_and_tasks(users):
+    owner, member = users
+    async with AsyncSessionLocal() as session:
+        session.add(Project(id=1, name="旧项目", owner_id=1))
+        await session.flush()
+        session.add(Task(id=1, title="旧任务", project_id=1, created_by=2))
+        await session.commit()
+
+    assert await activity.backfill() == 2
+    # 活动表非空时不重复补录
+    assert await activity.backfill() == 0
+    items, _ = await _recent(owner)
+    assert {item["title"] for item in items} == {"创建了项目 '旧项目'", "创建了任务 '旧任务'"}
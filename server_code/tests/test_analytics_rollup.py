@@ -0,0 +1,41 @@
+"""统计汇总校准与后台任务租约测试。"""
+
+from sqlalchemy import insert, update
+
+from core import leases
+from core.analytics_rollup import read_metric, rebuild
+from db.models.analytics import AnalyticsRollup
+from db.models.project import Project
+from db.session import AsyncSessionLocal
+
+
+async def test_rebuild_applies_only_the_difference(db):
+    async with AsyncSessionLocal() as session:
+        session.add_all([Project(name="a", status="进行中"), Project(name="b", status="已完成")])
+        await session.commit()
+        # 绕过 ORM 的批量写入不会更新汇总，另造一条错误计数
+        await session.execute(insert(Project), [{"name": "c", "status": "进行中"}])
+        await session.execute(
+            update(AnalyticsRollup)
+            .where(AnalyticsRollup.metric == "project.status", AnalyticsRollup.dim == "已完成")
+            .values(value=5)
+        )
+        await session.commit()
+
+    # 进行中、已完成与创建月份三行有差值
+    assert await rebuild() == 3
+    async with AsyncSessionLocal() as session:
+        rows = await read_metric(session, "project.status")
+    assert sorted((dim, value) for _, dim, value in rows) == [("已完成", 1), ("进行中", 2)]
+    # 已收敛：再次校准没有差值
+    assert await rebuild() == 0
+
+
+async def test_lease_is_held_by_one_worker(db, monkeypatch):
+    assert await leases.try_acquire("test", 60)
+    assert await leases.try_acquire("test", 60)  # 持有者续期
+    monkeypatch.setattr(leases, "HOLDER", "other-worker")
+    assert not await leases.try_acquire("test", 60)
+    assert await leases.try_acquire("expired", 0)
+    monkeypatch.setattr(leases, "HOLDER", "third-worker")
+    assert await leases.try_acquire("expired", 60)
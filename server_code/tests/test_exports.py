@@ -0,0 +1,58 @@
+"""后台导出文件的存储、下载鉴权与过期清理测试。"""
+
+import os
+from datetime import datetime, timedelta
+
+import httpx
+from fastapi import FastAPI
+from sqlalchemy import select, update
+
+from api.routes.exports import router
+from core.config import settings
+from core.export import _on_export, collect_expired_exports
+from core.security import create_access_token
+from db.models.export import ExportFile
+from db.models.notification import Notification
+from db.models.user import User
+from db.session import AsyncSessionLocal
+
+
+def _client() -> httpx.AsyncClient:
+    app = FastAPI()
+    app.include_router(router, prefix=settings.API_PREFIX)
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+def _auth(user_id: int) -> dict:
+    return {"Authorization": f"Bearer {create_access_token(str(user_id))}"}
+
+
+async def test_export_is_private_and_expires(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "EXPORT_DIR", str(tmp_path / "exports"))
+    async with AsyncSessionLocal() as session:
+        session.add_all([
+            User(id=1, username="owner", nickname="owner", password_hash="x"),
+            User(id=2, username="other", nickname="other", password_hash="x"),
+        ])
+        await session.commit()
+
+    async with AsyncSessionLocal() as session:
+        await _on_export(session, {"dataset": "login_logs", "format": "csv", "gzip": False, "user_id": 1})
+    async with AsyncSessionLocal() as session:
+        export = (await session.execute(select(ExportFile))).scalar_one()
+        content = (await session.execute(select(Notification.content))).scalar_one()
+    assert content == f"/exports/files/{export.id}"
+    assert os.path.commonpath([export.path, settings.EXPORT_DIR]) == settings.EXPORT_DIR
+
+    async with _client() as client:
+        response = await client.get(f"/api{content}", headers=_auth(1))
+        assert response.status_code == 200
+        assert response.content.startswith("\ufeff".encode("utf-8"))
+        assert (await client.get(f"/api{content}", headers=_auth(2))).status_code == 404
+        assert (await client.get(f"/api{content}")).status_code == 401
+
+    async with AsyncSessionLocal() as session:
+        await session.execute(update(ExportFile).values(expires_at=datetime.utcnow() - timedelta(seconds=1)))
+        await session.commit()
+    assert await collect_expired_exports() == 1
+    assert not os.path.exists(export.path)
@@ -0,0 +1,69 @@
+"""请求与 SQL 指标中间件测试。"""
+
+import httpx
+from fastapi import Depends, FastAPI
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from api.routes.metrics import router as metrics_router
+from core import metrics
+from core.config import settings
+from core.query_fanout import fanout, scalar
+from db.session import get_session
+
+
+def _app() -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(metrics.MetricsMiddleware)
+    app.include_router(metrics_router)
+
+    @app.get("/metrics-test/items/{item_id}")
+    async def item(item_id: int, session: AsyncSession = Depends(get_session)):
+        await session.execute(text("SELECT 1 AS a"))
+        await session.execute(text("SELECT 2 AS b"))
+        # 并发子任务继承当前请求的统计对象
+        return await fanout(scalar(text("SELECT 3 AS c")), scalar(text("SELECT 4 AS d")), scalar(text("SELECT 5 AS e")))
+
+    @app.get("/metrics-test/loop")
+    async def loop(session: AsyncSession = Depends(get_session)):
+        for i in range(5):
+            await session.execute(text(f"SELECT {i} AS n"))
+        return {}
+
+    return app
+
+
+async def test_request_metrics_and_prometheus_output(db, monkeypatch):
+    monkeypatch.setattr(settings, "METRICS_N_PLUS_ONE_THRESHOLD", 3)
+    transport = httpx.ASGITransport(app=_app())
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        assert (await client.get("/metrics-test/items/1")).json() == [3, 4, 5]
+        await client.get("/metrics-test/items/2")
+        await client.get("/metrics-test/loop")
+        await client.get("/metrics-test/missing/42")
+        response = await client.get("/metrics")
+
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    lines = response.text.splitlines()
+    item = 'method="GET",route="/metrics-test/items/{item_id}"'
+    # 按路由模板聚合，路径参数不进入标签
+    assert f'http_requests_total{{{item},status="200"}} 2' in lines
+    assert f"http_request_db_queries_count{{{item}}} 2" in lines
+    assert f"http_request_db_queries_sum{{{item}}} 10.0" in lines
+    assert f'http_request_db_queries_bucket{{{item},le="5"}} 2' in lines
+    assert f'http_request_db_queries_bucket{{{item},le="2"}} 0' in lines
+    assert 'http_requests_total{method="GET",route="unmatched",status="404"} 1' in lines
+    assert not any("/metrics-test/items/1" in line or "missing/42" in line for line in lines)
+
+    # 同一形状的 SQL 超过阈值：记为疑似 N+1
+    assert 'http_n_plus_one_total{method="GET",route="/metrics-test/loop"} 1' in lines
+    assert f"http_n_plus_one_total{{{item}}} 1" not in lines
+    assert "# TYPE http_request_duration_seconds histogram" in lines
+    assert any(line.startswith('app_cache_size{cache="response"} ') for line in lines)
+
+
+def test_normalize_sql():
+    assert metrics.normalize_sql("SELECT * FROM t WHERE id IN (?, ?, ?) AND name = 'a''b'") == (
+        "SELECT * FROM t WHERE id IN (?) AND name = ?"
+    )
+    assert metrics.normalize_sql("SELECT 1  AS n") == metrics.normalize_sql("SELECT 42 AS n")
@@ -0,0 +1,76 @@
+"""外发箱 worker 测试。"""
+
+import asyncio
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update
+
+from core import outbox
+from core.config import settings
+from core.outbox import OutboxWorker
+from db.models.outbox import OutboxEvent, OutboxStatus
+from db.session import AsyncSessionLocal
+
+
+async def _statuses() -> list[str]:
+    async with AsyncSessionLocal() as session:
+        return list((await session.execute(select(OutboxEvent.status).order_by(OutboxEvent.id))).scalars().all())
+
+
+async def test_long_handler_keeps_its_lease(db, monkeypatch):
+    monkeypatch.setattr(settings, "OUTBOX_VISIBILITY_TIMEOUT_SECONDS", 0.3)
+    calls = []
+
+    @outbox.handler("test.slow", timeout=5)
+    async def slow(session, payload):
+        calls.append(payload)
+        await asyncio.sleep(1.0)
+
+    async with AsyncSessionLocal() as session:
+        outbox.enqueue(session, "test.slow", {"n": 1})
+        await session.commit()
+
+    first, second = OutboxWorker(), OutboxWorker()
+    [item] = await first._claim()
+    processing = asyncio.create_task(first._process(item))
+    # 远超认领超时，另一个 worker 仍不能认领
+    await asyncio.sleep(0.7)
+    assert await second._claim() == []
+    await processing
+    assert calls == [{"n": 1}]
+    assert await _statuses() == [OutboxStatus.DONE]
+
+
+async def test_hung_event_fails_at_claim_after_max_attempts(db, monkeypatch):
+    monkeypatch.setattr(settings, "OUTBOX_MAX_ATTEMPTS", 2)
+    async with AsyncSessionLocal() as session:
+        for attempts in (1, 2):
+            item = outbox.enqueue(session, "test.hung", {})
+            item.status = OutboxStatus.PROCESSING
+            item.attempts = attempts
+            item.locked_by = "dead"
+            item.locked_at = datetime.utcnow() - timedelta(hours=1)
+        await session.commit()
+
+    claimed = await OutboxWorker()._claim()
+    # 还有尝试次数的重新投递，用完的标记为失败
+    assert [item["attempts"] for item in claimed] == [2]
+    assert await _statuses() == [OutboxStatus.PROCESSING, OutboxStatus.FAILED]
+    async with AsyncSessionLocal() as session:
+        stats = await outbox.queue_stats(session)
+    assert stats["processing"] == 1 and stats["failed"] == 1
+
+
+async def test_sweep_removes_old_done_events(db):
+    async with AsyncSessionLocal() as session:
+        for _ in range(3):
+            outbox.enqueue(session, "test.done", {})
+        await session.commit()
+        ids = (await session.execute(select(OutboxEvent.id).order_by(OutboxEvent.id))).scalars().all()
+        old = datetime.utcnow() - timedelta(hours=settings.OUTBOX_DONE_RETENTION_HOURS + 1)
+        await session.execute(update(OutboxEvent).values(status=OutboxStatus.DONE, processed_at=datetime.utcnow()))
+        await session.execute(update(OutboxEvent).where(OutboxEvent.id.in_(ids[:2])).values(processed_at=old))
+        await session.commit()
+
+    assert await outbox.sweep_done() == 2
+    assert await _statuses() == [OutboxStatus.DONE]
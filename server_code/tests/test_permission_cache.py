@@ -0,0 +1,15 @@
+"""权限缓存版本号测试。"""
+
+from core.permission_cache import PermissionCache
+
+
+def test_set_skips_when_invalidated_during_load():
+    cache = PermissionCache(maxsize=10, ttl=60)
+    version = cache.version
+    # 查库期间角色权限被修改
+    cache.invalidate_all()
+    cache.set(1, 2, frozenset({"projects.view"}), version)
+    assert cache.get(1, 2) is None
+
+    cache.set(1, 2, frozenset({"tasks.view"}), cache.version)
+    assert cache.get(1, 2) == frozenset({"tasks.view"})
@@ -0,0 +1,78 @@
+"""多 worker 在线状态测试（两个 PresenceService 共用同一数据库）。"""
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update
+
+from core.presence import PresenceService
+from db.models.presence import PresenceWorker
+from db.models.user import User
+from db.session import AsyncSessionLocal
+
+
+async def _seed_users(*user_ids: int) -> None:
+    async with AsyncSessionLocal() as session:
+        session.add_all([
+            User(id=uid, username=f"user{uid}", nickname=f"user{uid}", password_hash="x") for uid in user_ids
+        ])
+        await session.commit()
+
+
+async def _online(user_id: int) -> bool:
+    async with AsyncSessionLocal() as session:
+        return (await session.execute(select(User.online).where(User.id == user_id))).scalar_one()
+
+
+async def test_user_stays_online_until_last_worker_disconnects(db):
+    await _seed_users(1)
+    a, b = PresenceService(), PresenceService()
+    events = []
+
+    async def listener(user_id, online):
+        events.append((user_id, online))
+
+    a.set_listener(listener)
+    b.set_listener(listener)
+
+    a.mark_online(1)
+    await a.flush()
+    b.mark_online(1)
+    await b.flush()
+    assert await _online(1)
+    assert events == [(1, True)]
+
+    # 关闭 A 上的连接：B 仍持有连接，用户保持在线且不广播
+    a.mark_offline(1)
+    await a.flush()
+    assert await _online(1)
+    assert events == [(1, True)]
+
+    b.mark_offline(1)
+    await b.flush()
+    assert not await _online(1)
+    assert events == [(1, True), (1, False)]
+
+
+async def test_reap_only_clears_dead_workers(db):
+    await _seed_users(1, 2)
+    alive, dead = PresenceService(), PresenceService()
+    alive.mark_online(1)
+    await alive.flush()
+    dead.mark_online(2)
+    await dead.flush()
+
+    # dead 停止心跳（进程崩溃）
+    async with AsyncSessionLocal() as session:
+        await session.execute(
+            update(PresenceWorker).where(PresenceWorker.id == dead.worker_id)
+            .values(heartbeat_at=datetime.utcnow() - timedelta(hours=1))
+        )
+        await session.commit()
+
+    await PresenceService().reap()
+    assert await _online(1)
+    assert not await _online(2)
+    async with AsyncSessionLocal() as session:
+        workers = set((await session.execute(select(PresenceWorker.id))).scalars().all())
+    assert alive.worker_id in workers
+    assert dead.worker_id not in workers
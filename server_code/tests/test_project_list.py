@@ -0,0 +1,104 @@
+"""项目列表查询次数回归测试（5k 项目 / 50 万任务，SQLite）。
+
+项目、任务数量可通过 BENCH_PROJECTS / BENCH_TASKS 环境变量调整。
+"""
+
+import os
+import time
+from datetime import datetime
+
+import pytest
+from sqlalchemy import insert, select
+
+from api.routes.projects import list_projects
+from db.models.project import Project, ProjectMember
+from db.models.role import Role
+from db.models.task import Task
+from db.models.user import User
+from db.session import AsyncSessionLocal
+from tests.conftest import reset_database
+
+PROJECTS = int(os.getenv("BENCH_PROJECTS", "5000"))
+TASKS = int(os.getenv("BENCH_TASKS", "500000"))
+STATUSES = ("待处理", "进行中", "已完成", "已取消")
+
+
+@pytest.fixture(scope="module")
+async def seeded():
+    await reset_database()
+    started = time.perf_counter()
+    async with AsyncSessionLocal() as session:
+        admin_role = Role(name="超级管理员", is_superadmin=True)
+        member_role = Role(name="成员", is_superadmin=False)
+        session.add_all([admin_role, member_role])
+        await session.flush()
+        admin = User(username="admin", password_hash="x", role_id=admin_role.id)
+        member = User(username="member", password_hash="x", role_id=member_role.id)
+        session.add_all([admin, member])
+        await session.commit()
+
+        now = datetime.utcnow()
+        await session.execute(
+            insert(Project.__table__),
+            [{"id": i, "name": f"项目{i}", "status": "in_progress", "created_at": now} for i in range(1, PROJECTS + 1)],
+        )
+        # 普通用户是每 10 个项目中一个的负责人
+        await session.execute(
+            insert(ProjectMember.__table__),
+            [
+                {"project_id": i, "user_id": member.id, "role": "负责人", "joined_at": now}
+                for i in range(1, PROJECTS + 1, 10)
+            ],
+        )
+        batch = 50000
+        for start in range(0, TASKS, batch):
+            await session.execute(
+                insert(Task.__table__),
+                [
+                    {
+                        "title": f"任务{n}",
+                        "status": STATUSES[n % len(STATUSES)],
+                        "priority": "中",
+                        "project_id": n % PROJECTS + 1,
+                        "created_by": admin.id,
+                        "created_at": now,
+                    }
+                    for n in range(start, min(start + batch, TASKS))
+                ],
+            )
+        await session.commit()
+    print(f"\n写入 {PROJECTS} 个项目 / {TASKS} 个任务：{time.perf_counter() - started:.1f}s")
+    yield {"admin": admin, "member": member}
+
+
+async def _list(user: User, limit: int | None, query_counter) -> tuple[list[dict], int]:
+    async with AsyncSessionLocal() as session:
+        user = (await session.execute(select(User).where(User.id == user.id))).scalar_one()
+        query_counter.reset()
+        started = time.perf_counter()
+        rows = await list_projects(session=session, current_user=user, before_id=None, limit=limit)
+        elapsed = time.perf_counter() - started
+        count = query_counter.count
+    print(f"{user.username} limit={limit}: {len(rows)} 个项目，{count} 条 SQL，{elapsed * 1000:.0f}ms")
+    return rows, count
+
+
+async def test_query_count_is_constant(seeded, query_counter):
+    counts = set()
+    for user in (seeded["admin"], seeded["member"]):
+        for limit in (10, 500, None):
+            rows, count = await _list(user, limit, query_counter)
+            assert rows
+            counts.add(count)
+    # 角色 2 次 + 项目 1 次 + 任务聚合 1 次 + 负责人 1 次，与项目、任务数量无关
+    assert counts == {5}
+
+
+async def test_counters_match_tasks(seeded, query_counter):
+    rows, _ = await _list(seeded["admin"], None, query_counter)
+    assert len(rows) == PROJECTS
+    assert sum(r["total_tasks"] for r in rows) == TASKS
+    closed = sum(1 for n in range(TASKS) if STATUSES[n % len(STATUSES)] in ("已完成", "已取消"))
+    assert sum(r["incomplete_tasks"] for r in rows) == TASKS - closed
+    leader_rows = [r for r in rows if r["leader_ids"]]
+    assert len(leader_rows) == len(range(1, PROJECTS + 1, 10))
@@ -0,0 +1,76 @@
+"""Redis 消息总线测试（fakeredis 作为本地替身）。"""
+
+import asyncio
+
+import fakeredis
+import pytest
+import redis.asyncio as aioredis
+from redis.exceptions import ConnectionError
+
+from core.config import settings
+from core.pubsub import RedisPubSub
+
+
+@pytest.fixture
+def server(monkeypatch):
+    """所有“worker”共享同一个 fakeredis 服务端。"""
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(aioredis, "from_url", lambda url: fakeredis.FakeAsyncRedis(server=server))
+    monkeypatch.setattr(settings, "WS_PUBSUB_RECONNECT_BASE_SECONDS", 0.01)
+    monkeypatch.setattr(settings, "WS_PUBSUB_RECONNECT_MAX_SECONDS", 0.05)
+    return server
+
+
+async def _worker(received: list) -> RedisPubSub:
+    async def handler(message: dict) -> None:
+        received.append(message)
+
+    bus = RedisPubSub("redis://test", "test:ws")
+    await bus.start(handler)
+    return bus
+
+
+async def _wait_for(predicate, timeout: float = 2.0) -> None:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        assert asyncio.get_running_loop().time() < deadline, "等待超时"
+        await asyncio.sleep(0.01)
+
+
+async def test_publish_reaches_every_worker(server):
+    received_a, received_b = [], []
+    a, b = await _worker(received_a), await _worker(received_b)
+    try:
+        await a.publish({"kind": "user", "user_id": 1, "text": "你好"})
+        await _wait_for(lambda: received_a and received_b)
+        assert received_a == received_b == [{"kind": "user", "user_id": 1, "text": "你好"}]
+    finally:
+        await a.stop()
+        await b.stop()
+
+
+async def test_listener_resubscribes_after_disconnect(server):
+    received = []
+    bus = await _worker(received)
+    publisher = await _worker([])
+    try:
+        # 模拟连接断开：当前订阅的读取报错，且重连时 Redis 暂时不可用
+        async def broken(*args, **kwargs):
+            raise ConnectionError("connection lost")
+
+        old = bus._pubsub
+        old.parse_response = broken
+        await publisher.publish({"n": 0})  # 唤醒阻塞中的读取
+        server.connected = False
+        await asyncio.sleep(0.1)
+        assert not bus._task.done()
+
+        server.connected = True
+        await _wait_for(lambda: bus._pubsub not in (None, old) and bus._pubsub.subscribed)
+        received.clear()
+        await publisher.publish({"n": 1})
+        await _wait_for(lambda: received)
+        assert received == [{"n": 1}]
+    finally:
+        await bus.stop()
+        await publisher.stop()
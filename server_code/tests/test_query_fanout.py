@@ -0,0 +1,40 @@
+"""并发只读查询的连接占用测试。"""
+
+import httpx
+from fastapi import Depends, FastAPI
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from api.deps.session import release_session
+from core import query_fanout
+from core.config import settings
+from core.query_fanout import fanout, scalar
+from db.session import engine, get_session
+
+
+def test_concurrency_is_bounded_by_pool(monkeypatch):
+    capacity = engine.pool.size() + engine.pool._max_overflow
+    monkeypatch.setattr(settings, "QUERY_FANOUT_MAX_CONCURRENCY", 100)
+    assert query_fanout.max_concurrency() == capacity // 2
+    monkeypatch.setattr(settings, "QUERY_FANOUT_MAX_CONCURRENCY", 2)
+    assert query_fanout.max_concurrency() == 2
+
+
+async def test_request_connection_is_released_before_fanout(db):
+    app = FastAPI()
+    checked_out = []
+
+    async def authenticate(session: AsyncSession = Depends(get_session)) -> None:
+        # 模拟认证依赖：在请求会话上执行查询后连接一直被占用
+        await session.execute(text("SELECT 1"))
+
+    @app.get("/stats")
+    async def stats(_user: None = Depends(authenticate), _: None = Depends(release_session)):
+        checked_out.append(engine.pool.checkedout())
+        return await fanout(scalar(select(1)), scalar(select(2)))
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        response = await client.get("/stats")
+    assert response.json() == [1, 2]
+    assert checked_out == [0]
@@ -0,0 +1,109 @@
+"""接口响应缓存测试。"""
+
+import asyncio
+
+import pytest
+
+import api.routes.dashboard  # noqa: F401  注册各模型的失效命名空间
+from core import response_cache as response_cache_module
+from core.response_cache import MemoryBackend, ResponseCache, SQLiteBackend
+from db.models.team import Team
+from db.session import AsyncSessionLocal
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "sqlite":
+        return SQLiteBackend(str(tmp_path / "cache.sqlite3"))
+    return MemoryBackend(100)
+
+
+class Counter:
+    """记录调用次数的计算函数；gate 设置前阻塞。"""
+
+    def __init__(self):
+        self.calls = 0
+        self.gate = asyncio.Event()
+        self.gate.set()
+
+    async def __call__(self):
+        self.calls += 1
+        await self.gate.wait()
+        return {"n": self.calls}
+
+
+async def test_single_flight(backend):
+    cache = ResponseCache(backend)
+    compute = Counter()
+    compute.gate.clear()
+    waiting = [asyncio.create_task(cache.get_or_compute("ns", "a", compute)) for _ in range(5)]
+    await asyncio.sleep(0.01)
+    compute.gate.set()
+    assert await asyncio.gather(*waiting) == [{"n": 1}] * 5
+    assert compute.calls == 1
+    assert await cache.get_or_compute("ns", "a", compute) == {"n": 1}
+    assert (cache.hits, cache.misses) == (1, 5)
+
+
+async def test_stale_while_revalidate(backend):
+    cache = ResponseCache(backend)
+    compute = Counter()
+    assert await cache.get_or_compute("ns", "a", compute, ttl=0.05, stale_ttl=60) == {"n": 1}
+    await asyncio.sleep(0.06)
+
+    # 过期后先返回旧值，后台刷新
+    assert await cache.get_or_compute("ns", "a", compute, ttl=0.05, stale_ttl=60) == {"n": 1}
+    assert cache.stale_hits == 1
+    await asyncio.gather(*cache._background)
+    assert await cache.get_or_compute("ns", "a", compute, ttl=60, stale_ttl=60) == {"n": 2}
+    assert compute.calls == 2
+
+
+async def test_invalidation_during_compute_is_not_written_back(backend):
+    cache = ResponseCache(backend)
+    compute = Counter()
+    compute.gate.clear()
+    pending = asyncio.create_task(cache.get_or_compute("ns", "a", compute))
+    await asyncio.sleep(0.01)
+    await cache.invalidate("ns")
+    compute.gate.set()
+    assert await pending == {"n": 1}
+
+    assert await cache.get_or_compute("ns", "a", compute) == {"n": 2}
+    assert compute.calls == 2
+    assert (await cache.stats())["size"] == 1
+
+
+async def test_shared_sqlite_invalidation_from_another_worker(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    worker_a = ResponseCache(SQLiteBackend(path))
+    worker_b = ResponseCache(SQLiteBackend(path))
+    compute = Counter()
+    compute.gate.clear()
+    pending = asyncio.create_task(worker_a.get_or_compute("ns", "a", compute))
+    await asyncio.sleep(0.05)
+    # 另一个 worker 提交了数据变更：A 的慢计算完成后不能把旧数据写回共享缓存
+    await worker_b.invalidate("ns")
+    compute.gate.set()
+    await pending
+    assert await worker_b.backend.get(ResponseCache.make_key("ns", "a")) is None
+
+
+async def test_commit_invalidates_registered_namespaces(db, monkeypatch):
+    cache = ResponseCache(MemoryBackend(100))
+    monkeypatch.setattr(response_cache_module, "response_cache", cache)
+    compute = Counter()
+    await cache.get_or_compute("analytics.people", "teams", compute)
+
+    async with AsyncSessionLocal() as session:
+        session.add(Team(name="t"))
+        await session.flush()
+        await session.rollback()
+    await asyncio.gather(*cache._background)
+    assert await cache.get_or_compute("analytics.people", "teams", compute) == {"n": 1}
+
+    async with AsyncSessionLocal() as session:
+        session.add(Team(name="t"))
+        await session.commit()
+    await asyncio.gather(*cache._background)
+    assert await cache.get_or_compute("analytics.people", "teams", compute) == {"n": 2}
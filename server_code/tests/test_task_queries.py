@@ -0,0 +1,72 @@
+"""任务列表/详情查询次数回归测试。"""
+
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import insert
+
+from api.routes.tasks import get_task, list_tasks
+from db.models.project import Project
+from db.models.task import Task, TaskAssignee
+from db.models.user import User
+from db.session import AsyncSessionLocal
+
+TASKS = 250
+
+
+@pytest.fixture
+async def seeded(db):
+    now = datetime.utcnow()
+    async with AsyncSessionLocal() as session:
+        await session.execute(
+            insert(User.__table__),
+            [{"id": i, "username": f"user{i}", "nickname": f"用户{i}", "password_hash": "x", "is_admin": False, "is_active": True,
+              "online": False, "created_at": now} for i in range(1, 11)],
+        )
+        await session.execute(insert(Project.__table__), [{"id": 1, "name": "项目", "status": "in_progress"}])
+        await session.execute(
+            insert(Task.__table__),
+            [{"id": i, "title": f"任务{i}", "status": "进行中", "priority": "中", "project_id": 1,
+              "created_by": i % 10 + 1, "created_at": now - timedelta(minutes=i)} for i in range(1, TASKS + 1)],
+        )
+        await session.execute(
+            insert(TaskAssignee.__table__),
+            [{"task_id": i, "user_id": (i + k) % 10 + 1, "assigned_at": now}
+             for i in range(1, TASKS + 1) for k in range(3)],
+        )
+        await session.commit()
+
+
+async def _list(query_counter, **params):
+    query_counter.reset()
+    async with AsyncSessionLocal() as session:
+        params = {"page": 1, "page_size": 100, "project_id": None, "assignee_id": None, "status": None,
+                  "priority": None, "exclude_status": None, "cursor": None, "total_mode": None, **params}
+        return await list_tasks(session=session, **params), query_counter.count
+
+
+async def test_list_tasks_query_count(seeded, query_counter):
+    first, count = await _list(query_counter)
+    assert len(first["items"]) == 100
+    assert first["total"] == TASKS
+    assert all(len(t.assignees) == 3 and t.project_name and t.created_by_name for t in first["items"])
+    # 任务 + 项目/创建人 JOIN 1 次，负责人 selectin 1 次，COUNT 1 次
+    assert count == 3
+
+    # 游标翻页默认跳过 COUNT
+    second, count = await _list(query_counter, cursor=first["next_cursor"])
+    assert len(second["items"]) == 100
+    assert second["total"] is None
+    assert count == 2
+
+    # 页码分页的深页查询次数与第一页相同
+    _, count = await _list(query_counter, page=3, total_mode="none")
+    assert count == 2
+
+
+async def test_get_task_query_count(seeded, query_counter):
+    async with AsyncSessionLocal() as session:
+        query_counter.reset()
+        task = await get_task(7, session=session)
+        assert query_counter.count == 2
+    assert task.id == 7 and len(task.assignees) == 3
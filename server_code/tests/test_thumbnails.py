@@ -0,0 +1,55 @@
+"""缩略图生成测试。"""
+
+import io
+import os
+
+from PIL import Image
+
+from core import thumbnails
+from core.config import settings, UPLOAD_DIR
+
+SHA = "ab" * 32
+
+
+def _jpeg() -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (640, 480), "red").save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+def _render(tmp_path, data: bytes) -> str:
+    source = tmp_path / "source"
+    source.write_bytes(data)
+    return thumbnails.render_thumbnail(str(source), str(tmp_path / "thumb.webp"), 64, "webp", 80)
+
+
+def test_render_image(tmp_path):
+    assert _render(tmp_path, _jpeg()) == thumbnails.READY
+    with Image.open(tmp_path / "thumb.webp") as image:
+        assert max(image.size) == 64
+
+
+def test_corrupt_content_is_unsupported(tmp_path):
+    # 截断的图片在解码时才报错，不能让外发箱事件反复重试
+    assert _render(tmp_path, _jpeg()[:200]) == thumbnails.UNSUPPORTED
+    assert _render(tmp_path, b"not an image") == thumbnails.UNSUPPORTED
+    assert not os.path.exists(tmp_path / "thumb.webp")
+
+
+def test_malformed_pdf(tmp_path):
+    try:
+        import pypdfium2  # noqa: F401
+    except ImportError:
+        assert _render(tmp_path, b"%PDF-1.4 broken") == thumbnails.MISSING_DEPENDENCY
+    else:
+        assert _render(tmp_path, b"%PDF-1.4 broken") == thumbnails.UNSUPPORTED
+
+
+def test_thumbnail_url_is_independent_of_working_directory(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "BLOB_DIR", os.path.join(UPLOAD_DIR, "blobs"))
+    monkeypatch.chdir(tmp_path)
+    assert thumbnails.thumbnail_url(SHA) == f"/uploads/blobs/ab/ab/{SHA}.thumb.{settings.THUMBNAIL_FORMAT}"
+
+    # 内容存储不在上传目录下时没有静态地址
+    monkeypatch.setattr(settings, "BLOB_DIR", str(tmp_path / "blobs"))
+    assert thumbnails.thumbnail_url(SHA) is None
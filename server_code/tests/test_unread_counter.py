@@ -0,0 +1,48 @@
+"""未读数缓存的跨 worker 失效测试。"""
+
+from api.routes.ws import manager
+from core.notification_service import NotificationService
+from core.pubsub import InProcessPubSub
+from core.unread_counter import unread_counter
+from db.models.notification import NotificationType
+from db.models.user import User
+from db.session import AsyncSessionLocal
+from schemas.notification import NotificationCreate
+
+
+class RecordingPubSub(InProcessPubSub):
+    """记录发布的消息（进程内总线）。"""
+
+    def __init__(self):
+        super().__init__()
+        self.published: list[dict] = []
+
+    async def publish(self, message: dict) -> None:
+        self.published.append(message)
+        await super().publish(message)
+
+
+async def test_new_notifications_invalidate_every_worker(db, monkeypatch):
+    bus = RecordingPubSub()
+    monkeypatch.setattr(manager, "backend", bus)
+    await manager.start()
+    async with AsyncSessionLocal() as session:
+        session.add_all([User(id=1, username="a", password_hash="x"), User(id=2, username="b", password_hash="x")])
+        await session.commit()
+        assert await unread_counter.get(session, 1) == 0
+        assert await unread_counter.get(session, 2) == 0
+
+        await NotificationService.create_notifications(session, [
+            NotificationCreate(user_id=1, type=NotificationType.MENTION, title="t", content="c"),
+            NotificationCreate(user_id=1, type=NotificationType.MENTION, title="t", content="c"),
+        ])
+        invalidations = [m for m in bus.published if "invalidate" in m]
+        assert invalidations == [{"invalidate": "unread_count", "keys": [1]}]
+        assert await unread_counter.get(session, 1) == 2
+
+        # 其他 worker 发布的失效消息同样丢弃本进程缓存
+        unread_counter._cache.set(2, 5)
+        await manager._deliver({"invalidate": "unread_count", "keys": [2]})
+        assert await unread_counter.get(session, 2) == 0
+    await manager.stop()
+    unread_counter._cache.clear()
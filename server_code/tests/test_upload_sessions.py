@@ -0,0 +1,94 @@
+"""断点续传完成阶段的失败恢复测试。"""
+
+import os
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import update
+
+from api.routes import uploads
+from core import upload_sessions
+from core.config import settings
+from db.models.project import Project
+from db.models.upload import UploadChunk, UploadSession, UploadSessionStatus
+from db.models.user import User
+from db.session import AsyncSessionLocal
+
+CONTENT = b"x" * 1000
+
+
+@pytest.fixture
+async def upload(db, tmp_path, monkeypatch):
+    """一个已收到全部分块、等待完成的会话。"""
+    monkeypatch.setattr(settings, "BLOB_DIR", str(tmp_path / "blobs"))
+    monkeypatch.setattr(settings, "UPLOAD_SESSION_DIR", str(tmp_path / "sessions"))
+    monkeypatch.setattr(uploads, "UPLOAD_DIR", str(tmp_path / "uploads"))
+    path = upload_sessions.temp_path("s1")
+    upload_sessions.allocate(path, len(CONTENT))
+    with open(path, "r+b") as f:
+        f.write(CONTENT)
+    async with AsyncSessionLocal() as session:
+        user = User(id=1, username="owner", nickname="owner", password_hash="x")
+        session.add_all([user, Project(id=1, name="p")])
+        session.add(UploadSession(
+            id="s1", target_type="project", target_id=1, project_id=1, filename="a.bin",
+            total_size=len(CONTENT), chunk_size=len(CONTENT), temp_path=path, created_by=1,
+            expires_at=datetime.utcnow() + timedelta(hours=1),
+        ))
+        session.add(UploadChunk(session_id="s1", chunk_index=0, size=len(CONTENT), sha256="-"))
+        await session.commit()
+    return user, path
+
+
+async def _complete(user):
+    async with AsyncSessionLocal() as session:
+        return await uploads.complete_upload_session("s1", session=session, current_user=user)
+
+
+async def _status():
+    async with AsyncSessionLocal() as session:
+        return (await session.get(UploadSession, "s1")).status
+
+
+async def test_failure_after_blob_store_keeps_temp_file_and_resets(upload, monkeypatch):
+    user, path = upload
+
+    record_activity = uploads.record_activity
+    failures = [RuntimeError("db down")]
+
+    def fail_once(*args, **kwargs):
+        # 附件已放入内容存储、提交之前失败
+        if failures:
+            raise failures.pop()
+        return record_activity(*args, **kwargs)
+
+    monkeypatch.setattr(uploads, "record_activity", fail_once)
+    with pytest.raises(RuntimeError):
+        await _complete(user)
+    assert await _status() == UploadSessionStatus.UPLOADING
+    assert os.path.exists(path)
+
+    brief = await _complete(user)
+    assert brief.file_size == len(CONTENT)
+    assert await _status() == UploadSessionStatus.COMPLETED
+    assert not os.path.exists(path)
+
+
+async def test_interrupted_finalize_can_be_retried(upload):
+    user, path = upload
+    async with AsyncSessionLocal() as session:
+        await session.execute(
+            update(UploadSession).values(status=UploadSessionStatus.FINALIZING, finalizing_at=datetime.utcnow())
+        )
+        await session.commit()
+    with pytest.raises(HTTPException) as exc:
+        await _complete(user)
+    assert exc.value.status_code == 409
+
+    # 合并超时未完成：视为中断，可重新完成
+    async with AsyncSessionLocal() as session:
+        await session.execute(update(UploadSession).values(finalizing_at=datetime.utcnow() - timedelta(hours=1)))
+        await session.commit()
+    await _complete(user)
+    assert await _status() == UploadSessionStatus.COMPLETED
@@ -0,0 +1,130 @@
+"""附件上传的大小上限与配额预留测试。"""
+
+import asyncio
+
+import httpx
+import pytest
+from fastapi import FastAPI, File, HTTPException, UploadFile
+from sqlalchemy import select
+
+from core.config import settings
+from core.uploads import UploadSizeLimitMiddleware, release_quota, reserve_quota
+from db.models.project import Project
+from db.session import AsyncSessionLocal
+
+
+@pytest.fixture
+def small_limits(monkeypatch):
+    monkeypatch.setattr(settings, "UPLOAD_MAX_FILE_BYTES", 1000)
+    monkeypatch.setattr(settings, "UPLOAD_MULTIPART_OVERHEAD_BYTES", 200)
+
+
+def _app(received: list) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(UploadSizeLimitMiddleware)
+
+    @app.post("/upload")
+    async def upload(file: UploadFile = File(...)):
+        received.append(file.size)
+        return {"size": file.size}
+
+    return app
+
+
+async def test_oversized_multipart_is_rejected_before_parsing(small_limits):
+    received = []
+    transport = httpx.ASGITransport(app=_app(received))
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        assert (await client.post("/upload", files={"file": ("a.bin", b"x" * 500)})).status_code == 200
+        assert (await client.post("/upload", files={"file": ("a.bin", b"x" * 5000)})).status_code == 413
+
+        # 没有 Content-Length 的分块传输：接收超过上限时中止
+        boundary = "testboundary"
+        body = (
+            f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"a.bin\"\r\n\r\n".encode()
+            + b"x" * 5000 + f"\r\n--{boundary}--\r\n".encode()
+        )
+
+        async def chunks():
+            for i in range(0, len(body), 256):
+                yield body[i:i + 256]
+
+        response = await client.post(
+            "/upload", content=chunks(), headers={"Content-Type": f"multipart/form-data; boundary={boundary}"}
+        )
+        assert response.status_code == 413
+    assert received == [500]
+
+
+async def test_concurrent_reservations_do_not_exceed_quota(db, monkeypatch):
+    monkeypatch.setattr(settings, "UPLOAD_PROJECT_QUOTA_BYTES", 1500)
+    async with AsyncSessionLocal() as session:
+        session.add(Project(id=1, name="p"))
+        await session.commit()
+
+    results = await asyncio.gather(reserve_quota(1, 1000), reserve_quota(1, 1000), return_exceptions=True)
+    granted = [r for r in results if isinstance(r, int)]
+    assert len(granted) <= 1
+    assert all(isinstance(r, HTTPException) and r.status_code == 413 for r in results if not isinstance(r, int))
+
+    # 释放后可以再次预留
+    for reservation_id in granted:
+        await release_quota(reservation_id)
+    await release_quota(await reserve_quota(1, 1000))
+
+
+async def test_upload_responses_match_attachment_lists(db, tmp_path, monkeypatch):
+    from io import BytesIO
+
+    from api.routes import projects, tasks
+    from db.models.task import Task
+    from db.models.user import User
+
+    monkeypatch.setattr(settings, "BLOB_DIR", str(tmp_path / "blobs"))
+    monkeypatch.setattr(projects, "UPLOAD_DIR", str(tmp_path / "uploads"))
+    monkeypatch.setattr(tasks, "UPLOAD_DIR", str(tmp_path / "uploads"))
+    async with AsyncSessionLocal() as session:
+        user = User(id=1, username="owner", nickname="负责人", password_hash="x")
+        session.add_all([user, Project(id=1, name="p")])
+        await session.flush()
+        session.add(Task(id=1, title="t", project_id=1, created_by=1))
+        await session.commit()
+
+    def upload_file() -> UploadFile:
+        return UploadFile(BytesIO(b"content"), filename="a.txt", size=7)
+
+    async with AsyncSessionLocal() as session:
+        uploaded = await projects.upload_attachment(1, file=upload_file(), session=session, current_user=user)
+        listed = await projects.list_attachments(1, session=session)
+    assert uploaded.model_dump() == dict(listed[0])
+
+    async with AsyncSessionLocal() as session:
+        uploaded = await tasks.upload_task_attachment(1, file=upload_file(), session=session, current_user=user)
+        listed = await tasks.list_task_attachments(1, session=session)
+    assert uploaded == listed[0]
+    assert uploaded.uploaded_by == 1 and uploaded.uploader_name == "负责人"
+
+
+async def test_reconcile_fixes_ref_counts_in_batches(db, monkeypatch):
+    from core import blobs
+    from db.models.blob import Blob
+    from db.models.project import ProjectAttachment
+
+    monkeypatch.setattr(settings, "BLOB_GC_BATCH_SIZE", 2)
+    async with AsyncSessionLocal() as session:
+        session.add(Project(id=1, name="p"))
+        session.add_all([Blob(sha256=f"{i:064x}", size=1, ref_count=5) for i in range(5)])
+        await session.flush()
+        # 绕过 ORM 事件写入附件，模拟计数与附件表不一致
+        await session.execute(ProjectAttachment.__table__.insert(), [
+            {"project_id": 1, "filename": "a", "url": "a", "file_size": 1, "sha256": f"{0:064x}"},
+            {"project_id": 1, "filename": "b", "url": "b", "file_size": 1, "sha256": f"{0:064x}"},
+            {"project_id": 1, "filename": "c", "url": "c", "file_size": 1, "sha256": f"{3:064x}"},
+        ])
+        await session.commit()
+
+    assert await blobs.reconcile() == 5
+    assert await blobs.reconcile() == 0
+    async with AsyncSessionLocal() as session:
+        counts = dict((await session.execute(select(Blob.sha256, Blob.ref_count))).all())
+    assert counts == {f"{i:064x}": {0: 2, 3: 1}.get(i, 0) for i in range(5)}
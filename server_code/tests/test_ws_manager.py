@@ -0,0 +1,53 @@
+"""WebSocket 连接管理测试（进程内总线）。"""
+
+import asyncio
+
+from api.routes.ws import ConnectionManager
+from core.config import settings
+from core.presence import presence
+from core.pubsub import InProcessPubSub
+
+
+class StalledWebSocket:
+    """发送永远阻塞的慢客户端。"""
+
+    def __init__(self):
+        self.closed_with = None
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text: str):
+        await asyncio.Event().wait()
+
+    async def close(self, code: int = 1000):
+        self.closed_with = code
+
+
+async def test_slow_connection_is_removed_on_disconnect_policy(monkeypatch):
+    monkeypatch.setattr(settings, "WS_SEND_QUEUE_SIZE", 2)
+    monkeypatch.setattr(settings, "WS_OVERFLOW_POLICY", "disconnect")
+    offline = []
+    monkeypatch.setattr(presence, "mark_offline", offline.append)
+    manager = ConnectionManager(InProcessPubSub())
+    await manager.start()
+    websocket = StalledWebSocket()
+    connection, first = await manager.connect(7, websocket)
+    assert first
+    await asyncio.sleep(0)
+
+    for i in range(10):
+        await manager.send_to_user(7, {"n": i})
+    await asyncio.sleep(0.01)
+
+    # 第一条被写协程取走阻塞，队列再放 2 条，第 4 条溢出后连接被移除，之后的消息不再计入丢弃
+    assert manager.dropped_messages == 1
+    assert manager.slow_disconnects == 1
+    assert 7 not in manager.active
+    assert websocket.closed_with == 1013
+    assert offline == [7]
+
+    # 接收循环结束后的清理不会重复标记离线
+    await manager.release(connection)
+    assert offline == [7]
+    await manager.stop()